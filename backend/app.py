@@ -1,25 +1,79 @@
-from flask import Flask, request, jsonify, send_from_directory, send_file
+from flask import Flask, Response, request, jsonify, send_from_directory, send_file, stream_with_context
 from flask_cors import CORS
 from config import Config
 from database import Database
 from ollama_service import OllamaService
 from language_detector import LanguageDetector
-from gtts import gTTS
+from llm_scheduler import LLMScheduler, JobCancelled
+from job_queue import JobQueue
+from dashboard_cache import DashboardCache
+from cohort_analytics import CohortData, CohortMetrics
+from session_store import create_session_store
+from tts_cache import TTSCache
+from tts_backends import create_tts_backend, TTSBusy
+from speech_pipeline import SpeechPipeline
+from concurrent.futures import ThreadPoolExecutor
 import os
+import json
 import time
 from datetime import datetime
-from io import BytesIO
 
 app = Flask(__name__, static_folder='../frontend', static_url_path='')
 app.config.from_object(Config)
 CORS(app)
 
 # Initialize services
-db = Database(Config.DATABASE_PATH)
+db = Database(
+    Config.DATABASE_PATH,
+    cache_size_kb=Config.DB_CACHE_SIZE_KB,
+    mmap_size=Config.DB_MMAP_SIZE,
+    busy_timeout_ms=Config.DB_BUSY_TIMEOUT_MS
+)
 ollama = OllamaService()
+scheduler = LLMScheduler(
+    max_concurrency=Config.LLM_MAX_CONCURRENCY,
+    interactive_reserved=Config.LLM_INTERACTIVE_RESERVED,
+    stale_after=Config.LLM_STALE_AFTER,
+    deadline_workers=Config.LLM_DEADLINE_WORKERS,
+    deadline_queue=Config.LLM_DEADLINE_QUEUE
+)
+ollama.router.load_fn = scheduler.backend_load
+scheduler.limit_fn = ollama.concurrency_limit
+job_queue = JobQueue(
+    db,
+    workers=Config.JOB_WORKERS,
+    poll_interval=Config.JOB_POLL_INTERVAL,
+    heartbeat_interval=Config.JOB_HEARTBEAT_INTERVAL,
+    requeue_after=Config.JOB_REQUEUE_AFTER,
+    retention=Config.JOB_RETENTION,
+    max_attempts=Config.JOB_MAX_ATTEMPTS
+)
+dashboard_cache = DashboardCache(
+    max_entries=Config.DASHBOARD_CACHE_ENTRIES,
+    max_age=Config.DASHBOARD_CACHE_MAX_AGE,
+    generation_fn=db.get_generation
+)
+db.change_fn = dashboard_cache.invalidate
+
+tts = create_tts_backend(
+    Config.TTS_BACKEND,
+    max_concurrency=Config.TTS_MAX_CONCURRENCY,
+    queue_timeout=Config.TTS_QUEUE_TIMEOUT,
+    workers=Config.TTS_WORKERS,
+    render_timeout=Config.TTS_RENDER_TIMEOUT,
+    rate=Config.TTS_OFFLINE_RATE
+)
+tts_cache = TTSCache(
+    os.path.join(Config.TTS_CACHE_DIR, tts.name),
+    max_bytes=Config.TTS_CACHE_MAX_BYTES,
+    extension=tts.extension,
+    rescan_interval=Config.TTS_CACHE_RESCAN_INTERVAL
+)
+# Renders the sentences of streamed replies (see SpeechPipeline)
+tts_executor = ThreadPoolExecutor(max_workers=Config.TTS_PIPELINE_THREADS, thread_name_prefix='tts')
 
 # Active sessions
-active_sessions = {}
+sessions = create_session_store(Config.SESSION_STORE, db, max_messages=Config.SESSION_MAX_MESSAGES)
 
 # ==================== STATIC FILES ====================
 
@@ -40,6 +94,20 @@ def health_check():
         'ollama_available': ollama.is_available()
     })
 
+@app.route('/api/stats', methods=['GET'])
+def service_stats():
+    """Runtime statistics for monitoring connection reuse and health probes"""
+    return jsonify({
+        'ollama': ollama.get_stats(),
+        'scheduler': scheduler.get_stats(),
+        'jobs': job_queue.get_stats(),
+        'database': db.get_stats(),
+        'dashboard_cache': dashboard_cache.get_stats(),
+        'sessions': sessions.get_stats(),
+        'tts_cache': tts_cache.get_stats(),
+        'tts': tts.get_stats()
+    })
+
 # ==================== CHILDREN ====================
 
 @app.route('/api/children', methods=['GET'])
@@ -107,14 +175,12 @@ def start_session():
     
     session_id = int(time.time() * 1000)  # Simple session ID
     
-    active_sessions[session_id] = {
-        'child_id': child_id,
-        'character': character,
-        'start_time': time.time(),
-        'turn_count': 0,
-        'messages': [],
-        'evaluations': []
-    }
+    # Row in `sessions`, finalized when the session ends or expires
+    db_session_id = db.create_session(child_id, character, theme, mode)
+    
+    # Another worker may have started a session in the same millisecond
+    while not sessions.create(session_id, child_id, character, db_session_id=db_session_id):
+        session_id += 1
     
     # Get previous context summary for continuity
     context_summary = db.get_latest_summary(child_id, character)
@@ -130,23 +196,28 @@ def end_session():
     data = request.json
     session_id = data.get('session_id')
     
-    if session_id not in active_sessions:
+    session = sessions.end(session_id)
+    if session is None:
         return jsonify({'error': 'Session not found'}), 404
     
-    session = active_sessions[session_id]
-    duration = (time.time() - session['start_time']) / 60
-    
-    summary = f"Great session with {session['character']}! You had {session['turn_count']} conversations."
+    duration = finalize_session(session)
     
-    del active_sessions[session_id]
+    summary = f"Great session with {session.character}! You had {session.turn_count} conversations."
     
     return jsonify({
         'message': 'Session ended',
         'summary': summary,
         'duration': round(duration, 1),
-        'turns': session['turn_count']
+        'turns': session.turn_count
     })
 
+def finalize_session(session, until=None):
+    """Record an ended session in the sessions table; returns its duration in minutes"""
+    duration = session.duration_minutes(until)
+    if session.db_session_id:
+        db.end_session(session.db_session_id, session.turn_count, round(duration, 1))
+    return duration
+
 # ==================== CHAT ====================
 
 # Safety filter for AI responses
@@ -159,6 +230,10 @@ SAFE_RESPONSES = {
     'finley': "It's okay. Let's do something calm together."
 }
 
+def route_llm(text):
+    """Pick (model, base_url) for LLM work on text, by its language"""
+    return ollama.route_to_model(LanguageDetector.detect_language(text))
+
 def filter_response(response, character):
     lower_resp = response.lower()
     for word in BLOCKED_WORDS:
@@ -184,53 +259,210 @@ def chat():
         return jsonify({'error': 'AI service is not available'}), 503
     
     # Get conversation history
-    history = db.get_conversations(child_id, limit=5)
-    
-    # Generate response with age context
-    response = ollama.generate_response(
+    history = db.get_conversations(child_id, limit=Config.PROMPT_HISTORY_TURNS)
+    session = sessions.get(session_id)
+    
+    # Route by language, then generate within the chat latency budget
+    model, base_url = route_llm(message)
+    response = generate_within_budget(
+        session_id,
+        session,
         character, 
         message, 
         emotion, 
         history,
         context_summary=context_summary,
-        age=age
+        age=age,
+        model=model,
+        base_url=base_url
     )
     
-    # Apply safety filter
-    response = filter_response(response, character)
+    return jsonify(complete_chat_turn(child_id, character, message, response, emotion, session_id, session))
+
+def generate_within_budget(session_id, session, character, *args, **kwargs):
+    """
+    Generate a chat reply within the chat latency budget
+    
+    The model works on a copy of the session's state. Only a reply that
+    arrives in time has its Ollama context copied back to `session`; a late
+    reply is kept as the session's late_reply and its context is dropped,
+    so it never overwrites the state of newer turns.
+    """
+    turn = session.state() if session is not None else None
+    generated = {}
+    
+    def generate():
+        generated['response'] = ollama.generate_response(character, *args, session=turn, **kwargs)
+        return generated['response']
+    
+    response = scheduler.run_with_deadline(
+        Config.CHAT_LATENCY_BUDGET,
+        'chat',
+        generate,
+        backend=kwargs.get('base_url'),
+        default=ollama.FALLBACK_RESPONSES.get(character, ollama.DEFAULT_FALLBACK),
+        on_late=lambda late: store_late_reply(session_id, character, late)
+    )
     
-    # Save conversation
-    db.save_conversation(child_id, character, message, response, emotion)
+    if session is not None and 'response' in generated and response is generated['response']:
+        session.set_state(turn)
+        if 'turn_tokens' in turn:
+            session['turn_tokens'] = turn['turn_tokens']
+    return response
+
+def store_late_reply(session_id, character, late_response):
+    """Keep a reply that missed its deadline as context for the session's next turn"""
+    if ollama.is_fallback(late_response) or filter_response(late_response, character) != late_response:
+        return
     
-    # Update XP and streak
-    db.update_child_xp(child_id, 10)
-    db.update_streak(child_id)
+    # Fetched again: the turn's own record may be older than the session by now
+    session = sessions.get(session_id)
+    if session is None:
+        return
+    session['late_reply'] = late_response
+    sessions.save(session_id, session)
+
+def complete_chat_turn(child_id, character, message, response, emotion=None, session_id=None, session=None):
+    """
+    Filter, persist and reward a finished chat turn; returns the response payload
+    
+    `session` is the record the turn was generated with; its Ollama
+    context is written back to the session store.
+    """
     
-    # Update session
-    if session_id and session_id in active_sessions:
-        active_sessions[session_id]['turn_count'] += 1
-        active_sessions[session_id]['messages'].append(message)
+    # Apply safety filter
+    filtered = filter_response(response, character)
+    if filtered != response:
+        # Keep the blocked reply out of the reused Ollama context
+        ollama.reset_context(session)
+    response = filtered
     
-    # Check badges
-    conversations_count = len(db.get_conversations(child_id))
-    badges_earned = []
+    # Save conversation, XP, streak and badges in one transaction
+    badges_earned = db.record_turn(child_id, character, message, response, emotion, xp_gain=10)
     
-    if conversations_count == 1:
-        if db.award_badge(child_id, 'First Words'):
-            badges_earned.append('First Words')
-    elif conversations_count == 10:
-        if db.award_badge(child_id, 'Chatty Friend'):
-            badges_earned.append('Chatty Friend')
+    # Update session (the turn count is incremented atomically by the store)
+    if session is not None:
+        sessions.record_turn(session_id, message)
+        sessions.save(session_id, session)
     
     # Detect AI emotion
     ai_emotion = detect_emotion_simple(response)
     
-    return jsonify({
+    result = {
         'response': response,
         'xp_gained': 10,
         'badges_earned': badges_earned,
         'ai_emotion': ai_emotion
-    })
+    }
+    
+    # Token counts for this turn's prompt
+    if session is not None:
+        turn_tokens = session.pop('turn_tokens', None)
+        if turn_tokens:
+            result['tokens'] = turn_tokens
+    
+    return result
+
+# Longest blocked word; this many characters minus one are held back while
+# streaming so a blocked word split across tokens is never sent to the child
+STREAM_HOLDBACK = max(len(word) for word in BLOCKED_WORDS) - 1
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Stream the AI reply as NDJSON while it is generated
+    
+    Emits {"type": "token", "content": ...} lines as safe text becomes
+    available, then one {"type": "done", ...} line carrying the final
+    filtered response with the same fields as /api/chat.
+    
+    With "speak": true, each sentence is sent to TTS as soon as it is
+    complete and {"type": "audio", "index", "text", "mimetype", "audio"
+    (base64)} lines follow in sentence order ("error" instead of audio if
+    synthesis failed), all before the done line.
+    """
+    data = request.json
+    child_id = data.get('child_id')
+    character = data.get('character')
+    message = data.get('message')
+    emotion = data.get('emotion')
+    session_id = data.get('session_id')
+    context_summary = data.get('context_summary', '')
+    age = data.get('age', 10)
+    speak = bool(data.get('speak'))
+    
+    if not all([child_id, character, message]):
+        return jsonify({'error': 'Missing required fields'}), 400
+    
+    if not ollama.is_available():
+        return jsonify({'error': 'AI service is not available'}), 503
+    
+    history = db.get_conversations(child_id, limit=Config.PROMPT_HISTORY_TURNS)
+    session = sessions.get(session_id)
+    model, base_url = route_llm(message)
+    
+    def generate():
+        text = ''
+        sent = 0
+        blocked = False
+        speech = SpeechPipeline(tts, tts_cache, tts_executor) if speak else None
+        
+        # A client that disconnects closes the generator mid-loop; the
+        # finally below then stops its queued sentence renders as well
+        try:
+            try:
+                with scheduler.slot('chat', base_url):
+                    for chunk in ollama.stream_response(
+                        character,
+                        message,
+                        emotion,
+                        history,
+                        context_summary=context_summary,
+                        age=age,
+                        session=session,
+                        model=model,
+                        base_url=base_url
+                    ):
+                        text += chunk
+                        if blocked:
+                            continue
+                        if filter_response(text, character) != text:
+                            blocked = True
+                            continue
+                        
+                        safe_end = len(text) - STREAM_HOLDBACK
+                        if safe_end > sent:
+                            yield json.dumps({'type': 'token', 'content': text[sent:safe_end]}) + '\n'
+                            sent = safe_end
+                        
+                        if speech:
+                            # Only text already shown is spoken
+                            speech.feed(text[:sent])
+                            for event in speech.ready():
+                                yield json.dumps(event) + '\n'
+            except JobCancelled as e:
+                print(f"Scheduler: {str(e)}")
+            
+            response = ollama.finalize_response(character, text)
+            result = complete_chat_turn(child_id, character, message, response, emotion, session_id, session)
+            
+            if speech:
+                # Whatever the final reply adds (or replaces), then the rest in order
+                speech.finish(result['response'])
+                for event in speech.drain():
+                    yield json.dumps(event) + '\n'
+            
+            result['type'] = 'done'
+            yield json.dumps(result) + '\n'
+        finally:
+            if speech:
+                speech.cancel()
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 # ==================== AI OPTIONS ====================
 
@@ -248,7 +480,11 @@ Example: If asked "what color dragon?" respond with:
 🔵 Blue dragon!
 Just output 2 lines, nothing else."""
     
-    result = ollama.generate_simple(prompt)
+    model, base_url = route_llm(message)
+    result = scheduler.run(
+        'options', ollama.generate_simple, prompt,
+        model=model, base_url=base_url, backend=base_url, default=''
+    )
     options = [line.strip() for line in result.strip().split('\n') if line.strip()][:2]
     
     return jsonify({'options': options})
@@ -270,25 +506,33 @@ def chat_voice():
         transcribed_text = "Hello! I want to talk about my day."
         
         # Get conversation history
-        history = db.get_conversations(int(child_id), limit=5) if child_id else []
+        history = db.get_conversations(int(child_id), limit=Config.PROMPT_HISTORY_TURNS) if child_id else []
+        session_id = int(session_id) if session_id else None
+        session = sessions.get(session_id)
         
         # Generate AI response
-        response = ollama.generate_response(
+        model, base_url = route_llm(transcribed_text)
+        response = generate_within_budget(
+            session_id,
+            session,
             character,
             transcribed_text,
             emotion,
-            history
+            history,
+            model=model,
+            base_url=base_url
         )
         
-        # Save conversation
+        # Save conversation, XP, streak and badges in one transaction
+        badges_earned = []
         if child_id:
-            db.save_conversation(int(child_id), character, transcribed_text, response, emotion)
-            db.update_child_xp(int(child_id), 10)
-            db.update_streak(int(child_id))
+            badges_earned = db.record_turn(int(child_id), character, transcribed_text, response, emotion, xp_gain=10)
         
         # Update session
-        if session_id and int(session_id) in active_sessions:
-            active_sessions[int(session_id)]['turn_count'] += 1
+        if session is not None:
+            session.pop('turn_tokens', None)
+            sessions.record_turn(session_id)
+            sessions.save(session_id, session)
         
         # Detect AI emotion
         ai_emotion = detect_emotion_simple(response)
@@ -298,7 +542,7 @@ def chat_voice():
             'response': response,
             'ai_emotion': ai_emotion,
             'xp_gained': 10,
-            'badges_earned': []
+            'badges_earned': badges_earned
         })
         
     except Exception as e:
@@ -323,49 +567,60 @@ def detect_emotion_simple(text):
 
 # ==================== TEXT-TO-SPEECH ====================
 
-@app.route('/api/tts', methods=['POST'])
+@app.route('/api/tts', methods=['GET', 'POST'])
 def text_to_speech():
-    """Convert text to speech with language detection"""
+    """
+    Convert text to speech with language detection
+    
+    Text comes from the JSON body (POST) or ?text= (GET). Audio is cached
+    on disk by (text, language, voice), so repeated phrases skip synthesis;
+    GET responses support ETag revalidation and Range requests. Returns 503
+    when the TTS backend has no free render slot.
+    """
     try:
-        data = request.json
-        text = data.get('text', '')
+        if request.method == 'POST':
+            text = (request.json or {}).get('text', '')
+        else:
+            text = request.args.get('text', '')
         
         if not text:
             return jsonify({'error': 'No text provided'}), 400
         
         # Detect language from text
         language = LanguageDetector.detect_language(text)
+        voice = tts.voice_for(language)
         
-        # Map detected language to gTTS language code
-        lang_map = {
-            'ta': 'ta',      # Tamil
-            'mr': 'hi',      # Marathi (use Hindi voice as fallback)
-            'en': 'en'       # English
-        }
-        
-        gtts_lang = lang_map.get(language, 'en')
-        
-        print(f"🔊 Converting to speech: language={language}, gtts_lang={gtts_lang}, text={text[:50]}...")
-        
-        # Generate speech using gTTS
-        audio = gTTS(text=text, lang=gtts_lang, slow=False)
-        
-        # Save to BytesIO buffer instead of file
-        audio_buffer = BytesIO()
-        audio.write_to_fp(audio_buffer)
-        audio_buffer.seek(0)
-        
-        return send_file(
-            audio_buffer,
-            mimetype='audio/mp3',
-            as_attachment=False,
-            download_name='response.mp3'
-        )
+        key = TTSCache.key(text, voice, tts.name)
+        return tts_cache.use(key, lambda: tts.synthesize(text, voice), lambda path: send_tts_audio(key, path))
         
+    except TTSBusy as e:
+        print(f"TTS busy: {str(e)}")
+        response = jsonify({'error': 'Text-to-speech is busy, try again shortly'})
+        response.headers['Retry-After'] = '2'
+        return response, 503
     except Exception as e:
         print(f"TTS error: {str(e)}")
         return jsonify({'error': f'Text-to-speech failed: {str(e)}'}), 500
 
+@app.route('/api/tts/audio/<key>', methods=['GET'])
+def tts_audio(key):
+    """Cached audio by key (see the Content-Location of /api/tts responses)"""
+    if len(key) != 64 or not all(c in '0123456789abcdef' for c in key):
+        return jsonify({'error': 'Invalid key'}), 400
+    path = tts_cache.get(key)
+    try:
+        if path:
+            return send_tts_audio(key, path)
+    except FileNotFoundError:
+        pass  # Evicted since get()
+    return jsonify({'error': 'Not found'}), 404
+
+def send_tts_audio(key, path):
+    # The key is a hash of what was synthesized, so the audio never changes
+    response = send_file(path, mimetype=tts.mimetype, conditional=True, etag=key, max_age=86400)
+    response.headers['Content-Location'] = f'/api/tts/audio/{key}'
+    return response
+
 # ==================== EMOJI SCAFFOLDING ====================
 
 @app.route('/api/emoji/scaffold', methods=['POST'])
@@ -390,7 +645,12 @@ Child wants to say: "I feel {emotion} because..."
 
 Complete it in simple words (5-10 words). Be specific and relatable."""
 
-    completion = ollama.generate_simple(prompt)
+    model, base_url = route_llm(context)
+    completion = scheduler.run(
+        'scaffold', ollama.generate_simple, prompt,
+        model=model, base_url=base_url, background=True,
+        backend=base_url, key=f'scaffold:{child_id}', default=''
+    )
     full_text = f"I feel {emotion} because {completion}"
     
     return jsonify({
@@ -436,7 +696,7 @@ def set_theme():
 
 @app.route('/api/summary/generate', methods=['POST'])
 def generate_summary():
-    """Generate context summary every 8 messages"""
+    """Queue a context summary (every 8 messages); returns the last saved one right away"""
     data = request.json
     child_id = data.get('child_id')
     session_id = data.get('session_id')
@@ -447,13 +707,30 @@ def generate_summary():
     if not messages or len(messages) < 4:
         return jsonify({'summary': ''})
     
-    # Build summary prompt
+    job_id = job_queue.enqueue('summary', {
+        'child_id': child_id,
+        'session_id': session_id,
+        'messages': messages,
+        'character': character,
+        'evaluation': evaluation
+    })
+    
+    previous = db.get_latest_summary(child_id, character) if child_id and character else None
+    
+    return jsonify({
+        'summary': previous or '',
+        'job_id': job_id,
+        'status': 'queued'
+    }), 202
+
+def build_summary_prompt(messages):
+    """Build the context summary prompt for a list of chat messages"""
     conversation_text = "\n".join([
         f"{'Child' if m['role'] == 'user' else 'AI'}: {m['content']}"
         for m in messages
     ])
     
-    prompt = f"""Summarize this conversation between an autistic child and their AI friend.
+    return f"""Summarize this conversation between an autistic child and their AI friend.
 Focus on:
 1. Main topics discussed
 2. Child's emotional state and changes
@@ -466,56 +743,145 @@ Conversation:
 
 Create a brief, helpful summary (2-3 sentences) that will help continue the conversation naturally:"""
 
-    summary = ollama.generate_simple(prompt)
+def run_summary_job(payload):
+    """Background job: generate and save a context summary"""
+    child_id = payload.get('child_id')
+    session_id = payload.get('session_id')
+    
+    prompt = build_summary_prompt(payload['messages'])
+    model, base_url = route_llm(prompt)
+    summary = scheduler.run(
+        'summary', ollama.generate_simple, prompt,
+        model=model, base_url=base_url, background=True,
+        backend=base_url, key=f'summary:{child_id}:{session_id}', default=''
+    )
     
     # Save summary to database
-    if child_id and session_id:
-        db.save_summary(child_id, character, session_id, summary, evaluation)
+    if child_id and session_id and summary:
+        db.save_summary(child_id, payload.get('character'), session_id, summary, payload.get('evaluation'))
     
-    return jsonify({
+    # Keep the session's running evaluation for the parent dashboard
+    if child_id and session_id and payload.get('evaluation'):
+        db.save_evaluation(child_id, session_id, payload.get('character'), payload['evaluation'])
+    
+    return {
         'summary': summary,
         'generated_at': time.time()
+    }
+
+@app.route('/api/jobs/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    """Poll a background job"""
+    job = job_queue.get_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    return jsonify({
+        'job_id': job['id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'result': job['result'],
+        'error': job['error']
     })
 
 @app.route('/api/chat/sync', methods=['POST'])
 def sync_chat():
-    """Sync chat data from frontend"""
+    """
+    Sync chat data from frontend
+    
+    Delta protocol: the client sends the messages after `afterSeq` (the
+    high-water mark it got back last time) and the server appends them.
+    The response carries the new mark in `seq`; on a gap (the client is
+    ahead of the server) nothing is stored and 409 tells the client to
+    resend from `seq`. A full `chatHistory` is still accepted.
+    """
     data = request.json
     child_id = data.get('childId')
     session_id = data.get('sessionId')
-    chat_history = data.get('chatHistory', [])
-    context_summary = data.get('contextSummary', '')
+    context_summary = data.get('contextSummary')
     
-    if child_id and session_id:
-        db.save_session_data(child_id, session_id, chat_history, context_summary)
+    if not (child_id and session_id):
+        return jsonify({'synced': False, 'error': 'childId and sessionId are required'}), 400
     
-    return jsonify({'synced': True})
+    if 'messages' in data:
+        after_seq = int(data.get('afterSeq') or 0)
+        messages = data.get('messages') or []
+    else:
+        after_seq = 0
+        messages = data.get('chatHistory', [])
+    
+    # Sequence numbers follow list positions, so a bad entry is never skipped
+    if not isinstance(messages, list) or not all(isinstance(m, dict) for m in messages):
+        return jsonify({'synced': False, 'error': 'messages must be a list of message objects'}), 400
+    
+    result = db.append_session_messages(child_id, session_id, after_seq, messages, context_summary)
+    if result['gap']:
+        return jsonify({'synced': False, 'seq': result['seq']}), 409
+    
+    return jsonify({'synced': True, 'seq': result['seq'], 'appended': result['appended']})
 
 # ==================== ANALYTICS ====================
 
 @app.route('/api/analytics/parent/<int:child_id>', methods=['GET'])
 def parent_dashboard(child_id):
+    """
+    Parent dashboard, served from the cache until the child's data changes
+    
+    The ETag changes with every write for the child, so a browser
+    revalidating with If-None-Match gets a 304 while nothing has changed.
+    """
+    entry = dashboard_cache.get(child_id)
+    if entry is None:
+        generation = dashboard_cache.generation(child_id)
+        dashboard = build_parent_dashboard(child_id)
+        if dashboard is None:
+            return jsonify({'error': 'Child not found'}), 404
+        entry = dashboard_cache.put(child_id, generation, app.json.dumps(dashboard))
+    
+    response = Response(entry.body, mimetype='application/json')
+    response.set_etag(entry.etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response = response.make_conditional(request)
+    if response.status_code == 304:
+        dashboard_cache.record_not_modified()
+    return response
+
+@app.route('/api/analytics/cohort', methods=['GET'])
+def cohort_analytics():
+    """
+    Clinical metrics across children (clinic view)
+    
+    Query: since_days (optional), child_ids (optional, comma-separated)
+    """
+    since_days = request.args.get('since_days', type=int)
+    child_ids = request.args.get('child_ids', '')
+    try:
+        child_ids = [int(c) for c in child_ids.split(',') if c.strip()]
+    except ValueError:
+        return jsonify({'error': 'child_ids must be comma-separated integers'}), 400
+    
+    data = CohortData.from_database(db, since_days=since_days, child_ids=child_ids or None)
+    return jsonify(CohortMetrics.compute(data))
+
+def build_parent_dashboard(child_id):
     child = db.get_child(child_id)
     if not child:
-        return jsonify({'error': 'Child not found'}), 404
+        return None
     
-    # Get all evaluations and sessions
-    evaluations = db.get_all_evaluations(child_id)
-    sessions = db.get_all_sessions(child_id)
-    conversations = db.get_conversations(child_id, limit=100)
-    summaries = db.get_all_summaries(child_id)
+    # Aggregates are maintained on write (child row and child_stats), so
+    # the dashboard only reads fixed-size data however long the history is
+    evaluations = db.get_evaluation_stats(child_id)
+    sessions = db.get_recent_sessions(child_id, limit=10)
+    activity = db.get_activity(child_id, days=28)
+    summaries = db.get_recent_summaries(child_id, limit=5)
     
     # Calculate comprehensive metrics
-    total_sessions = len(sessions)
-    total_conversations = len(conversations)
+    total_sessions = evaluations['total_sessions']
+    total_conversations = child['total_turns']
     avg_turns = total_conversations / max(total_sessions, 1)
     
     # Emotion analysis
-    emotion_counts = {}
-    for conv in conversations:
-        if conv.get('emotion'):
-            emotion = conv['emotion']
-            emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
+    emotion_counts = child['emotion_counts']
     
     # Calculate communication progress
     communication_progress = calculate_communication_progress(evaluations)
@@ -526,8 +892,10 @@ def parent_dashboard(child_id):
     # Calculate maturity metrics
     maturity_metrics = calculate_maturity_metrics(evaluations)
     
-    # Generate AI report
-    ai_report = generate_ai_report(child, evaluations, summaries, emotion_counts)
+    # AI report is generated in the background; serve the last one meanwhile
+    ai_report, ai_report_job = get_cached_ai_report(child_id)
+    if not ai_report:
+        ai_report = fallback_ai_report(child, emotion_counts)
     
     # Calculate developmental milestones
     milestones = calculate_developmental_milestones(
@@ -553,7 +921,7 @@ def parent_dashboard(child_id):
         'total_conversations': total_conversations,
         'avg_turns_per_session': round(avg_turns, 1),
         'emoji_accuracy': calculate_emoji_accuracy(evaluations),
-        'recent_sessions': sessions[:10],
+        'recent_sessions': sessions,
         'badges': db.get_badges(child_id),
         
         # Enhanced metrics for charts
@@ -561,10 +929,11 @@ def parent_dashboard(child_id):
         'communication_progress': communication_progress,
         'emotional_development': emotional_development,
         'maturity_metrics': maturity_metrics,
-        'weekly_activity': calculate_weekly_activity(conversations),
-        'character_usage': calculate_character_usage(conversations),
-        'summaries': summaries[:5],
+        'weekly_activity': calculate_weekly_activity(activity),
+        'character_usage': child['character_turns'],
+        'summaries': summaries,
         'ai_report': ai_report,
+        'ai_report_job': ai_report_job,
         
         # Autism-specific developmental insights
         'milestones': milestones,
@@ -577,7 +946,35 @@ def parent_dashboard(child_id):
         )
     }
     
-    return jsonify(dashboard)
+    return dashboard
+
+def get_cached_ai_report(child_id):
+    """
+    Get the last finished AI report for a child
+    
+    Queues a new report job when there is none or it is older than
+    REPORT_MAX_AGE. Returns (report or None, pending job id or None).
+    """
+    key = f'report:{child_id}'
+    latest = job_queue.latest_result(key)
+    
+    job_id = None
+    if not latest or time.time() - latest['finished_at'] > Config.REPORT_MAX_AGE:
+        job_id = job_queue.enqueue('report', {'child_id': child_id}, dedupe_key=key)
+    
+    return (latest['result'] if latest else None), job_id
+
+def run_report_job(payload):
+    """Background job: generate the AI progress report for a child"""
+    child_id = payload['child_id']
+    child = db.get_child(child_id)
+    if not child:
+        return None
+    
+    evaluations = db.get_evaluation_stats(child_id)
+    summaries = db.get_recent_summaries(child_id, limit=3)
+    
+    return generate_ai_report(child, evaluations, summaries, child['emotion_counts'])
 
 def calculate_developmental_milestones(total_convs, emotions, comm_progress, maturity):
     """Calculate autism-specific developmental milestones achieved"""
@@ -726,21 +1123,17 @@ def calculate_communication_progress(evaluations):
         'emotional_labeling': 0  # Ability to name emotions
     }
     
-    total_sessions = len(evaluations) or 1
+    total_sessions = evaluations['count'] or 1
     
-    for eval_data in evaluations:
-        if 'communicationSkills' in eval_data:
-            skills = eval_data['communicationSkills']
-            progress['clarity'].append(min(skills.get('clarity', 0) * 100, 100))
-            progress['engagement'].append(min(skills.get('engagement', 0) * 15, 100))
-            progress['reciprocity'].append(min(skills.get('reciprocity', 0) * 15, 100))
-            progress['dates'].append(eval_data.get('timestamp', 0))
-            
-            # Count reciprocity as turn-taking
-            progress['turn_taking'] += skills.get('reciprocity', 0)
-        
-        if 'emotionTracking' in eval_data:
-            progress['emotional_labeling'] += len(eval_data['emotionTracking'])
+    for skills in evaluations['communication']:
+        progress['clarity'].append(min(skills['clarity'] * 100, 100))
+        progress['engagement'].append(min(skills['engagement'] * 15, 100))
+        progress['reciprocity'].append(min(skills['reciprocity'] * 15, 100))
+        progress['dates'].append(skills['timestamp'])
+    
+    # Count reciprocity as turn-taking
+    progress['turn_taking'] = evaluations['reciprocity_total']
+    progress['emotional_labeling'] = evaluations['emotion_total']
     
     # Normalize scores
     progress['turn_taking'] = min(round(progress['turn_taking'] / total_sessions * 20, 1), 100)
@@ -786,7 +1179,7 @@ def calculate_emotional_development(evaluations, emotion_counts):
         development['emotion_regulation'] = round(balance * 80 + 20, 1)  # Minimum 20%
     
     # Comfort with feelings: willingness to use emotion buttons
-    development['comfort_with_feelings'] = min(round(total / max(len(evaluations), 1) * 50, 1), 100)
+    development['comfort_with_feelings'] = min(round(total / max(evaluations['count'], 1) * 50, 1), 100)
     
     # Emotion vocabulary: based on variety and frequency
     development['emotion_vocabulary'] = min(round((development['emotion_variety'] * 10 + total * 2), 1), 100)
@@ -802,70 +1195,42 @@ def calculate_maturity_metrics(evaluations):
         'avg_response_time': 0
     }
     
-    if not evaluations:
+    if not evaluations['count']:
         return metrics
     
-    complexities = []
-    diversities = []
-    maintenances = []
-    response_times = []
-    
-    for eval_data in evaluations:
-        if 'maturityIndicators' in eval_data:
-            mat = eval_data['maturityIndicators']
-            complexities.append(mat.get('sentenceComplexity', 0))
-            diversities.append(mat.get('vocabularyDiversity', 0))
-        if 'socialMetrics' in eval_data:
-            soc = eval_data['socialMetrics']
-            maintenances.append(soc.get('topicMaintenance', 0))
-            response_times.extend(soc.get('responseLatency', []))
-    
-    metrics['sentence_complexity'] = round(sum(complexities) / len(complexities) * 20, 1) if complexities else 0
-    metrics['vocabulary_diversity'] = round(sum(diversities) / len(diversities) * 100, 1) if diversities else 0
-    metrics['topic_maintenance'] = round(sum(maintenances) / len(maintenances) * 100, 1) if maintenances else 0
-    metrics['avg_response_time'] = round(sum(response_times) / len(response_times), 1) if response_times else 0
+    # Averages skip evaluations without the section (NULL columns)
+    complexity = evaluations['sentence_complexity_avg']
+    diversity = evaluations['vocabulary_diversity_avg']
+    maintenance = evaluations['topic_maintenance_avg']
+    
+    metrics['sentence_complexity'] = round(complexity * 20, 1) if complexity is not None else 0
+    metrics['vocabulary_diversity'] = round(diversity * 100, 1) if diversity is not None else 0
+    metrics['topic_maintenance'] = round(maintenance * 100, 1) if maintenance is not None else 0
+    if evaluations['latency_count']:
+        metrics['avg_response_time'] = round(evaluations['latency_sum'] / evaluations['latency_count'], 1)
     
     return metrics
 
 def calculate_emoji_accuracy(evaluations):
     """Calculate how well child uses emotion emojis"""
-    total = 0
-    accurate = 0
-    
-    for eval_data in evaluations:
-        if 'emotionTracking' in eval_data:
-            for emo in eval_data['emotionTracking']:
-                total += 1
-                if emo.get('messageLength', 0) > 3:  # Basic validation
-                    accurate += 1
-    
+    total = evaluations['emotion_total']
+    accurate = evaluations['emotion_accurate']
     return round(accurate / max(total, 1) * 100, 1)
 
-def calculate_weekly_activity(conversations):
-    """Calculate activity per day of week"""
-    from datetime import datetime
+def calculate_weekly_activity(activity):
+    """Calculate activity per day of week from daily turn counts"""
+    from datetime import date
     
     days = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-    activity = {day: 0 for day in days}
+    weekly = {day: 0 for day in days}
     
-    for conv in conversations:
-        if conv.get('timestamp'):
-            try:
-                dt = datetime.fromisoformat(conv['timestamp'].replace('Z', '+00:00'))
-                day = days[dt.weekday()]
-                activity[day] += 1
-            except:
-                pass
-    
-    return activity
-
-def calculate_character_usage(conversations):
-    """Calculate which characters are used most"""
-    usage = {}
-    for conv in conversations:
-        char = conv.get('character', 'unknown')
-        usage[char] = usage.get(char, 0) + 1
-    return usage
+    for bucket in activity:
+        try:
+            weekly[days[date.fromisoformat(bucket['day']).weekday()]] += bucket['turns']
+        except:
+            pass
+    
+    return weekly
 
 def generate_ai_report(child, evaluations, summaries, emotion_counts):
     """Generate comprehensive AI analysis report"""
@@ -878,7 +1243,7 @@ def generate_ai_report(child, evaluations, summaries, emotion_counts):
 
 Child Name: {child['name']}
 Level: {child['level']}
-Total Sessions: {len(evaluations)}
+Total Sessions: {evaluations['count']}
 Emotion expressions: {emotion_info}
 
 Recent conversation summaries:
@@ -892,10 +1257,21 @@ Write a helpful, encouraging report (3-4 paragraphs) covering:
 
 Keep the tone warm, supportive, and celebratory of progress. Avoid clinical language."""
 
-    report = ollama.generate_simple(prompt)
+    model, base_url = route_llm(recent_summaries)
+    report = scheduler.run(
+        'report', ollama.generate_simple, prompt,
+        model=model, base_url=base_url, background=True,
+        backend=base_url, key=f"report:{child['id']}", default=''
+    )
     
     if not report or len(report) < 50:
-        report = f"""🌟 **Progress Overview for {child['name']}**
+        report = fallback_ai_report(child, emotion_counts)
+    
+    return report
+
+def fallback_ai_report(child, emotion_counts):
+    """Template report used until (or when) the LLM report is available"""
+    return f"""🌟 **Progress Overview for {child['name']}**
 
 {child['name']} has been making wonderful progress with our AI companions! They've reached Level {child['level']} and continue to grow each day.
 
@@ -904,8 +1280,24 @@ Keep the tone warm, supportive, and celebratory of progress. Avoid clinical lang
 **Emotional Expression**: {'The variety of emotions expressed shows healthy emotional awareness.' if len(emotion_counts) > 2 else 'We encourage continuing to explore different feelings with our emotion buttons.'}
 
 **Keep Going!** Every conversation is a step forward. We recommend maintaining regular, short sessions to build communication confidence."""
-    
-    return report
+
+# ==================== BACKGROUND JOBS ====================
+
+def on_job_done(job, status):
+    """A finished report changes the child's dashboard"""
+    if job['kind'] == 'report' and status == 'done':
+        db.mark_changed(job['payload']['child_id'])
+
+job_queue.register('summary', run_summary_job)
+job_queue.register('report', run_report_job)
+job_queue.done_fn = on_job_done
+job_queue.start()
+# An expired session lasted until its last turn, not until it was reaped
+sessions.start_reaper(
+    Config.SESSION_TTL, Config.SESSION_REAP_INTERVAL,
+    lambda session: finalize_session(session, until=session.last_active)
+)
+ollama.start_model_builder()
 
 # ==================== ERROR HANDLERS ====================
 
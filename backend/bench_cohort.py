@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Cohort Analytics Benchmark
+Vectorized CohortMetrics against a per-child ClinicalMetrics loop
+
+Both paths spend most of their time fetching rows from SQLite and
+tokenizing messages, so they run at about the same speed (0.8-1.1x across
+runs at 50-800 children). Counting messages per child and day in SQL was
+slower than fetching the rows. The cohort path's gain is one query per
+table instead of three per child, plus the distribution and weekly trend.
+
+Usage: python bench_cohort.py [children ...]   (default: 50 200 800)
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from cohort_analytics import CohortData, CohortMetrics
+from database import Database
+from metrics import ClinicalMetrics
+
+MESSAGES_PER_CHILD = 200
+SESSIONS_PER_CHILD = 10
+EVALUATIONS_PER_CHILD = 10
+WORDS = ['what', 'why', 'dog', 'is', 'cat', 'happy', 'the', 'I', 'like', 'can', 'we', 'play',
+         'ocean', 'fish', 'do', 'you', 'dinosaur', 'when', 'blue', 'big']
+
+
+def populate(db, children):
+    conn = db.get_connection()
+    conn.executemany(
+        'INSERT INTO children (name, avatar, age) VALUES (?, ?, ?)',
+        [(f'Child {i}', '🐙', random.randint(4, 14)) for i in range(children)]
+    )
+    conn.executemany(
+        "INSERT INTO conversations (child_id, character, message, response, timestamp) "
+        "VALUES (?, 'puffy', ?, 'Hi!', datetime('now', ?))",
+        [(child_id,
+          ' '.join(random.choice(WORDS) for _ in range(random.randint(1, 8))) + random.choice(['', '!', '?']),
+          f'-{random.randint(0, 90 * 24)} hours')
+         for child_id in range(1, children + 1) for _ in range(MESSAGES_PER_CHILD)]
+    )
+    conn.executemany(
+        "INSERT INTO sessions (child_id, character, start_time, turn_count) VALUES (?, 'puffy', datetime('now', ?), ?)",
+        [(child_id, f'-{random.randint(0, 90)} days', random.randint(0, 30))
+         for child_id in range(1, children + 1) for _ in range(SESSIONS_PER_CHILD)]
+    )
+    conn.executemany(
+        "INSERT INTO evaluations (child_id, character, emotion_count, emotion_accurate, timestamp) "
+        "VALUES (?, 'puffy', ?, ?, datetime('now', ?))",
+        [(child_id, total, random.randint(0, total), f'-{random.randint(0, 90)} days')
+         for child_id in range(1, children + 1) for total in
+         (random.randint(0, 6) for _ in range(EVALUATIONS_PER_CHILD))]
+    )
+    conn.commit()
+    conn.close()
+    db.rebuild_child_stats()
+
+
+def per_child_loop(db):
+    """
+    What computing the cohort looks like with ClinicalMetrics: one child at a time
+
+    conversations rows carry no role, so each message is passed as a 'user'
+    row the way CohortData reads them. Emoji accuracy is the parent
+    dashboard's (app.calculate_emoji_accuracy) over child_stats.
+    """
+    results = {}
+    for child in db.get_all_children():
+        child_id = child['id']
+        conn = db.get_connection()
+        messages = [row['message'] for row in conn.execute(
+            'SELECT message FROM conversations WHERE child_id = ?', (child_id,))]
+        conn.close()
+        metrics = db.get_clinical_metrics(child_id)
+        evaluations = db.get_evaluation_stats(child_id)
+        results[child_id] = {
+            'initiation_rate': ClinicalMetrics.calculate_initiation_rate(
+                [{'role': 'user', 'message': m} for m in messages]),
+            'semantic_entropy': ClinicalMetrics.calculate_semantic_entropy(messages),
+            'continuity': ClinicalMetrics.calculate_continuity_metric(metrics['sessions']),
+            'emoji_accuracy': evaluations['emotion_accurate'] / max(evaluations['emotion_total'], 1) * 100
+        }
+    return results
+
+
+def vectorized(db):
+    return CohortMetrics.compute(CohortData.from_database(db))
+
+
+def bench(children):
+    workdir = tempfile.mkdtemp()
+    path = os.path.join(workdir, 'bench.db')
+    try:
+        db = Database(path)
+        populate(db, children)
+
+        start = time.perf_counter()
+        loop = per_child_loop(db)
+        loop_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        cohort = vectorized(db)
+        vector_ms = (time.perf_counter() - start) * 1000
+
+        # Both must agree before the timings mean anything
+        for child in cohort['children']:
+            expected = loop[child['child_id']]
+            for metric, value in expected.items():
+                assert np.isclose(child[metric], round(value, 2), atol=0.011), (child['child_id'], metric)
+
+        db.pool.close_all()
+        return loop_ms, vector_ms
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [50, 200, 800]
+    random.seed(42)
+
+    print(f"{'children':>8} {'messages':>9} {'per-child ms':>13} {'vectorized ms':>14} {'speedup':>8}")
+    for children in sizes:
+        loop_ms, vector_ms = bench(children)
+        print(f"{children:>8} {children * MESSAGES_PER_CHILD:>9} {loop_ms:>13.1f} {vector_ms:>14.1f} "
+              f"{loop_ms / vector_ms:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
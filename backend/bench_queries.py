@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Query Benchmark
+Times the hot query paths against table size, before and after the
+index migration
+
+Usage: python bench_queries.py [rows ...]   (default: 1000 10000 100000)
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from database import Database
+
+CHILDREN = 50
+CHARACTERS = ['puffy', 'ollie', 'sheldon', 'clawde', 'finley']
+EMOTIONS = ['happy', 'sad', 'angry', 'scared', 'calm', None]
+REPEAT = 200
+
+
+def populate(db, rows):
+    """Insert `rows` conversations plus proportional sessions, logs and summaries"""
+    conn = db.get_connection()
+    conn.executemany(
+        'INSERT INTO children (name, avatar, age) VALUES (?, ?, ?)',
+        [(f'Child {i}', '🐙', random.randint(4, 14)) for i in range(CHILDREN)]
+    )
+    conn.executemany(
+        "INSERT INTO conversations (child_id, character, message, response, emotion, timestamp) "
+        "VALUES (?, ?, ?, ?, ?, datetime('now', ?))",
+        [(random.randint(1, CHILDREN), random.choice(CHARACTERS), 'hello there',
+          'Hi friend! What did you do today?', random.choice(EMOTIONS), f'-{i} seconds')
+         for i in range(rows)]
+    )
+    sessions = max(rows // 20, CHILDREN)
+    conn.executemany(
+        "INSERT INTO sessions (child_id, character, start_time) VALUES (?, ?, datetime('now', ?))",
+        [(random.randint(1, CHILDREN), random.choice(CHARACTERS), f'-{i} minutes') for i in range(sessions)]
+    )
+    conn.executemany(
+        'INSERT INTO emoji_logs (session_id, emotion, accurate) VALUES (?, ?, ?)',
+        [(random.randint(1, sessions), random.choice(EMOTIONS[:-1]), 1) for _ in range(rows // 5)]
+    )
+    conn.executemany(
+        "INSERT INTO summaries (child_id, character, session_id, summary, created_at) "
+        "VALUES (?, ?, ?, ?, datetime('now', ?))",
+        [(random.randint(1, CHILDREN), random.choice(CHARACTERS), random.randint(1, sessions),
+          'Likes dinosaurs.', f'-{i} minutes') for i in range(rows // 10)]
+    )
+    conn.executemany(
+        'INSERT INTO badges (child_id, badge_name) VALUES (?, ?)',
+        [(child_id, name) for child_id in range(1, CHILDREN + 1) for name in ('First Words', 'Chatty Friend')]
+    )
+    conn.commit()
+    conn.close()
+
+
+def timed(fn):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        fn()
+    return (time.perf_counter() - start) / REPEAT * 1000
+
+
+def run_queries(db):
+    child_id = CHILDREN // 2
+    return {
+        'history (get_conversations)': timed(lambda: db.get_conversations(child_id, limit=6)),
+        'latest summary': timed(lambda: db.get_latest_summary(child_id, 'puffy')),
+        'clinical metrics': timed(lambda: db.get_clinical_metrics(child_id)),
+        'badge check': timed(lambda: db.award_badge(child_id, 'First Words')),
+    }
+
+
+def bench(rows):
+    workdir = tempfile.mkdtemp()
+    path = os.path.join(workdir, 'bench.db')
+    try:
+        # Schema without indexes (version 1), then upgrade in place
+        db = Database(path, schema_version=1)
+        populate(db, rows)
+
+        before = run_queries(db)
+        start = time.perf_counter()
+        db.migrate()
+        migrate_ms = (time.perf_counter() - start) * 1000
+        after = run_queries(db)
+        db.pool.close_all()
+        return before, after, migrate_ms
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+    random.seed(42)
+
+    print(f"{'query':<30} {'rows':>8} {'no index ms':>12} {'indexed ms':>11} {'speedup':>8}")
+    for rows in sizes:
+        before, after, migrate_ms = bench(rows)
+        for name in before:
+            speedup = before[name] / after[name] if after[name] else 0
+            print(f"{name:<30} {rows:>8} {before[name]:>12.3f} {after[name]:>11.3f} {speedup:>7.1f}x")
+        print(f"{'(index migration)':<30} {rows:>8} {migrate_ms:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
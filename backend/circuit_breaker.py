@@ -0,0 +1,151 @@
+"""
+Circuit Breaker and Adaptive Concurrency Limit
+Fail fast while an Ollama backend is sick instead of waiting on timeouts
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+
+class CircuitOpen(Exception):
+    """Raised when a call is rejected by an open circuit"""
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker driven by error rate and latency
+
+    Calls slower than `slow_ms` count as failures; callers pass a latency
+    normalized per generated token, or None when only errors should count
+    (e.g. long background generations). Once at least `min_calls`
+    of the last `window` calls have finished and the failure rate reaches
+    `error_rate`, the circuit opens for `open_seconds`. After that one trial
+    call is let through (half-open): success closes the circuit, failure
+    opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, window: int = 20, min_calls: int = 5, error_rate: float = 0.5,
+                 slow_ms: float = 30000, open_seconds: float = 15):
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_ms = slow_ms
+        self.open_seconds = open_seconds
+
+        self.state = self.CLOSED
+        self.opened_until = 0.0
+        self._results = deque(maxlen=window)
+        self._trial_running = False
+        self._lock = threading.Lock()
+        self.stats = {'rejected': 0, 'opened': 0}
+
+    def allow(self) -> bool:
+        """Whether a call may go through now"""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.time() < self.opened_until:
+                    self.stats['rejected'] += 1
+                    return False
+                self.state = self.HALF_OPEN
+                self._trial_running = False
+
+            if self.state == self.HALF_OPEN:
+                if self._trial_running:
+                    self.stats['rejected'] += 1
+                    return False
+                self._trial_running = True
+
+            return True
+
+    def record(self, ok: bool, latency_ms: Optional[float] = None):
+        """Record the outcome of a call that allow() let through"""
+        failed = not ok or (latency_ms is not None and latency_ms > self.slow_ms)
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._trial_running = False
+                if failed:
+                    self._open()
+                else:
+                    self.state = self.CLOSED
+                    self._results.clear()
+                return
+
+            self._results.append(failed)
+            if len(self._results) >= self.min_calls:
+                if sum(self._results) / len(self._results) >= self.error_rate:
+                    self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_until = time.time() + self.open_seconds
+        self._results.clear()
+        self.stats['opened'] += 1
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'open_for': max(round(self.opened_until - time.time(), 1), 0) if self.state == self.OPEN else 0,
+                'recent_failures': sum(self._results),
+                'recent_calls': len(self._results),
+                'rejected': self.stats['rejected'],
+                'opened': self.stats['opened']
+            }
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit
+
+    The limit grows by 1/limit for every call that finishes within
+    `target_ms` (about +1 per limit's worth of calls) and is cut by
+    `backoff` on a slow or failed call. It does not admit or reject calls
+    itself: LLMScheduler reads `current()` as the number of slots it hands
+    out for the backend. Latencies are per generated token; a call released
+    with latency None only counts when it fails.
+    """
+
+    def __init__(self, initial: int = 2, min_limit: int = 1, max_limit: int = 8,
+                 target_ms: float = 250, backoff: float = 0.7):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_ms = target_ms
+        self.backoff = backoff
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self.inflight = 0
+        self._lock = threading.Lock()
+        self.stats = {'increases': 0, 'decreases': 0}
+
+    def current(self) -> int:
+        """Concurrency the backend should get right now"""
+        with self._lock:
+            return int(self.limit)
+
+    def acquire(self):
+        with self._lock:
+            self.inflight += 1
+
+    def release(self, ok: bool, latency_ms: Optional[float] = None):
+        with self._lock:
+            self.inflight -= 1
+            if not ok or (latency_ms is not None and latency_ms > self.target_ms):
+                self.limit = max(self.limit * self.backoff, self.min_limit)
+                self.stats['decreases'] += 1
+            elif latency_ms is not None and self.limit < self.max_limit:
+                self.limit = min(self.limit + 1 / self.limit, self.max_limit)
+                self.stats['increases'] += 1
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'limit': round(self.limit, 2),
+                'inflight': self.inflight,
+                'increases': self.stats['increases'],
+                'decreases': self.stats['decreases']
+            }
@@ -0,0 +1,311 @@
+"""
+Cohort Analytics
+ClinicalMetrics for every child at once, over columnar NumPy arrays
+
+Two sources differ from calling ClinicalMetrics on raw rows:
+- Initiation rate: ClinicalMetrics.calculate_initiation_rate expects
+  role-tagged chat rows and only counts role == 'user'. Every
+  conversations row holds one child message (`message`) and its reply
+  (`response`), so all `message` values are treated as 'user' rows.
+- Emoji accuracy: emoji_logs is never written by the app, so accuracy comes
+  from the evaluations' emotion_count / emotion_accurate columns, the same
+  totals the parent dashboard uses (accurate / total * 100, summed per
+  child or week rather than averaged per row).
+"""
+
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from metrics import ClinicalMetrics
+
+# Never found by ClinicalMetrics.WORD_PATTERN in lowercased text; marks
+# where one child's messages end in the joined cohort text
+CHILD_BREAK = 'Q'
+
+NO_WEEK = -1
+
+
+def _weeks(days):
+    """'YYYY-MM-DD' strings -> day number of that week's Monday (NO_WEEK if missing)"""
+    days = np.array(days, dtype='datetime64[D]')
+    numbers = days.astype(np.int64)
+    # 1970-01-01 was a Thursday
+    mondays = numbers - (numbers + 3) % 7
+    return np.where(np.isnat(days), NO_WEEK, mondays)
+
+
+def _grouped_ratio(group, numerator, denominator, size, scale=100.0):
+    """sum(numerator) / sum(denominator) * scale per group position, 0 where the denominator is 0"""
+    top = np.bincount(group, weights=numerator, minlength=size) * scale
+    bottom = np.bincount(group, weights=denominator, minlength=size)
+    return np.divide(top, bottom, out=np.zeros(size), where=bottom > 0)
+
+
+def _grouped_rate(group, values, size, scale=100.0):
+    """sum(values) / count * scale per group position, 0 for empty groups"""
+    count = np.bincount(group, minlength=size).astype(np.float64)
+    total = np.bincount(group, weights=values, minlength=size) * scale
+    return np.divide(total, count, out=np.zeros(size), where=count > 0)
+
+
+class CohortData:
+    """
+    Conversations, sessions and evaluation emotion counts as parallel arrays
+
+    Rows are loaded with one query per table. `*_child` holds each row's
+    position in `child_ids` and `*_week` the day number of its week's
+    Monday, so per-child and per-week totals are a single np.bincount.
+    Messages are ordered by child.
+    """
+
+    def __init__(self, child_ids, names, messages, message_child, message_week, initiated,
+                 session_child, session_week, session_turns, emoji_child, emoji_week, emoji_total,
+                 emoji_accurate):
+        self.child_ids = child_ids
+        self.names = names
+        self.messages = messages
+        self.message_child = message_child
+        self.message_week = message_week
+        self.initiated = initiated
+        self.session_child = session_child
+        self.session_week = session_week
+        self.session_turns = session_turns
+        self.emoji_child = emoji_child
+        self.emoji_week = emoji_week
+        self.emoji_total = emoji_total
+        self.emoji_accurate = emoji_accurate
+
+    @classmethod
+    def from_database(cls, db, since_days: Optional[int] = None, child_ids: Optional[List[int]] = None):
+        """Load the cohort (all children by default), optionally only the last `since_days` days"""
+        child_filter = ''
+        child_params = []
+        if child_ids:
+            child_filter = f"IN ({', '.join('?' for _ in child_ids)})"
+            child_params = list(child_ids)
+
+        def where(child_column, time_column):
+            clauses = [f'{child_column} {child_filter}'] if child_filter else []
+            params = list(child_params)
+            if since_days:
+                clauses.append(f"{time_column} >= datetime('now', ?)")
+                params.append(f'-{int(since_days)} days')
+            return ('WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        cursor.row_factory = None  # plain tuples; much cheaper than sqlite3.Row at this size
+
+        cursor.execute(
+            f"SELECT id, name FROM children {'WHERE id ' + child_filter if child_filter else ''} ORDER BY id",
+            child_params
+        )
+        children = cursor.fetchall()
+
+        clause, params = where('child_id', 'timestamp')
+        cursor.execute(f'''
+            SELECT child_id, COALESCE(message, ''), substr(timestamp, 1, 10)
+            FROM conversations {clause} ORDER BY child_id
+        ''', params)
+        conversations = cursor.fetchall()
+
+        clause, params = where('child_id', 'start_time')
+        cursor.execute(f'''
+            SELECT child_id, COALESCE(turn_count, 0), substr(start_time, 1, 10)
+            FROM sessions {clause}
+        ''', params)
+        sessions = cursor.fetchall()
+
+        clause, params = where('child_id', 'timestamp')
+        cursor.execute(f'''
+            SELECT child_id, emotion_count, COALESCE(emotion_accurate, 0), substr(timestamp, 1, 10)
+            FROM evaluations {clause} {'AND' if clause else 'WHERE'} emotion_count > 0
+        ''', params)
+        emotions = cursor.fetchall()
+        conn.close()
+
+        ids = np.array([row[0] for row in children], dtype=np.int64)
+
+        def columns(rows, width=3):
+            return list(zip(*rows)) if rows else [()] * width
+
+        def positions(raw):
+            # Position of each row's child in `ids`; -1 for children not loaded
+            raw = np.array([child_id or 0 for child_id in raw], dtype=np.int64)
+            if not len(ids):
+                return np.full(len(raw), -1, dtype=np.int64)
+            found = np.minimum(np.searchsorted(ids, raw), len(ids) - 1)
+            return np.where(ids[found] == raw, found, -1)
+
+        message_children, messages, message_days = columns(conversations)
+        message_child = positions(message_children)
+        keep = message_child >= 0
+        messages = [text for text, k in zip(messages, keep) if k]
+
+        # Same test as ClinicalMetrics.calculate_initiation_rate
+        starters = tuple(ClinicalMetrics.INITIATION_WORDS)
+        initiated = np.fromiter((text.lower().startswith(starters) or text.endswith('!') for text in messages),
+                                dtype=np.float64, count=len(messages))
+
+        session_children, turns, session_days = columns(sessions)
+        session_child = positions(session_children)
+        keep_sessions = session_child >= 0
+
+        emoji_children, totals, accurate, emoji_days = columns(emotions, 4)
+        emoji_child = positions(emoji_children)
+        keep_emoji = emoji_child >= 0
+
+        return cls(
+            child_ids=ids,
+            names=[row[1] for row in children],
+            messages=messages,
+            message_child=message_child[keep],
+            message_week=_weeks(message_days)[keep],
+            initiated=initiated,
+            session_child=session_child[keep_sessions],
+            session_week=_weeks(session_days)[keep_sessions],
+            session_turns=np.array(turns, dtype=np.float64)[keep_sessions],
+            emoji_child=emoji_child[keep_emoji],
+            emoji_week=_weeks(emoji_days)[keep_emoji],
+            emoji_total=np.array(totals, dtype=np.float64)[keep_emoji],
+            emoji_accurate=np.array(accurate, dtype=np.float64)[keep_emoji]
+        )
+
+
+class CohortMetrics:
+    """
+    Vectorized ClinicalMetrics
+
+    Each metric returns one value per child (in CohortData.child_ids
+    order) and matches the ClinicalMetrics method run on that child's
+    rows alone; emoji_accuracy matches the parent dashboard instead (see
+    the module docstring).
+    """
+
+    @staticmethod
+    def initiation_rate(data: CohortData) -> np.ndarray:
+        return _grouped_rate(data.message_child, data.initiated, len(data.child_ids))
+
+    @staticmethod
+    def emoji_accuracy(data: CohortData) -> np.ndarray:
+        return _grouped_ratio(data.emoji_child, data.emoji_accurate, data.emoji_total, len(data.child_ids))
+
+    @staticmethod
+    def continuity(data: CohortData) -> np.ndarray:
+        return _grouped_rate(data.session_child, data.session_turns, len(data.child_ids), scale=1.0)
+
+    @staticmethod
+    def semantic_entropy(data: CohortData) -> np.ndarray:
+        """
+        Unique / total words per child
+
+        The whole cohort is tokenized in one regex pass, with CHILD_BREAK
+        between children. Words are hashed to integers so the distinct
+        (child, word) pairs come from one sort.
+        """
+        size = len(data.child_ids)
+        if not data.messages:
+            return np.zeros(size)
+
+        # Messages are ordered by child; a block starts where the child changes
+        starts = np.flatnonzero(np.diff(data.message_child)) + 1
+        bounds = [0, *starts.tolist(), len(data.messages)]
+        text = f' {CHILD_BREAK} '.join('\n'.join(data.messages[a:b]).lower() for a, b in zip(bounds, bounds[1:]))
+        words = ClinicalMetrics.WORD_PATTERN.findall(text)
+
+        hashes = np.fromiter(map(hash, words), dtype=np.int64, count=len(words))
+        is_break = hashes == hash(CHILD_BREAK)
+        block = np.cumsum(is_break)[~is_break]
+        hashes = hashes[~is_break]
+        word_child = data.message_child[bounds[:-1]][block]
+
+        order = np.lexsort((hashes, word_child))
+        hashes, word_child = hashes[order], word_child[order]
+        first = np.ones(len(hashes), dtype=bool)
+        first[1:] = (hashes[1:] != hashes[:-1]) | (word_child[1:] != word_child[:-1])
+
+        total = np.bincount(word_child, minlength=size).astype(np.float64)
+        unique = np.bincount(word_child[first], minlength=size) * 100.0
+        return np.divide(unique, total, out=np.zeros(size), where=total > 0)
+
+    @staticmethod
+    def timeline(data: CohortData) -> Dict:
+        """Weekly cohort-wide rates (rows without a date are skipped)"""
+        size = max(len(data.child_ids), 1)
+        all_weeks = np.concatenate([data.message_week, data.session_week, data.emoji_week])
+        weeks = np.unique(all_weeks[all_weeks != NO_WEEK])
+        n = len(weeks)
+
+        def by_week(week, child, values):
+            dated = week != NO_WEEK
+            return np.searchsorted(weeks, week[dated]), child[dated], values[dated]
+
+        message_pos, message_child, initiated = by_week(data.message_week, data.message_child, data.initiated)
+        session_pos, session_child, turns = by_week(data.session_week, data.session_child, data.session_turns)
+        emoji_pos, emoji_child, accurate = by_week(data.emoji_week, data.emoji_child, data.emoji_accurate)
+        emoji_total = data.emoji_total[data.emoji_week != NO_WEEK]
+
+        active = np.unique(np.concatenate([
+            message_pos * size + message_child,
+            session_pos * size + session_child,
+            emoji_pos * size + emoji_child
+        ]))
+
+        return {
+            'weeks': [str(np.datetime64(int(day), 'D')) for day in weeks],
+            'active_children': np.bincount(active // size, minlength=n).tolist(),
+            'messages': np.bincount(message_pos, minlength=n).tolist(),
+            'initiation_rate': np.round(_grouped_rate(message_pos, initiated, n), 2).tolist(),
+            'continuity': np.round(_grouped_rate(session_pos, turns, n, scale=1.0), 2).tolist(),
+            'emoji_accuracy': np.round(_grouped_ratio(emoji_pos, accurate, emoji_total, n), 2).tolist()
+        }
+
+    @staticmethod
+    def compute(data: CohortData) -> Dict:
+        """Per-child metrics, cohort distribution and weekly cohort trend"""
+        size = len(data.child_ids)
+        per_child = {
+            'initiation_rate': CohortMetrics.initiation_rate(data),
+            'semantic_entropy': CohortMetrics.semantic_entropy(data),
+            'continuity': CohortMetrics.continuity(data),
+            'emoji_accuracy': CohortMetrics.emoji_accuracy(data)
+        }
+        has_messages = np.bincount(data.message_child, minlength=size) > 0
+        observed = {
+            'initiation_rate': has_messages,
+            'semantic_entropy': has_messages,
+            'continuity': np.bincount(data.session_child, minlength=size) > 0,
+            'emoji_accuracy': np.bincount(data.emoji_child, minlength=size) > 0
+        }
+
+        # Children without rows for a metric are left out of its distribution
+        distribution = {}
+        for name, values in per_child.items():
+            values = values[observed[name]]
+            if len(values):
+                p25, median, p75 = np.percentile(values, [25, 50, 75])
+                distribution[name] = {
+                    'children': int(len(values)),
+                    'mean': round(float(values.mean()), 2),
+                    'p25': round(float(p25), 2),
+                    'median': round(float(median), 2),
+                    'p75': round(float(p75), 2)
+                }
+            else:
+                distribution[name] = {'children': 0}
+
+        children = [
+            {
+                'child_id': int(child_id),
+                'name': name,
+                **{metric: round(float(values[i]), 2) for metric, values in per_child.items()}
+            }
+            for i, (child_id, name) in enumerate(zip(data.child_ids, data.names))
+        ]
+
+        return {
+            'children': children,
+            'cohort': distribution,
+            'timeline': CohortMetrics.timeline(data)
+        }
@@ -14,10 +14,103 @@ class Config:
     OLLAMA_BASE_URL = 'http://localhost:11434'
     OLLAMA_MODEL = 'llama3.2'
     OLLAMA_MODEL_TAMIL = 'sarvam-1'  # For multilingual
+    # Inference endpoints (comma-separated URLs in OLLAMA_BACKENDS to scale out)
+    OLLAMA_BACKENDS = [
+        url.strip() for url in os.getenv('OLLAMA_BACKENDS', OLLAMA_BASE_URL).split(',') if url.strip()
+    ]
+    OLLAMA_BACKEND_MODELS = [OLLAMA_MODEL, OLLAMA_MODEL_TAMIL]  # Assumed until a backend is probed
+    OLLAMA_LANGUAGE_MODELS = {  # Preferred model per detected language
+        'en': OLLAMA_MODEL,
+        'ta': OLLAMA_MODEL_TAMIL,
+        'mr': OLLAMA_MODEL_TAMIL
+    }
+    OLLAMA_EJECT_SECONDS = 30  # How long a failing backend is skipped
+    
+    # Circuit breaker and adaptive concurrency limit (per backend)
+    OLLAMA_BREAKER_WINDOW = 20  # Recent calls considered
+    OLLAMA_BREAKER_MIN_CALLS = 5  # Calls needed before the circuit can open
+    OLLAMA_BREAKER_ERROR_RATE = 0.5  # Failure share that opens the circuit
+    OLLAMA_BREAKER_SLOW_MS = 1000  # Calls slower than this per generated token count as failures
+    OLLAMA_BREAKER_OPEN_SECONDS = 15  # Fail fast this long before a trial call
+    OLLAMA_LIMIT_MAX = 8  # Upper bound for the AIMD concurrency limit (scheduler slots)
+    OLLAMA_LIMIT_TARGET_MS = 250  # Calls slower than this per generated token shrink the limit
     OLLAMA_TIMEOUT = 120  # Increased timeout for slower responses
+    OLLAMA_POOL_CONNECTIONS = 4  # Distinct hosts kept in the connection pool
+    OLLAMA_POOL_MAXSIZE = 16  # Keep-alive connections per host
+    OLLAMA_HEALTH_INTERVAL = 10  # seconds between background health probes
+    OLLAMA_KEEP_ALIVE = '30m'  # Keep the model resident between turns
+    OLLAMA_CONTEXT_MAX_TOKENS = 3000  # Rebuild a session's context past this size
+    
+    # Prompt token budget (estimated tokens)
+    PROMPT_TOKEN_BUDGET = 1500  # Whole rebuilt prompt
+    PROMPT_SUMMARY_TOKENS = 300  # Context summary sent by the client
+    PROMPT_MESSAGE_TOKENS = 200  # Any single chat message
+    PROMPT_HISTORY_TURNS = 6  # Most recent turns considered
+    
+    # Reply length
+    MAX_REPLY_SENTENCES = 2
+    OLLAMA_EARLY_STOP = True  # Close the Ollama stream once the reply is long enough (the next turn then rebuilds its prompt)
+    OLLAMA_DERIVED_MODELS = True  # Bake character + age prompts into derived models
+    OLLAMA_DERIVED_PREFIX = 'charai'
+    OLLAMA_DERIVED_RETRY_MAX = 600  # Longest wait (seconds) between derived model build rounds
+    
+    # LLM Scheduler
+    CHAT_LATENCY_BUDGET = 4  # seconds before a chat turn answers with the character fallback
+    LLM_DEADLINE_WORKERS = 8  # Background threads finishing generations past their budget
+    LLM_DEADLINE_QUEUE = 16  # Chat turns in flight past those threads before answering with the fallback at once
+    # Scheduler slots, the AIMD limit and the circuit breaker are per worker
+    # process: with N workers a backend sees up to N times these limits
+    LLM_MAX_CONCURRENCY = 2  # Concurrent Ollama jobs per backend to start with (then the AIMD limit)
+    LLM_INTERACTIVE_RESERVED = 1  # Slots only live chat turns may use
+    LLM_STALE_AFTER = {  # Max seconds a job may wait in the queue
+        'chat': 30,
+        'options': 10,
+        'scaffold': 10,
+        'summary': 120,
+        'report': 60
+    }
     
     # Database
     DATABASE_PATH = 'autism_ai.db'
+    DB_CACHE_SIZE_KB = 8000  # SQLite page cache per connection
+    DB_MMAP_SIZE = 64 * 1024 * 1024  # Memory-mapped I/O
+    DB_BUSY_TIMEOUT_MS = 5000  # Wait this long for a lock before failing
+    
+    # Active sessions: 'memory' (one worker process) or 'sqlite' (shared by
+    # all workers, e.g. gunicorn -w 4)
+    SESSION_STORE = os.getenv('SESSION_STORE', 'memory')
+    SESSION_TTL = 30 * 60  # seconds without a turn before a session is ended
+    SESSION_REAP_INTERVAL = 60  # seconds between idle-session sweeps
+    SESSION_MAX_MESSAGES = 20  # recent child messages kept per session
+    
+    # Background Jobs
+    JOB_WORKERS = 1  # LLM-bound; the scheduler limits Ollama concurrency anyway
+    JOB_POLL_INTERVAL = 2  # seconds
+    JOB_HEARTBEAT_INTERVAL = 15  # seconds between heartbeats of running jobs
+    JOB_REQUEUE_AFTER = 60  # re-queue running jobs without a heartbeat this long
+    JOB_RETENTION = 7 * 24 * 3600  # seconds finished jobs are kept
+    JOB_MAX_ATTEMPTS = 3  # claims before an interrupted job is failed instead of re-queued
+    REPORT_MAX_AGE = 600  # seconds before a parent's AI report is regenerated
+    
+    # Parent dashboard cache per process, invalidated by writes for the child
+    # through a change counter in the database shared by all workers
+    DASHBOARD_CACHE_ENTRIES = 500
+    DASHBOARD_CACHE_MAX_AGE = REPORT_MAX_AGE  # also re-checks the AI report
+    
+    # Text-to-speech: 'gtts' (online, MP3) or 'pyttsx3' (offline espeak-ng /
+    # SAPI5 in worker processes, WAV)
+    TTS_BACKEND = os.getenv('TTS_BACKEND', 'gtts')
+    TTS_MAX_CONCURRENCY = 2  # gtts renders at once per app process
+    TTS_QUEUE_TIMEOUT = 10  # seconds to wait for a free render slot (then 503)
+    TTS_WORKERS = 2  # offline engine processes (= offline renders at once)
+    TTS_RENDER_TIMEOUT = 20  # seconds
+    TTS_OFFLINE_RATE = 150  # words per minute
+    TTS_PIPELINE_THREADS = 4  # sentences of streamed replies rendered at once
+    
+    # Text-to-speech audio cache (one subdirectory per backend)
+    TTS_CACHE_DIR = os.getenv('TTS_CACHE_DIR', 'tts_cache')
+    TTS_CACHE_MAX_BYTES = 200 * 1024 * 1024  # whole directory, across worker processes
+    TTS_CACHE_RESCAN_INTERVAL = 60  # seconds between directory scans on writes
     
     # Anti-Freeze Settings
     INACTIVITY_TIMEOUT = 15  # seconds
@@ -0,0 +1,155 @@
+"""
+SQLite Connection Manager
+One persistent, tuned connection per thread instead of a connect per query
+"""
+
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+
+class PooledConnection:
+    """
+    Handle to a thread's shared connection
+
+    Behaves like sqlite3.Connection, except that close() hands the
+    connection back instead of closing it. Work left uncommitted by the
+    outermost holder is rolled back so it cannot leak into the next user.
+    """
+
+    def __init__(self, manager, conn):
+        self._manager = manager
+        self._conn = conn
+        self._owner = threading.get_ident()
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            if threading.get_ident() == self._owner:
+                self._manager.release(self._conn)
+
+    def __del__(self):
+        # A handle dropped without close() (e.g. after an exception) is
+        # handed back when it is garbage collected
+        try:
+            self.close()
+        except:
+            pass
+
+
+class ConnectionManager:
+    """
+    Thread-local SQLite connections with WAL and tuned pragmas
+
+    Each thread opens its connection once and reuses it. In WAL mode
+    readers (dashboards) no longer block the writer (chat turns) and vice
+    versa. Connections of finished threads are closed the next time a
+    connection is opened.
+    """
+
+    def __init__(self, db_path: str, cache_size_kb: int = 8000, mmap_size: int = 64 * 1024 * 1024,
+                 busy_timeout_ms: int = 5000, synchronous: str = 'NORMAL'):
+        self.db_path = db_path
+        self.pragmas = {
+            'synchronous': synchronous,
+            'cache_size': -abs(cache_size_kb),  # negative = KiB rather than pages
+            'mmap_size': mmap_size,
+            'busy_timeout': busy_timeout_ms,
+            'temp_store': 'MEMORY'
+        }
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conns: Dict[int, tuple] = {}  # thread ident -> (thread, connection)
+        self.journal_mode: Optional[str] = None
+        self.stats = {'opened': 0, 'closed': 0, 'acquired': 0, 'reused': 0,
+                      'rollbacks': 0, 'open_ms': 0.0}
+
+    def _open(self):
+        start = time.time()
+        conn = sqlite3.connect(self.db_path, timeout=self.pragmas['busy_timeout'] / 1000,
+                               check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        if self.journal_mode is None:
+            # Persistent in the database file; only needs setting once
+            self.journal_mode = conn.execute('PRAGMA journal_mode=WAL').fetchone()[0]
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name}={value}')
+
+        current = threading.current_thread()
+        with self._lock:
+            self._prune()
+            self._conns[current.ident] = (current, conn)
+            self.stats['opened'] += 1
+            self.stats['open_ms'] += (time.time() - start) * 1000
+        return conn
+
+    def _prune(self):
+        # Close connections whose owning thread has exited
+        for ident, (thread, conn) in list(self._conns.items()):
+            if not thread.is_alive():
+                del self._conns[ident]
+                try:
+                    conn.close()
+                except:
+                    pass
+                self.stats['closed'] += 1
+
+    def acquire(self) -> PooledConnection:
+        """Get this thread's connection (opened on first use)"""
+        conn = getattr(self._local, 'conn', None)
+        with self._lock:
+            self.stats['acquired'] += 1
+            if conn is not None:
+                self.stats['reused'] += 1
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+            self._local.depth = 0
+        self._local.depth += 1
+        return PooledConnection(self, conn)
+
+    def release(self, conn):
+        self._local.depth = max(self._local.depth - 1, 0)
+        if self._local.depth == 0 and conn.in_transaction:
+            conn.rollback()
+            with self._lock:
+                self.stats['rollbacks'] += 1
+
+    def close_all(self):
+        """Close every connection (e.g. on shutdown)"""
+        with self._lock:
+            for thread, conn in self._conns.values():
+                try:
+                    conn.close()
+                except:
+                    pass
+                self.stats['closed'] += 1
+            self._conns.clear()
+        self._local = threading.local()
+
+    def get_stats(self):
+        with self._lock:
+            opened = self.stats['opened']
+            return {
+                'journal_mode': self.journal_mode,
+                'pragmas': dict(self.pragmas),
+                'open_connections': len(self._conns),
+                'opened': opened,
+                'closed': self.stats['closed'],
+                'acquired': self.stats['acquired'],
+                'reused': self.stats['reused'],
+                'reuse_ratio': round(self.stats['reused'] / self.stats['acquired'], 3) if self.stats['acquired'] else 0,
+                'rollbacks': self.stats['rollbacks'],
+                'avg_open_ms': round(self.stats['open_ms'] / opened, 2) if opened else 0
+            }
@@ -0,0 +1,109 @@
+"""
+Dashboard Cache
+Rendered parent dashboards per child, invalidated by writes
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+
+class CachedDashboard:
+    __slots__ = ('generation', 'body', 'etag', 'stored_at')
+
+    def __init__(self, generation, body, etag):
+        self.generation = generation
+        self.body = body
+        self.etag = etag
+        self.stored_at = time.time()
+
+
+class DashboardCache:
+    """
+    Serialized dashboard bodies keyed by child_id
+
+    Every write touching a child bumps that child's generation counter and
+    drops its entry. A dashboard computed while a write happened is not
+    stored, because its generation is already out of date. Entries also
+    expire after `max_age` seconds so time-based parts (AI report refresh,
+    weekly activity) do not go stale when nothing is written.
+
+    With generation_fn set (e.g. Database.get_generation), generations are
+    read from there instead of counted here, and every hit is checked
+    against it, so writes made by other worker processes invalidate this
+    process's entries as well.
+    """
+
+    def __init__(self, max_entries: int = 500, max_age: float = 600.0,
+                 generation_fn: Optional[Callable[[int], int]] = None):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.generation_fn = generation_fn
+        self.generations: Dict[int, int] = {}
+        self.entries: 'OrderedDict[int, CachedDashboard]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'evictions': 0, 'not_modified': 0}
+
+    def generation(self, child_id: int) -> int:
+        if self.generation_fn:
+            return self.generation_fn(child_id)
+        with self._lock:
+            return self.generations.get(child_id, 0)
+
+    def invalidate(self, child_id: int):
+        """Record a write for child_id"""
+        with self._lock:
+            self.generations[child_id] = self.generations.get(child_id, 0) + 1
+            self.entries.pop(child_id, None)
+            self.stats['invalidations'] += 1
+
+    def get(self, child_id: int) -> Optional[CachedDashboard]:
+        current = self.generation_fn(child_id) if self.generation_fn else None
+        with self._lock:
+            entry = self.entries.get(child_id)
+            if entry and (time.time() - entry.stored_at > self.max_age
+                          or (current is not None and entry.generation != current)):
+                del self.entries[child_id]
+                entry = None
+            if entry:
+                self.entries.move_to_end(child_id)
+                self.stats['hits'] += 1
+            else:
+                self.stats['misses'] += 1
+            return entry
+
+    def put(self, child_id: int, generation: int, body: str) -> CachedDashboard:
+        """
+        Store a body computed at `generation`; returns the entry either way
+
+        The ETag includes a content hash as well as the generation, since
+        generations counted here restart from zero when the process does.
+        """
+        digest = hashlib.sha1(body.encode('utf-8')).hexdigest()[:16]
+        entry = CachedDashboard(generation, body, f'{child_id}-{generation}-{digest}')
+        current = self.generation_fn(child_id) if self.generation_fn else None
+        with self._lock:
+            if current is None:
+                current = self.generations.get(child_id, 0)
+            if current == generation:
+                self.entries[child_id] = entry
+                self.entries.move_to_end(child_id)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+                    self.stats['evictions'] += 1
+        return entry
+
+    def record_not_modified(self):
+        with self._lock:
+            self.stats['not_modified'] += 1
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return {
+                'entries': len(self.entries),
+                **self.stats,
+                'hit_ratio': round(self.stats['hits'] / lookups, 3) if lookups else 0
+            }
@@ -1,21 +1,124 @@
 import sqlite3
 import json
 from datetime import datetime
+from connection_pool import ConnectionManager
 
 class Database:
-    def __init__(self, db_path='autism_ai.db'):
+    def __init__(self, db_path='autism_ai.db', schema_version=None, **pool_options):
         self.db_path = db_path
-        self.init_db()
+        # Persistent per-thread connections (WAL, tuned pragmas)
+        self.pool = ConnectionManager(db_path, **pool_options)
+        # Called with a child_id after a committed write that changes what a
+        # dashboard shows for that child (set by the app, e.g. cache invalidation)
+        self.change_fn = None
+        self.init_db(schema_version)
     
     def get_connection(self):
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        """This thread's connection; close() returns it for reuse"""
+        return self.pool.acquire()
     
-    def init_db(self):
-        """Initialize database tables"""
+    @staticmethod
+    def _bump_generation(cursor, child_id):
+        """
+        Count a change to a child's dashboard inside the caller's transaction
+        
+        The counter is shared by every worker process, so their dashboard
+        caches see the write. Call _changed() after the commit.
+        """
+        if child_id is None:
+            return
+        cursor.execute('''
+            INSERT INTO child_generations (child_id, generation) VALUES (?, 1)
+            ON CONFLICT(child_id) DO UPDATE SET generation = generation + 1
+        ''', (child_id,))
+    
+    def _changed(self, child_id):
+        if self.change_fn and child_id is not None:
+            self.change_fn(child_id)
+    
+    def mark_changed(self, child_id):
+        """Record a change to what a child's dashboard shows that is not a write here (e.g. a new AI report)"""
+        conn = self.get_connection()
+        self._bump_generation(conn.cursor(), child_id)
+        conn.commit()
+        conn.close()
+        self._changed(child_id)
+    
+    def get_generation(self, child_id):
+        """Number of changes recorded for a child's dashboard, across all processes"""
+        conn = self.get_connection()
+        row = conn.execute('SELECT generation FROM child_generations WHERE child_id = ?', (child_id,)).fetchone()
+        conn.close()
+        return row['generation'] if row else 0
+    
+    def get_stats(self):
+        """Connection pool metrics"""
+        return self.pool.get_stats()
+    
+    # ==================== SCHEMA MIGRATIONS ====================
+    
+    # (user_version, method) in order; append new migrations, never edit old ones
+    MIGRATIONS = [
+        (1, '_migrate_base_schema'),
+        (2, '_migrate_indexes'),
+        (3, '_migrate_child_counters'),
+        (4, '_migrate_session_messages'),
+        (5, '_migrate_evaluation_columns'),
+        (6, '_migrate_child_stats'),
+        (7, '_migrate_live_sessions'),
+        (8, '_migrate_live_session_link'),
+        (9, '_migrate_job_heartbeat'),
+        (10, '_migrate_child_generations'),
+    ]
+    
+    def init_db(self, schema_version=None):
+        """Create or upgrade the schema (to the latest version unless given)"""
+        self.migrate(schema_version)
+    
+    def migrate(self, target=None):
+        """
+        Apply pending migrations up to `target` (default: latest)
+        
+        The schema version is kept in PRAGMA user_version. Each migration
+        runs in its own transaction together with its version bump.
+        Returns the resulting version.
+        """
         conn = self.get_connection()
         cursor = conn.cursor()
+        version = cursor.execute('PRAGMA user_version').fetchone()[0]
+        
+        for number, method in self.MIGRATIONS:
+            if number <= version or (target is not None and number > target):
+                continue
+            try:
+                cursor.execute('BEGIN')
+                getattr(self, method)(cursor)
+                cursor.execute(f'PRAGMA user_version = {number}')
+                conn.commit()
+                version = number
+                print(f"Database migrated to version {number} ({method})")
+            except Exception:
+                conn.rollback()
+                conn.close()
+                raise
+        
+        conn.close()
+        return version
+    
+    def get_schema_version(self):
+        conn = self.get_connection()
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        conn.close()
+        return version
+    
+    @staticmethod
+    def _add_column(cursor, table, column, definition):
+        columns = [row['name'] for row in cursor.execute(f'PRAGMA table_info({table})').fetchall()]
+        if column not in columns:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+    
+    def _migrate_base_schema(self, cursor):
+        """Version 1: the original tables (no-op on databases that already have them)"""
         
         # Children table
         cursor.execute('''
@@ -31,11 +134,8 @@ class Database:
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
-        # Add age column if missing (for existing databases)
-        try:
-            cursor.execute('ALTER TABLE children ADD COLUMN age INTEGER DEFAULT 10')
-        except:
-            pass
+        # Add age column if missing (databases created before it existed)
+        self._add_column(cursor, 'children', 'age', 'INTEGER DEFAULT 10')
         
         # Conversations table
         cursor.execute('''
@@ -143,10 +243,362 @@ class Database:
             )
         ''')
 
-        conn.commit()
-        conn.close()
+        # Background jobs (summaries, AI reports)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                dedupe_key TEXT,
+                payload TEXT,
+                status TEXT DEFAULT 'queued',
+                result TEXT,
+                error TEXT,
+                attempts INTEGER DEFAULT 0,
+                created_at REAL,
+                started_at REAL,
+                finished_at REAL
+            )
+        ''')
 
 
+    def _migrate_indexes(self, cursor):
+        """Version 2: indexes for the hot query paths"""
+        
+        # History, dashboards and badge counts: WHERE child_id = ? ORDER BY timestamp
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_conversations_child_time ON conversations(child_id, timestamp)')
+        
+        # Latest summary per child and character
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_summaries_child_character ON summaries(child_id, character, created_at)')
+        
+        # Sessions per child, and the per-session logs joined to them
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessions_child_start ON sessions(child_id, start_time)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_emoji_logs_session ON emoji_logs(session_id, emotion, accurate)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_anti_freeze_logs_session ON anti_freeze_logs(session_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_evaluations_child_time ON evaluations(child_id, timestamp)')
+        
+        # A badge is earned once; drop duplicates left by racing requests first
+        cursor.execute('''
+            DELETE FROM badges WHERE id NOT IN (
+                SELECT MIN(id) FROM badges GROUP BY child_id, badge_name
+            )
+        ''')
+        cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_badges_child_name ON badges(child_id, badge_name)')
+        
+        # One saved chat per session; keep the newest copy
+        cursor.execute('''
+            DELETE FROM session_chats WHERE id NOT IN (
+                SELECT MAX(id) FROM session_chats GROUP BY child_id, session_id
+            )
+        ''')
+        cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_session_chats_child_session ON session_chats(child_id, session_id)')
+        
+        # Job queue: claim the oldest queued job, find pending jobs by key
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_dedupe ON jobs(dedupe_key, status)')
+    
+    def _migrate_child_counters(self, cursor):
+        """Version 3: per-child turn counters kept up to date by record_turn"""
+        self._add_column(cursor, 'children', 'total_turns', 'INTEGER DEFAULT 0')
+        self._add_column(cursor, 'children', 'character_turns', "TEXT DEFAULT '{}'")
+        self._add_column(cursor, 'children', 'emotion_counts', "TEXT DEFAULT '{}'")
+        
+        # Backfill from existing conversations
+        counters = {}
+        cursor.execute('SELECT child_id, character, COUNT(*) AS n FROM conversations GROUP BY child_id, character')
+        for row in cursor.fetchall():
+            child = counters.setdefault(row['child_id'], {'total': 0, 'characters': {}, 'emotions': {}})
+            child['total'] += row['n']
+            child['characters'][row['character']] = row['n']
+        cursor.execute('''
+            SELECT child_id, emotion, COUNT(*) AS n FROM conversations
+            WHERE emotion IS NOT NULL AND emotion != ''
+            GROUP BY child_id, emotion
+        ''')
+        for row in cursor.fetchall():
+            child = counters.setdefault(row['child_id'], {'total': 0, 'characters': {}, 'emotions': {}})
+            child['emotions'][row['emotion']] = row['n']
+        
+        for child_id, child in counters.items():
+            cursor.execute(
+                'UPDATE children SET total_turns = ?, character_turns = ?, emotion_counts = ? WHERE id = ?',
+                (child['total'], json.dumps(child['characters']), json.dumps(child['emotions']), child_id)
+            )
+    
+    def _migrate_session_messages(self, cursor):
+        """Version 4: one row per synced chat message instead of a rewritten JSON blob"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS session_messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                child_id INTEGER,
+                session_id INTEGER,
+                seq INTEGER NOT NULL,
+                role TEXT,
+                content TEXT,
+                emotion TEXT,
+                client_ts INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (child_id) REFERENCES children(id)
+            )
+        ''')
+        cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_session_messages_seq ON session_messages(child_id, session_id, seq)')
+        
+        # Move existing blobs into rows
+        cursor.execute('SELECT child_id, session_id, chat_history FROM session_chats WHERE chat_history IS NOT NULL')
+        for row in cursor.fetchall():
+            try:
+                messages = json.loads(row['chat_history'] or '[]')
+            except:
+                continue
+            self._insert_messages(cursor, row['child_id'], row['session_id'], 0, messages)
+        cursor.execute('UPDATE session_chats SET chat_history = NULL')
+    
+    # Typed evaluation columns, filled from the client's evaluation dict
+    EVALUATION_COLUMNS = [
+        ('clarity', 'REAL'),
+        ('engagement', 'REAL'),
+        ('reciprocity', 'REAL'),
+        ('sentence_complexity', 'REAL'),
+        ('vocabulary_diversity', 'REAL'),
+        ('topic_maintenance', 'REAL'),
+        ('latency_sum', 'REAL'),
+        ('latency_count', 'INTEGER'),
+        ('emotion_count', 'INTEGER'),
+        ('emotion_accurate', 'INTEGER')
+    ]
+    
+    def _migrate_evaluation_columns(self, cursor):
+        """Version 5: evaluation fields as typed columns so dashboards aggregate in SQL"""
+        for column, definition in self.EVALUATION_COLUMNS:
+            self._add_column(cursor, 'evaluations', column, definition)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_evaluations_child_session ON evaluations(child_id, session_id)')
+        
+        # Backfill from the JSON blobs
+        cursor.execute('SELECT id, evaluation_data FROM evaluations')
+        for row in cursor.fetchall():
+            try:
+                data = json.loads(row['evaluation_data'] or '{}')
+            except:
+                data = {}
+            values = self._evaluation_values(data)
+            assignments = ', '.join(f'{column} = ?' for column, _ in self.EVALUATION_COLUMNS)
+            cursor.execute(f'UPDATE evaluations SET {assignments} WHERE id = ?', values + [row['id']])
+    
+    @classmethod
+    def _evaluation_values(cls, data):
+        """
+        Column values for an evaluation dict, in EVALUATION_COLUMNS order
+        
+        A section missing from the dict leaves its columns NULL, so SQL
+        aggregates skip it the way the dashboard always has.
+        """
+        values = dict.fromkeys(column for column, _ in cls.EVALUATION_COLUMNS)
+        
+        skills = data.get('communicationSkills')
+        if isinstance(skills, dict):
+            values['clarity'] = skills.get('clarity', 0)
+            values['engagement'] = skills.get('engagement', 0)
+            values['reciprocity'] = skills.get('reciprocity', 0)
+        
+        maturity = data.get('maturityIndicators')
+        if isinstance(maturity, dict):
+            values['sentence_complexity'] = maturity.get('sentenceComplexity', 0)
+            values['vocabulary_diversity'] = maturity.get('vocabularyDiversity', 0)
+        
+        social = data.get('socialMetrics')
+        if isinstance(social, dict):
+            latencies = [t for t in social.get('responseLatency', []) if isinstance(t, (int, float))]
+            values['topic_maintenance'] = social.get('topicMaintenance', 0)
+            values['latency_sum'] = sum(latencies)
+            values['latency_count'] = len(latencies)
+        
+        emotions = data.get('emotionTracking')
+        if isinstance(emotions, list):
+            values['emotion_count'] = len(emotions)
+            # Basic validation: the emotion came with a real message
+            values['emotion_accurate'] = sum(
+                1 for e in emotions if isinstance(e, dict) and e.get('messageLength', 0) > 3
+            )
+        
+        return [values[column] for column, _ in cls.EVALUATION_COLUMNS]
+    
+    def _migrate_child_stats(self, cursor):
+        """Version 6: dashboard aggregates maintained on write"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS child_stats (
+                child_id INTEGER PRIMARY KEY,
+                total_sessions INTEGER DEFAULT 0,
+                eval_count INTEGER DEFAULT 0,
+                reciprocity_total REAL DEFAULT 0,
+                emotion_total INTEGER DEFAULT 0,
+                emotion_accurate INTEGER DEFAULT 0,
+                sentence_complexity_sum REAL DEFAULT 0,
+                sentence_complexity_n INTEGER DEFAULT 0,
+                vocabulary_diversity_sum REAL DEFAULT 0,
+                vocabulary_diversity_n INTEGER DEFAULT 0,
+                topic_maintenance_sum REAL DEFAULT 0,
+                topic_maintenance_n INTEGER DEFAULT 0,
+                latency_sum REAL DEFAULT 0,
+                latency_count INTEGER DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (child_id) REFERENCES children(id)
+            )
+        ''')
+        # Turns per child per day (UTC, like conversations.timestamp)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS child_activity (
+                child_id INTEGER,
+                day DATE,
+                turns INTEGER DEFAULT 0,
+                PRIMARY KEY (child_id, day)
+            )
+        ''')
+        self._rebuild_stats(cursor)
+    
+    def _migrate_live_sessions(self, cursor):
+        """Version 7: in-progress sessions shared by all worker processes (SQLiteSessionStore)"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS live_sessions (
+                session_id INTEGER PRIMARY KEY,
+                child_id INTEGER,
+                character TEXT,
+                start_time REAL,
+                turn_count INTEGER DEFAULT 0,
+                messages TEXT DEFAULT '[]',
+                state TEXT DEFAULT '{}',
+                updated_at REAL
+            )
+        ''')
+    
+    def _migrate_live_session_link(self, cursor):
+        """Version 8: live sessions point at their row in `sessions`, finalized on end or expiry"""
+        self._add_column(cursor, 'live_sessions', 'db_session_id', 'INTEGER')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_live_sessions_updated ON live_sessions(updated_at)')
+    
+    def _migrate_job_heartbeat(self, cursor):
+        """Version 9: running jobs refresh heartbeat_at so jobs of a dead process can be re-queued"""
+        self._add_column(cursor, 'jobs', 'heartbeat_at', 'REAL')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs(finished_at)')
+    
+    def _migrate_child_generations(self, cursor):
+        """Version 10: per-child change counter shared by the dashboard caches of all workers"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS child_generations (
+                child_id INTEGER PRIMARY KEY,
+                generation INTEGER DEFAULT 0
+            )
+        ''')
+    
+    # ==================== CHILD STATS ====================
+    
+    # Evaluation column -> child_stats sum column (and count column for averages)
+    STATS_SUMS = {
+        'reciprocity': ('reciprocity_total', None),
+        'emotion_count': ('emotion_total', None),
+        'emotion_accurate': ('emotion_accurate', None),
+        'sentence_complexity': ('sentence_complexity_sum', 'sentence_complexity_n'),
+        'vocabulary_diversity': ('vocabulary_diversity_sum', 'vocabulary_diversity_n'),
+        'topic_maintenance': ('topic_maintenance_sum', 'topic_maintenance_n'),
+        'latency_sum': ('latency_sum', None),
+        'latency_count': ('latency_count', None)
+    }
+    
+    def rebuild_child_stats(self, child_id=None):
+        """Recompute child_stats and child_activity from the raw tables (all children by default)"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            self._rebuild_stats(cursor, child_id)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    
+    def _rebuild_stats(self, cursor, child_id=None):
+        where = 'WHERE child_id = ?' if child_id is not None else ''
+        params = (child_id,) if child_id is not None else ()
+        
+        cursor.execute(f'DELETE FROM child_stats {where}', params)
+        cursor.execute(f'DELETE FROM child_activity {where}', params)
+        
+        if child_id is not None:
+            cursor.execute('INSERT INTO child_stats (child_id) SELECT id FROM children WHERE id = ?', params)
+        else:
+            cursor.execute('INSERT INTO child_stats (child_id) SELECT id FROM children')
+        
+        cursor.execute(f'''
+            UPDATE child_stats SET total_sessions = (
+                SELECT COUNT(*) FROM sessions WHERE sessions.child_id = child_stats.child_id
+            ) {where}
+        ''', params)
+        
+        sums = ', '.join(
+            f'{total} = (SELECT COALESCE(SUM({column}), 0) FROM evaluations e WHERE e.child_id = child_stats.child_id)'
+            + (f', {count} = (SELECT COUNT({column}) FROM evaluations e WHERE e.child_id = child_stats.child_id)' if count else '')
+            for column, (total, count) in self.STATS_SUMS.items()
+        )
+        cursor.execute(f'''
+            UPDATE child_stats SET
+                eval_count = (SELECT COUNT(*) FROM evaluations e WHERE e.child_id = child_stats.child_id),
+                {sums},
+                updated_at = datetime('now')
+            {where}
+        ''', params)
+        
+        cursor.execute(f'''
+            INSERT INTO child_activity (child_id, day, turns)
+            SELECT child_id, date(timestamp), COUNT(*) FROM conversations
+            {where}
+            GROUP BY child_id, date(timestamp)
+        ''', params)
+    
+    @staticmethod
+    def _bump_stats(cursor, child_id, **deltas):
+        cursor.execute('INSERT OR IGNORE INTO child_stats (child_id) VALUES (?)', (child_id,))
+        assignments = ', '.join(f'{column} = {column} + ?' for column in deltas)
+        cursor.execute(
+            f"UPDATE child_stats SET {assignments}, updated_at = datetime('now') WHERE child_id = ?",
+            list(deltas.values()) + [child_id]
+        )
+    
+    def _bump_evaluation_stats(self, cursor, child_id, values, sign):
+        """Add (sign=1) or remove (sign=-1) one evaluation's columns from child_stats"""
+        row = dict(zip([column for column, _ in self.EVALUATION_COLUMNS], values))
+        deltas = {'eval_count': sign}
+        for column, (total, count) in self.STATS_SUMS.items():
+            if row[column] is None:
+                continue
+            deltas[total] = deltas.get(total, 0) + sign * row[column]
+            if count:
+                deltas[count] = sign
+        self._bump_stats(cursor, child_id, **deltas)
+    
+    @staticmethod
+    def _bump_activity(cursor, child_id):
+        cursor.execute(
+            "UPDATE child_activity SET turns = turns + 1 WHERE child_id = ? AND day = date('now')",
+            (child_id,)
+        )
+        if cursor.rowcount == 0:
+            cursor.execute(
+                "INSERT INTO child_activity (child_id, day, turns) VALUES (?, date('now'), 1)",
+                (child_id,)
+            )
+    
+    def get_activity(self, child_id, days=28):
+        """Turns per day over the last `days` days, oldest first"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT day, turns FROM child_activity
+            WHERE child_id = ? AND day > date('now', ?)
+            ORDER BY day
+        ''', (child_id, f'-{int(days)} days'))
+        activity = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        return activity
     
     # Child operations
     def create_child(self, name, avatar, age=10):
@@ -170,9 +622,14 @@ class Database:
         cursor.execute('DELETE FROM summaries WHERE child_id = ?', (child_id,))
         cursor.execute('DELETE FROM evaluations WHERE child_id = ?', (child_id,))
         cursor.execute('DELETE FROM session_chats WHERE child_id = ?', (child_id,))
+        cursor.execute('DELETE FROM session_messages WHERE child_id = ?', (child_id,))
+        cursor.execute('DELETE FROM child_stats WHERE child_id = ?', (child_id,))
+        cursor.execute('DELETE FROM child_activity WHERE child_id = ?', (child_id,))
         cursor.execute('DELETE FROM children WHERE id = ?', (child_id,))
+        self._bump_generation(cursor, child_id)
         conn.commit()
         conn.close()
+        self._changed(child_id)
     
     def get_child(self, child_id):
         conn = self.get_connection()
@@ -180,7 +637,7 @@ class Database:
         cursor.execute('SELECT * FROM children WHERE id = ?', (child_id,))
         child = cursor.fetchone()
         conn.close()
-        return dict(child) if child else None
+        return self._child_dict(child) if child else None
     
     def get_all_children(self):
         conn = self.get_connection()
@@ -188,7 +645,18 @@ class Database:
         cursor.execute('SELECT * FROM children ORDER BY created_at DESC')
         children = cursor.fetchall()
         conn.close()
-        return [dict(child) for child in children]
+        return [self._child_dict(child) for child in children]
+    
+    @staticmethod
+    def _child_dict(row):
+        # Counter maps are stored as JSON
+        child = dict(row)
+        for field in ('character_turns', 'emotion_counts'):
+            try:
+                child[field] = json.loads(child.get(field) or '{}')
+            except:
+                child[field] = {}
+        return child
     
     def update_child_xp(self, child_id, xp_gain):
         conn = self.get_connection()
@@ -197,13 +665,22 @@ class Database:
             'UPDATE children SET xp = xp + ? WHERE id = ?',
             (xp_gain, child_id)
         )
+        self._bump_generation(cursor, child_id)
         conn.commit()
         conn.close()
+        self._changed(child_id)
     
     def update_streak(self, child_id):
         conn = self.get_connection()
         cursor = conn.cursor()
-        
+        self._update_streak(cursor, child_id)
+        self._bump_generation(cursor, child_id)
+        conn.commit()
+        conn.close()
+        self._changed(child_id)
+    
+    @staticmethod
+    def _update_streak(cursor, child_id):
         # Check last activity
         cursor.execute('SELECT last_activity, streak FROM children WHERE id = ?', (child_id,))
         result = cursor.fetchone()
@@ -228,9 +705,6 @@ class Database:
                 'UPDATE children SET streak = ?, last_activity = ? WHERE id = ?',
                 (current_streak, today.strftime('%Y-%m-%d'), child_id)
             )
-        
-        conn.commit()
-        conn.close()
     
     # Conversation operations
     def save_conversation(self, child_id, character, message, response, emotion=None):
@@ -240,8 +714,80 @@ class Database:
             'INSERT INTO conversations (child_id, character, message, response, emotion) VALUES (?, ?, ?, ?, ?)',
             (child_id, character, message, response, emotion)
         )
+        self._count_turn(cursor, child_id, character, emotion)
+        self._bump_activity(cursor, child_id)
+        self._bump_generation(cursor, child_id)
         conn.commit()
         conn.close()
+        self._changed(child_id)
+    
+    # Badges earned by conversation count
+    TURN_BADGES = [
+        ('First Words', 1),
+        ('Chatty Friend', 10)
+    ]
+    
+    def record_turn(self, child_id, character, message, response, emotion=None, xp_gain=10):
+        """
+        Save a chat turn with its XP, streak and badges in one transaction
+        
+        BEGIN IMMEDIATE takes the write lock up front, so concurrent turns
+        for the same child are serialized rather than racing on the streak
+        and badge checks. Returns the names of newly earned badges.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute(
+                'INSERT INTO conversations (child_id, character, message, response, emotion) VALUES (?, ?, ?, ?, ?)',
+                (child_id, character, message, response, emotion)
+            )
+            cursor.execute('UPDATE children SET xp = xp + ? WHERE id = ?', (xp_gain, child_id))
+            self._update_streak(cursor, child_id)
+            turns = self._count_turn(cursor, child_id, character, emotion)
+            self._bump_activity(cursor, child_id)
+            
+            badges_earned = []
+            for badge_name, needed in self.TURN_BADGES:
+                if turns >= needed:
+                    cursor.execute(
+                        'INSERT OR IGNORE INTO badges (child_id, badge_name) VALUES (?, ?)',
+                        (child_id, badge_name)
+                    )
+                    if cursor.rowcount == 1:
+                        badges_earned.append(badge_name)
+            
+            self._bump_generation(cursor, child_id)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        self._changed(child_id)
+        return badges_earned
+    
+    @staticmethod
+    def _count_turn(cursor, child_id, character, emotion):
+        """Bump the child's turn counters; returns the new total"""
+        cursor.execute('SELECT total_turns, character_turns, emotion_counts FROM children WHERE id = ?', (child_id,))
+        row = cursor.fetchone()
+        if not row:
+            return 0
+        
+        characters = json.loads(row['character_turns'] or '{}')
+        characters[character] = characters.get(character, 0) + 1
+        emotions = json.loads(row['emotion_counts'] or '{}')
+        if emotion:
+            emotions[emotion] = emotions.get(emotion, 0) + 1
+        
+        total = (row['total_turns'] or 0) + 1
+        cursor.execute(
+            'UPDATE children SET total_turns = ?, character_turns = ?, emotion_counts = ? WHERE id = ?',
+            (total, json.dumps(characters), json.dumps(emotions), child_id)
+        )
+        return total
     
     def get_conversations(self, child_id, limit=50):
         conn = self.get_connection()
@@ -259,22 +805,19 @@ class Database:
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        # Check if already earned
+        # The unique index turns a repeat award into a no-op
         cursor.execute(
-            'SELECT id FROM badges WHERE child_id = ? AND badge_name = ?',
-            (child_id, badge_name)
-        )
-        if cursor.fetchone():
-            conn.close()
-            return False
-        
-        cursor.execute(
-            'INSERT INTO badges (child_id, badge_name) VALUES (?, ?)',
+            'INSERT OR IGNORE INTO badges (child_id, badge_name) VALUES (?, ?)',
             (child_id, badge_name)
         )
+        awarded = cursor.rowcount == 1
+        if awarded:
+            self._bump_generation(cursor, child_id)
         conn.commit()
         conn.close()
-        return True
+        if awarded:
+            self._changed(child_id)
+        return awarded
     
     def get_badges(self, child_id):
         conn = self.get_connection()
@@ -297,9 +840,12 @@ class Database:
             INSERT INTO sessions (child_id, character, theme, mode, start_time)
             VALUES (?, ?, ?, ?, datetime('now'))
         ''', (child_id, character, theme, mode))
-        conn.commit()
         session_id = cursor.lastrowid
+        self._bump_stats(cursor, child_id, total_sessions=1)
+        self._bump_generation(cursor, child_id)
+        conn.commit()
         conn.close()
+        self._changed(child_id)
         return session_id
 
     def end_session(self, session_id, turn_count, duration_minutes):
@@ -313,8 +859,14 @@ class Database:
                 duration_minutes = ?
             WHERE id = ?
         ''', (turn_count, duration_minutes, session_id))
+        cursor.execute('SELECT child_id FROM sessions WHERE id = ?', (session_id,))
+        row = cursor.fetchone()
+        if row:
+            self._bump_generation(cursor, row['child_id'])
         conn.commit()
         conn.close()
+        if row:
+            self._changed(row['child_id'])
 
     def log_anti_freeze_activation(self, session_id, option_chosen):
         """Log when anti-freeze mechanism activates"""
@@ -373,8 +925,10 @@ class Database:
             INSERT INTO summaries (child_id, character, session_id, summary, evaluation_data)
             VALUES (?, ?, ?, ?, ?)
         ''', (child_id, character, session_id, summary, json.dumps(evaluation) if evaluation else None))
+        self._bump_generation(cursor, child_id)
         conn.commit()
         conn.close()
+        self._changed(child_id)
     
     def get_latest_summary(self, child_id, character):
         """Get most recent summary for a child-character pair"""
@@ -389,6 +943,18 @@ class Database:
         conn.close()
         return result['summary'] if result else None
     
+    def get_recent_summaries(self, child_id, limit=5):
+        """Get a child's most recent summaries"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT * FROM summaries WHERE child_id = ?
+            ORDER BY created_at DESC LIMIT ?
+        ''', (child_id, limit))
+        summaries = [dict(s) for s in cursor.fetchall()]
+        conn.close()
+        return summaries
+    
     def get_all_summaries(self, child_id):
         """Get all summaries for a child"""
         conn = self.get_connection()
@@ -404,15 +970,84 @@ class Database:
     # ==================== EVALUATION OPERATIONS ====================
     
     def save_evaluation(self, child_id, session_id, character, evaluation_data):
-        """Save child evaluation data"""
+        """
+        Save child evaluation data
+        
+        The client sends the running evaluation for a session, so a newer
+        one replaces the session's previous row. child_stats is adjusted by
+        the difference in the same transaction.
+        """
+        columns = [column for column, _ in self.EVALUATION_COLUMNS]
+        values = self._evaluation_values(evaluation_data or {})
+        
         conn = self.get_connection()
         cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            if session_id is not None:
+                cursor.execute(
+                    f'SELECT {", ".join(columns)} FROM evaluations WHERE child_id = ? AND session_id = ?',
+                    (child_id, session_id)
+                )
+                for old in cursor.fetchall():
+                    self._bump_evaluation_stats(cursor, child_id, list(old), -1)
+                cursor.execute(
+                    'DELETE FROM evaluations WHERE child_id = ? AND session_id = ?',
+                    (child_id, session_id)
+                )
+            
+            cursor.execute(f'''
+                INSERT INTO evaluations (child_id, session_id, character, evaluation_data, {', '.join(columns)})
+                VALUES (?, ?, ?, ?, {', '.join('?' for _ in columns)})
+            ''', [child_id, session_id, character, json.dumps(evaluation_data)] + values)
+            self._bump_evaluation_stats(cursor, child_id, values, 1)
+            self._bump_generation(cursor, child_id)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        self._changed(child_id)
+    
+    def get_evaluation_stats(self, child_id, series_limit=50):
+        """
+        Dashboard aggregates over a child's evaluations
+        
+        Sums and averages come from child_stats; only the newest
+        `series_limit` communication scores are read for the progress chart.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM child_stats WHERE child_id = ?', (child_id,))
+        row = cursor.fetchone()
+        totals = dict(row) if row else {}
+        
         cursor.execute('''
-            INSERT INTO evaluations (child_id, session_id, character, evaluation_data)
-            VALUES (?, ?, ?, ?)
-        ''', (child_id, session_id, character, json.dumps(evaluation_data)))
-        conn.commit()
+            SELECT clarity, engagement, reciprocity, timestamp FROM evaluations
+            WHERE child_id = ? AND clarity IS NOT NULL
+            ORDER BY timestamp DESC LIMIT ?
+        ''', (child_id, series_limit))
+        communication = [dict(r) for r in cursor.fetchall()]
         conn.close()
+        
+        def average(name):
+            n = totals.get(f'{name}_n') or 0
+            return totals[f'{name}_sum'] / n if n else None
+        
+        return {
+            'count': totals.get('eval_count') or 0,
+            'total_sessions': totals.get('total_sessions') or 0,
+            'reciprocity_total': totals.get('reciprocity_total') or 0,
+            'emotion_total': totals.get('emotion_total') or 0,
+            'emotion_accurate': totals.get('emotion_accurate') or 0,
+            'sentence_complexity_avg': average('sentence_complexity'),
+            'vocabulary_diversity_avg': average('vocabulary_diversity'),
+            'topic_maintenance_avg': average('topic_maintenance'),
+            'latency_sum': totals.get('latency_sum') or 0,
+            'latency_count': totals.get('latency_count') or 0,
+            'communication': communication
+        }
     
     def get_all_evaluations(self, child_id):
         """Get all evaluations for a child"""
@@ -440,48 +1075,135 @@ class Database:
     # ==================== SESSION DATA OPERATIONS ====================
     
     def save_session_data(self, child_id, session_id, chat_history, context_summary):
-        """Save session chat data"""
+        """Save a full session chat history (messages already stored are skipped)"""
+        return self.append_session_messages(child_id, session_id, 0, chat_history, context_summary)
+    
+    def append_session_messages(self, child_id, session_id, after_seq, messages, context_summary=None):
+        """
+        Append chat messages that follow sequence number `after_seq`
+        
+        Messages the server already has (a retried sync) are skipped. If
+        `after_seq` is past the server's high-water mark, nothing is
+        written and 'gap' is set so the client can resend from 'seq'.
+        context_summary is only updated when given.
+        
+        Returns {'seq': high-water mark, 'appended': n, 'gap': bool}.
+        """
         conn = self.get_connection()
         cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute(
+                'SELECT MAX(seq) FROM session_messages WHERE child_id = ? AND session_id = ?',
+                (child_id, session_id)
+            )
+            seq = cursor.fetchone()[0] or 0
+            
+            gap = after_seq > seq
+            appended = 0
+            if not gap:
+                new_messages = (messages or [])[seq - after_seq:]
+                appended = self._insert_messages(cursor, child_id, session_id, seq, new_messages)
+                if appended:
+                    cursor.execute(
+                        'SELECT MAX(seq) FROM session_messages WHERE child_id = ? AND session_id = ?',
+                        (child_id, session_id)
+                    )
+                    seq = cursor.fetchone()[0] or 0
+                
+                if context_summary is not None or appended:
+                    self._touch_session_chat(cursor, child_id, session_id, context_summary)
+            
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
         
-        # Check if exists
-        cursor.execute('''
-            SELECT id FROM session_chats WHERE child_id = ? AND session_id = ?
-        ''', (child_id, session_id))
-        existing = cursor.fetchone()
-        
-        if existing:
+        return {'seq': seq, 'appended': appended, 'gap': gap}
+    
+    @staticmethod
+    def _insert_messages(cursor, child_id, session_id, after_seq, messages):
+        """Insert messages numbered from after_seq + 1; returns the rows actually written"""
+        rows = []
+        for message in messages:
+            # Only the v4 migration passes unchecked lists (old JSON blobs);
+            # /api/chat/sync rejects a batch with non-object entries
+            if not isinstance(message, dict):
+                continue
+            rows.append((
+                child_id, session_id, after_seq + len(rows) + 1,
+                message.get('role'), message.get('content'), message.get('emotion'),
+                message.get('timestamp')
+            ))
+        cursor.executemany('''
+            INSERT OR IGNORE INTO session_messages (child_id, session_id, seq, role, content, emotion, client_ts)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        return max(cursor.rowcount, 0)
+    
+    @staticmethod
+    def _touch_session_chat(cursor, child_id, session_id, context_summary):
+        if context_summary is None:
             cursor.execute('''
-                UPDATE session_chats 
-                SET chat_history = ?, context_summary = ?, updated_at = datetime('now')
+                UPDATE session_chats SET updated_at = datetime('now')
                 WHERE child_id = ? AND session_id = ?
-            ''', (json.dumps(chat_history), context_summary, child_id, session_id))
+            ''', (child_id, session_id))
         else:
             cursor.execute('''
-                INSERT INTO session_chats (child_id, session_id, chat_history, context_summary)
-                VALUES (?, ?, ?, ?)
-            ''', (child_id, session_id, json.dumps(chat_history), context_summary))
-        
-        conn.commit()
-        conn.close()
+                UPDATE session_chats SET context_summary = ?, updated_at = datetime('now')
+                WHERE child_id = ? AND session_id = ?
+            ''', (context_summary, child_id, session_id))
+        if cursor.rowcount == 0:
+            cursor.execute('''
+                INSERT INTO session_chats (child_id, session_id, context_summary)
+                VALUES (?, ?, ?)
+            ''', (child_id, session_id, context_summary))
     
     def get_session_data(self, child_id, session_id):
-        """Get session chat data"""
+        """Get session chat data, rebuilding the chat history from its messages"""
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute('''
             SELECT * FROM session_chats WHERE child_id = ? AND session_id = ?
         ''', (child_id, session_id))
         result = cursor.fetchone()
+        if not result:
+            conn.close()
+            return None
+        
+        cursor.execute('''
+            SELECT seq, role, content, emotion, client_ts FROM session_messages
+            WHERE child_id = ? AND session_id = ? ORDER BY seq
+        ''', (child_id, session_id))
+        rows = cursor.fetchall()
         conn.close()
         
-        if result:
-            data = dict(result)
-            if data.get('chat_history'):
-                data['chat_history'] = json.loads(data['chat_history'])
-            return data
-        return None
+        data = dict(result)
+        data['chat_history'] = []
+        for row in rows:
+            message = {'role': row['role'], 'content': row['content']}
+            if row['emotion']:
+                message['emotion'] = row['emotion']
+            if row['client_ts'] is not None:
+                message['timestamp'] = row['client_ts']
+            data['chat_history'].append(message)
+        data['seq'] = rows[-1]['seq'] if rows else 0
+        return data
 
+    def get_recent_sessions(self, child_id, limit=10):
+        """Get a child's most recent sessions"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT * FROM sessions WHERE child_id = ?
+            ORDER BY start_time DESC LIMIT ?
+        ''', (child_id, limit))
+        sessions = [dict(s) for s in cursor.fetchall()]
+        conn.close()
+        return sessions
+    
     def get_all_sessions(self, child_id):
         """Get all sessions for a child"""
         conn = self.get_connection()
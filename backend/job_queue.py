@@ -0,0 +1,286 @@
+"""
+Background Job Queue
+SQLite-backed queue for slow LLM work (summaries, parent reports)
+"""
+
+import json
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+
+class JobQueue:
+    """
+    Persistent job queue stored in the `jobs` table
+
+    Endpoints enqueue work and return at once; worker threads claim queued
+    jobs, run the registered handler for the job kind and store its result.
+    While a job runs, its process refreshes the job's heartbeat_at every
+    `heartbeat_interval` seconds. The same periodic sweep re-queues running
+    jobs whose heartbeat is older than `requeue_after` seconds (their
+    process died) and deletes finished jobs older than `retention` seconds.
+    A job that has already been claimed `max_attempts` times is failed
+    instead of re-queued, so a job that kills its process is not retried
+    forever. A runner whose job was re-queued and claimed again in the
+    meantime does not overwrite the newer run's result.
+    """
+
+    def __init__(self, db, workers: int = 1, poll_interval: float = 2.0,
+                 heartbeat_interval: float = 15.0, requeue_after: float = 60.0,
+                 retention: float = 7 * 24 * 3600, max_attempts: int = 3):
+        self.db = db
+        self.workers = max(workers, 1)
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        # A live process must have missed at least two heartbeats
+        self.requeue_after = max(requeue_after, heartbeat_interval * 2)
+        self.retention = retention
+        self.max_attempts = max(max_attempts, 1)
+        self.handlers: Dict[str, Callable] = {}
+        self.done_fn: Optional[Callable] = None  # done_fn(job, status) after a job finishes
+        self._wakeup = threading.Event()
+        self._threads = []
+        self._running = {}  # job id -> started_at of the runs in this process
+        self._lock = threading.Lock()
+        self.stats = {'requeued': 0, 'abandoned': 0, 'pruned': 0, 'superseded': 0}
+
+    def register(self, kind: str, handler: Callable):
+        """Register handler(payload) -> result for a job kind"""
+        self.handlers[kind] = handler
+
+    def enqueue(self, kind: str, payload: Dict, dedupe_key: Optional[str] = None) -> int:
+        """
+        Queue a job and return its id
+
+        If a job with the same dedupe_key is still queued or running, its id
+        is returned instead of queueing a duplicate.
+        """
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        try:
+            # The lookup and the insert are one write transaction, so two
+            # requests cannot both queue the same job
+            cursor.execute('BEGIN IMMEDIATE')
+            existing = None
+            if dedupe_key:
+                cursor.execute('''
+                    SELECT id FROM jobs
+                    WHERE dedupe_key = ? AND status IN ('queued', 'running')
+                    ORDER BY id DESC LIMIT 1
+                ''', (dedupe_key,))
+                existing = cursor.fetchone()
+            if existing:
+                conn.rollback()
+                return existing['id']
+
+            cursor.execute('''
+                INSERT INTO jobs (kind, dedupe_key, payload, status, created_at)
+                VALUES (?, ?, ?, 'queued', ?)
+            ''', (kind, dedupe_key, json.dumps(payload), time.time()))
+            job_id = cursor.lastrowid
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        self._wakeup.set()
+        return job_id
+
+    def get_job(self, job_id: int) -> Optional[Dict]:
+        """Get a job's status and result"""
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM jobs WHERE id = ?', (job_id,))
+        row = cursor.fetchone()
+        conn.close()
+        return self._to_dict(row) if row else None
+
+    def latest_result(self, dedupe_key: str) -> Optional[Dict]:
+        """Get the most recent finished job for a dedupe_key"""
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT * FROM jobs WHERE dedupe_key = ? AND status = 'done'
+            ORDER BY finished_at DESC LIMIT 1
+        ''', (dedupe_key,))
+        row = cursor.fetchone()
+        conn.close()
+        return self._to_dict(row) if row else None
+
+    def get_stats(self):
+        """Job counts by status, plus re-queued, abandoned, superseded and pruned jobs"""
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT status, COUNT(*) AS n FROM jobs GROUP BY status')
+        counts = {row['status']: row['n'] for row in cursor.fetchall()}
+        conn.close()
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'jobs': counts,
+                'running_here': len(self._running),
+                'requeued': self.stats['requeued'],
+                'abandoned': self.stats['abandoned'],
+                'superseded': self.stats['superseded'],
+                'pruned': self.stats['pruned']
+            }
+
+    def start(self):
+        """Start the worker threads and the heartbeat / re-queue sweep (idempotent)"""
+        with self._lock:
+            if self._threads:
+                return
+
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+            sweeper = threading.Thread(target=self._sweep_loop, name='job-sweeper', daemon=True)
+            sweeper.start()
+            self._threads.append(sweeper)
+
+    def sweep(self):
+        """
+        Refresh the heartbeat of this process's running jobs, re-queue jobs
+        whose process stopped heartbeating and delete expired finished jobs
+        """
+        now = time.time()
+        with self._lock:
+            running = list(self._running.items())
+
+        conn = self.db.get_connection()
+        # started_at tells this run apart from a later claim of the same job
+        conn.executemany(
+            "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = 'running' AND started_at = ?",
+            [(now, job_id, started_at) for job_id, started_at in running]
+        )
+        abandoned = conn.execute('''
+            UPDATE jobs SET status = 'failed', finished_at = ?,
+                error = 'Interrupted ' || attempts || ' times; not retried'
+            WHERE status = 'running' AND COALESCE(heartbeat_at, started_at, 0) < ? AND attempts >= ?
+        ''', (now, now - self.requeue_after, self.max_attempts)).rowcount
+        requeued = conn.execute('''
+            UPDATE jobs SET status = 'queued', started_at = NULL, heartbeat_at = NULL
+            WHERE status = 'running' AND COALESCE(heartbeat_at, started_at, 0) < ?
+        ''', (now - self.requeue_after,)).rowcount
+        pruned = conn.execute('''
+            DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?
+        ''', (now - self.retention,)).rowcount
+        conn.commit()
+        conn.close()
+
+        with self._lock:
+            self.stats['requeued'] += requeued
+            self.stats['abandoned'] += abandoned
+            self.stats['pruned'] += pruned
+        if abandoned:
+            print(f"Job queue: failed {abandoned} job(s) interrupted {self.max_attempts} times")
+        if requeued:
+            print(f"Job queue: re-queued {requeued} interrupted job(s)")
+            self._wakeup.set()
+
+    def _sweep_loop(self):
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Job queue sweep error: {str(e)}")
+            time.sleep(self.heartbeat_interval)
+
+    def _claim(self):
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        job = None
+        while job is None:
+            cursor.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1")
+            row = cursor.fetchone()
+            if not row:
+                break
+
+            # Only one worker (or process) wins the status change
+            now = time.time()
+            cursor.execute('''
+                UPDATE jobs SET status = 'running', started_at = ?, heartbeat_at = ?, attempts = attempts + 1
+                WHERE id = ? AND status = 'queued'
+            ''', (now, now, row['id']))
+            conn.commit()
+            if cursor.rowcount == 1:
+                job = self._to_dict(row)
+                # Identifies this run in _finish
+                job['started_at'] = now
+                with self._lock:
+                    self._running[job['id']] = now
+        conn.close()
+        return job
+
+    def _finish(self, job, status, result=None, error=None) -> bool:
+        """Store a run's outcome; False if the job was re-queued (and maybe claimed again) meanwhile"""
+        with self._lock:
+            self._running.pop(job['id'], None)
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?
+            WHERE id = ? AND status = 'running' AND started_at = ?
+        ''', (status, json.dumps(result), error, time.time(), job['id'], job['started_at']))
+        conn.commit()
+        conn.close()
+        if cursor.rowcount != 1:
+            with self._lock:
+                self.stats['superseded'] += 1
+            print(f"Job {job['id']} ({job['kind']}) was re-queued while it ran; result dropped")
+            return False
+        return True
+
+    def _work(self):
+        while True:
+            try:
+                job = self._claim()
+            except Exception as e:
+                print(f"Job queue error: {str(e)}")
+                job = None
+
+            if not job:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            handler = self.handlers.get(job['kind'])
+            result = error = None
+            if not handler:
+                status, error = 'failed', f"No handler for {job['kind']}"
+            else:
+                try:
+                    result = handler(job['payload'])
+                    status = 'done'
+                except Exception as e:
+                    print(f"Job {job['id']} ({job['kind']}) failed: {str(e)}")
+                    status, error = 'failed', str(e)
+
+            try:
+                if not self._finish(job, status, result=result, error=error):
+                    continue
+            except Exception as e:
+                # Left running without a heartbeat; the sweep re-queues it
+                print(f"Job {job['id']} ({job['kind']}) result could not be saved: {str(e)}")
+                continue
+
+            if self.done_fn:
+                try:
+                    self.done_fn(job, status)
+                except Exception as e:
+                    print(f"Job {job['id']} done callback failed: {str(e)}")
+
+    @staticmethod
+    def _to_dict(row):
+        job = dict(row)
+        for field in ('payload', 'result'):
+            if job.get(field):
+                try:
+                    job[field] = json.loads(job[field])
+                except:
+                    pass
+        return job
@@ -1,10 +1,10 @@
 """
-Language Detection Router
-Detects language and routes to appropriate LLM
+Language Detection
+Detects language so requests can be routed to the appropriate LLM
+(see ModelRouter.route_to_model)
 """
 
 import re
-from typing import Tuple
 
 class LanguageDetector:
     
@@ -43,15 +43,3 @@ class LanguageDetector:
         
         # Default to English
         return 'en'
-    
-    @staticmethod
-    def route_to_model(language: str) -> Tuple[str, str]:
-        """
-        Route language to appropriate model
-        
-        Returns: (model_name, base_url)
-        """
-        if language in ['ta', 'mr']:
-            return ('llama3.2', 'http://localhost:11434')
-        else:
-            return ('llama3.2', 'http://localhost:11434')
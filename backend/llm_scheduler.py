@@ -0,0 +1,283 @@
+"""
+LLM Job Scheduler
+Orders work sent to Ollama so live child turns always go first
+"""
+
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+
+class JobCancelled(Exception):
+    """Raised when a queued job goes stale or is superseded before it runs"""
+
+
+class _Ticket:
+    __slots__ = ('job_class', 'priority', 'seq', 'backend', 'key', 'enqueued_at', 'cancelled')
+
+    def __init__(self, job_class, priority, seq, backend, key):
+        self.job_class = job_class
+        self.priority = priority
+        self.seq = seq
+        self.backend = backend
+        self.key = key
+        self.enqueued_at = time.time()
+        self.cancelled = False
+
+    def order(self):
+        return (self.priority, self.seq)
+
+
+class LLMScheduler:
+    """
+    Priority admission control in front of OllamaService
+
+    Callers run their LLM call inside a slot. Slots are handed out per
+    backend, lowest priority number first, with a number of slots reserved
+    for interactive chat so background work can never occupy every slot.
+    Jobs that wait longer than their class allows, or that are superseded
+    by a newer job with the same key, are cancelled with JobCancelled.
+
+    With limit_fn set (e.g. OllamaService.concurrency_limit), the number of
+    slots per backend follows limit_fn(backend) instead of max_concurrency.
+    Background work gets that number minus the reserved chat slots, which
+    is 0 once the limit backs off to the reservation; it then only runs
+    while the backend is otherwise idle. Chat always keeps its reserved
+    slots on top of the background jobs already running.
+
+    Slots are counted per process: with several worker processes (e.g.
+    gunicorn -w 4) each hands out its own slots, so a backend can see up to
+    workers x max_concurrency jobs and as many reserved chat slots.
+    """
+
+    # Lower number = served first
+    PRIORITIES = {
+        'chat': 0,
+        'options': 1,
+        'scaffold': 2,
+        'summary': 3,
+        'report': 4
+    }
+
+    def __init__(self, max_concurrency: int = 2, interactive_reserved: int = 1,
+                 stale_after: Optional[Dict[str, float]] = None, deadline_workers: int = 8,
+                 deadline_queue: int = 16):
+        self.max_concurrency = max(max_concurrency, 1)
+        self.interactive_reserved = min(max(interactive_reserved, 0), self.max_concurrency - 1)
+        self.stale_after = stale_after or {}
+
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._waiting = []
+        self._running = {}
+        self._background = {}  # running non-chat jobs per backend
+        # Optional limit_fn(backend) -> slots, e.g. an adaptive concurrency limit
+        self.limit_fn = None
+
+        # Runs deadline-bound jobs so they can finish after the caller gives up;
+        # at most deadline_queue of them may be submitted and not yet finished
+        self._executor = ThreadPoolExecutor(max_workers=deadline_workers, thread_name_prefix='llm-deadline')
+        self.deadline_queue = max(deadline_queue, deadline_workers)
+        self._deadline_pending = 0
+
+        self.stats = {
+            job_class: {
+                'submitted': 0,
+                'started': 0,
+                'completed': 0,
+                'cancelled': 0,
+                'total_wait_ms': 0.0,
+                'max_wait_ms': 0.0,
+                'deadline_misses': 0,
+                'deadline_rejected': 0,
+                'late_completions': 0
+            }
+            for job_class in self.PRIORITIES
+        }
+
+    def capacity(self, backend: str) -> int:
+        """Slots handed out on `backend` right now"""
+        if self.limit_fn is None:
+            return self.max_concurrency
+        return max(int(self.limit_fn(backend)), 1)
+
+    def _limit(self, ticket):
+        capacity = self.capacity(ticket.backend)
+        if ticket.priority == self.PRIORITIES['chat']:
+            return max(capacity, self.interactive_reserved + self._background.get(ticket.backend, 0))
+        limit = capacity - self.interactive_reserved
+        if limit <= 0 and not self._running.get(ticket.backend):
+            # Backed off below the reservation: background work only on an idle backend
+            return 1
+        return limit
+
+    def _can_start(self, ticket):
+        if self._running.get(ticket.backend, 0) >= self._limit(ticket):
+            return False
+        for other in self._waiting:
+            if other.backend == ticket.backend and other.order() < ticket.order():
+                return False
+        return True
+
+    def _cancel(self, ticket):
+        ticket.cancelled = True
+        self._waiting.remove(ticket)
+        self.stats[ticket.job_class]['cancelled'] += 1
+        self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, job_class: str, backend: str = 'default', key: Optional[str] = None,
+             abandoned: Optional[threading.Event] = None):
+        """
+        Hold one concurrency slot on `backend` for the duration of the block
+
+        A newer job with the same `key` supersedes this one while it waits,
+        and so does setting `abandoned` (see run_with_deadline).
+        """
+        stale_after = self.stale_after.get(job_class)
+
+        with self._cond:
+            if key is not None:
+                for other in list(self._waiting):
+                    if other.key == key:
+                        self._cancel(other)
+
+            ticket = _Ticket(job_class, self.PRIORITIES[job_class], next(self._seq), backend, key)
+            self._waiting.append(ticket)
+            self.stats[job_class]['submitted'] += 1
+
+            while not ticket.cancelled and not self._can_start(ticket):
+                if abandoned is not None and abandoned.is_set():
+                    self._cancel(ticket)
+                    break
+                timeout = None
+                if stale_after is not None:
+                    timeout = ticket.enqueued_at + stale_after - time.time()
+                    if timeout <= 0:
+                        self._cancel(ticket)
+                        break
+                self._cond.wait(timeout)
+
+            if ticket.cancelled:
+                raise JobCancelled(f'{job_class} job cancelled before it started')
+
+            self._waiting.remove(ticket)
+            self._running[backend] = self._running.get(backend, 0) + 1
+            background = ticket.priority != self.PRIORITIES['chat']
+            if background:
+                self._background[backend] = self._background.get(backend, 0) + 1
+
+            wait_ms = (time.time() - ticket.enqueued_at) * 1000
+            self.stats[job_class]['started'] += 1
+            self.stats[job_class]['total_wait_ms'] += wait_ms
+            self.stats[job_class]['max_wait_ms'] = max(self.stats[job_class]['max_wait_ms'], wait_ms)
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._running[backend] -= 1
+                if background:
+                    self._background[backend] -= 1
+                self.stats[job_class]['completed'] += 1
+                self._cond.notify_all()
+
+    def run(self, job_class: str, fn, *args, backend: str = 'default',
+            key: Optional[str] = None, default=None, **kwargs):
+        """Run fn(*args, **kwargs) in a slot; returns `default` if the job is cancelled"""
+        try:
+            with self.slot(job_class, backend, key):
+                return fn(*args, **kwargs)
+        except JobCancelled as e:
+            print(f"Scheduler: {str(e)}")
+            return default
+
+    def run_with_deadline(self, budget: float, job_class: str, fn, *args, backend: str = 'default',
+                          key: Optional[str] = None, default=None, on_late=None, **kwargs):
+        """
+        Like run(), but return `default` once `budget` seconds have passed
+
+        A job that has not started by the deadline is dropped. One that is
+        already generating keeps running in the background, and when it
+        finishes its result is passed to on_late(result) unless it is
+        `default` itself. When deadline_queue jobs are already outstanding,
+        `default` is returned at once without submitting the job.
+        """
+        with self._cond:
+            if self._deadline_pending >= self.deadline_queue:
+                self.stats[job_class]['deadline_rejected'] += 1
+                print(f"Scheduler: {job_class} job rejected - {self._deadline_pending} deadline jobs outstanding")
+                return default
+            self._deadline_pending += 1
+
+        abandoned = threading.Event()
+
+        def call():
+            with self.slot(job_class, backend, key, abandoned):
+                return fn(*args, **kwargs)
+
+        def release(done):
+            with self._cond:
+                self._deadline_pending -= 1
+
+        future = self._executor.submit(call)
+        future.add_done_callback(release)
+        try:
+            return future.result(timeout=budget)
+        except JobCancelled as e:
+            print(f"Scheduler: {str(e)}")
+            return default
+        except FutureTimeout:
+            with self._cond:
+                self.stats[job_class]['deadline_misses'] += 1
+                # Drops the job if it is still queued here or waiting for a slot
+                abandoned.set()
+                self._cond.notify_all()
+            future.cancel()
+            print(f"Scheduler: {job_class} job missed its {budget}s budget - using fallback")
+
+            def deliver(done):
+                if done.cancelled() or done.exception() is not None:
+                    return
+                result = done.result()
+                with self._cond:
+                    self.stats[job_class]['late_completions'] += 1
+                if on_late and result != default:
+                    try:
+                        on_late(result)
+                    except Exception as e:
+                        print(f"Scheduler: late result handler failed: {str(e)}")
+
+            future.add_done_callback(deliver)
+            return default
+
+    def backend_load(self, backend: str) -> int:
+        """Running plus waiting jobs for a backend"""
+        with self._cond:
+            waiting = sum(1 for t in self._waiting if t.backend == backend)
+            return self._running.get(backend, 0) + waiting
+
+    def get_stats(self):
+        """Queue depth, running jobs and queue-time metrics per priority class"""
+        with self._cond:
+            classes = {}
+            for job_class, stats in self.stats.items():
+                started = stats['started']
+                classes[job_class] = dict(stats)
+                classes[job_class]['avg_wait_ms'] = round(stats['total_wait_ms'] / started, 1) if started else 0
+                classes[job_class]['total_wait_ms'] = round(stats['total_wait_ms'], 1)
+                classes[job_class]['max_wait_ms'] = round(stats['max_wait_ms'], 1)
+                classes[job_class]['waiting'] = sum(1 for t in self._waiting if t.job_class == job_class)
+
+            return {
+                'max_concurrency': self.max_concurrency,
+                'interactive_reserved': self.interactive_reserved,
+                'running': dict(self._running),
+                'capacity': {backend: self.capacity(backend) for backend in self._running},
+                'deadline_pending': self._deadline_pending,
+                'waiting': len(self._waiting),
+                'classes': classes
+            }
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Maintenance Commands
+
+Usage:
+    python manage.py migrate                 Upgrade the schema to the latest version
+    python manage.py rebuild-stats [--child ID]
+                                             Recompute dashboard aggregates from raw tables
+    python manage.py cohort [--since-days N] [--child ID ...] [--json]
+                                             Clinical metrics for every child at once
+"""
+
+import argparse
+import json
+import time
+
+from cohort_analytics import CohortData, CohortMetrics
+from config import Config
+from database import Database
+
+
+def migrate(db, args):
+    print(f"Schema version {db.get_schema_version()}")
+
+
+def rebuild_stats(db, args):
+    start = time.perf_counter()
+    db.rebuild_child_stats(args.child)
+    target = f"child {args.child}" if args.child is not None else "all children"
+    print(f"Rebuilt stats for {target} in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+def cohort(db, args):
+    start = time.perf_counter()
+    result = CohortMetrics.compute(CohortData.from_database(db, since_days=args.since_days, child_ids=args.child))
+    elapsed = (time.perf_counter() - start) * 1000
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+
+    metrics = ['initiation_rate', 'semantic_entropy', 'continuity', 'emoji_accuracy']
+    print(f"{'child':>6} {'name':<20} " + ' '.join(f'{m:>16}' for m in metrics))
+    for child in result['children']:
+        print(f"{child['child_id']:>6} {child['name'][:20]:<20} " + ' '.join(f'{child[m]:>16.2f}' for m in metrics))
+
+    print()
+    print(f"{'cohort':<27} " + ' '.join(f"{'children':>8} {'median':>7}" for _ in metrics))
+    print(f"{'':<27} " + ' '.join(
+        f"{result['cohort'][m]['children']:>8} {result['cohort'][m].get('median', 0):>7.2f}" for m in metrics
+    ))
+
+    timeline = result['timeline']
+    print()
+    print(f"{'week':<12} {'active':>6} {'messages':>8} {'initiation':>10} {'continuity':>10} {'emoji':>6}")
+    for i, week in enumerate(timeline['weeks']):
+        print(f"{week:<12} {timeline['active_children'][i]:>6} {timeline['messages'][i]:>8} "
+              f"{timeline['initiation_rate'][i]:>10.2f} {timeline['continuity'][i]:>10.2f} "
+              f"{timeline['emoji_accuracy'][i]:>6.2f}")
+    print(f"\n{len(result['children'])} children in {elapsed:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='charAI maintenance commands')
+    parser.add_argument('--db', default=Config.DATABASE_PATH, help='database file')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('migrate', help='upgrade the schema').set_defaults(run=migrate)
+
+    rebuild = commands.add_parser('rebuild-stats', help='recompute child_stats and child_activity')
+    rebuild.add_argument('--child', type=int, help='only this child id')
+    rebuild.set_defaults(run=rebuild_stats)
+
+    report = commands.add_parser('cohort', help='clinical metrics across children')
+    report.add_argument('--since-days', type=int, help='only data from the last N days')
+    report.add_argument('--child', type=int, nargs='+', help='only these child ids')
+    report.add_argument('--json', action='store_true', help='print the full result as JSON')
+    report.set_defaults(run=cohort)
+
+    args = parser.parse_args()
+    # Opening the database applies any pending migrations
+    db = Database(args.db)
+    try:
+        args.run(db, args)
+    finally:
+        db.pool.close_all()
+
+
+if __name__ == '__main__':
+    main()
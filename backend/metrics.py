@@ -9,6 +9,12 @@ from collections import Counter
 
 class ClinicalMetrics:
     
+    # A child message opening with one of these (or ending in '!') counts as initiated
+    INITIATION_WORDS = ['what', 'why', 'how', 'where', 'when', 'can', 'do', 'is']
+    
+    # Words for semantic entropy
+    WORD_PATTERN = re.compile(r'\b\w+\b')
+    
     @staticmethod
     def calculate_initiation_rate(conversations: List[Dict]) -> float:
         """
@@ -25,7 +31,7 @@ class ClinicalMetrics:
         for msg in child_messages:
             text = msg.get('message', '')
             # Simple heuristic: starts with question word or exclamation
-            if any(text.lower().startswith(w) for w in ['what', 'why', 'how', 'where', 'when', 'can', 'do', 'is']):
+            if any(text.lower().startswith(w) for w in ClinicalMetrics.INITIATION_WORDS):
                 initiated += 1
             elif text.endswith('!'):
                 initiated += 1
@@ -68,7 +74,7 @@ class ClinicalMetrics:
         
         # Combine all messages
         all_text = ' '.join(messages).lower()
-        words = re.findall(r'\b\w+\b', all_text)
+        words = ClinicalMetrics.WORD_PATTERN.findall(all_text)
         
         if not words:
             return 0.0
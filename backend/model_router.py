@@ -0,0 +1,218 @@
+"""
+Model Router
+Picks an Ollama backend and model for each request by language, loaded
+models and current load, ejecting backends that fail health checks
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+
+class Backend:
+    """One Ollama endpoint and its observed state"""
+
+    def __init__(self, url: str, models: Optional[List[str]] = None, weight: float = 1.0):
+        self.url = url.rstrip('/')
+        self.models = list(models or [])
+        self.weight = weight
+        self.installed = set()
+        self.loaded = set()
+        self.healthy = True
+        self.ejected_until = 0.0
+        self.failures = 0
+        self.inflight = 0
+        self.requests = 0
+        self.errors = 0
+        self.latency_ms = None  # EWMA of request latency
+
+    def has_model(self, model: str) -> bool:
+        if self.installed:
+            return model in self.installed or f'{model}:latest' in self.installed
+        # Not probed yet: trust the configured model list
+        return not self.models or model in self.models
+
+    def is_loaded(self, model: str) -> bool:
+        return model in self.loaded or f'{model}:latest' in self.loaded
+
+    def to_dict(self):
+        return {
+            'url': self.url,
+            'healthy': self.healthy,
+            'ejected_for': max(round(self.ejected_until - time.time(), 1), 0),
+            'inflight': self.inflight,
+            'requests': self.requests,
+            'errors': self.errors,
+            'latency_ms': round(self.latency_ms, 1) if self.latency_ms is not None else None,
+            'models': sorted(self.installed) or self.models,
+            'loaded': sorted(self.loaded)
+        }
+
+
+class ModelRouter:
+    """
+    Load-aware router over a pool of Ollama backends
+
+    route() prefers the model configured for the request language and falls
+    back to the default model when no healthy backend has it. Among the
+    backends that can serve the model, the one with the lowest expected wait
+    (queued and in-flight requests x observed latency, halved when the model
+    is already loaded) wins; unmeasured backends are assumed as fast as the
+    fastest measured one so new capacity gets traffic. Backends that fail a probe or several requests in a row
+    are ejected for `eject_seconds`.
+    """
+
+    LATENCY_ALPHA = 0.3  # EWMA smoothing
+    DEFAULT_LATENCY_MS = 1000.0  # Assumed latency before a backend is measured
+
+    def __init__(self, backends: List[Dict], default_model: str,
+                 language_models: Optional[Dict[str, str]] = None,
+                 session=None, eject_seconds: float = 30.0, max_failures: int = 3,
+                 load_fn=None):
+        self.backends = [
+            Backend(b['url'], b.get('models'), b.get('weight', 1.0)) for b in backends
+        ]
+        self.default_model = default_model
+        self.language_models = language_models or {}
+        self.session = session
+        self.eject_seconds = eject_seconds
+        self.max_failures = max_failures
+        # Optional load_fn(url) -> queued + running jobs (e.g. LLMScheduler.backend_load)
+        self.load_fn = load_fn
+        self._lock = threading.Lock()
+
+    def has_live_backend(self) -> bool:
+        with self._lock:
+            return any(self._available(b) for b in self.backends)
+
+    def is_live(self, backend: Backend) -> bool:
+        """Healthy and not ejected"""
+        with self._lock:
+            return self._available(backend)
+
+    def get_backend(self, url: str) -> Optional[Backend]:
+        url = (url or '').rstrip('/')
+        for backend in self.backends:
+            if backend.url == url:
+                return backend
+        return None
+
+    def _available(self, backend: Backend) -> bool:
+        return backend.healthy and backend.ejected_until <= time.time()
+
+    def _score(self, backend: Backend, model: str, baseline: float):
+        latency = backend.latency_ms if backend.latency_ms is not None else baseline
+        load = backend.inflight
+        if self.load_fn:
+            load = max(load, self.load_fn(backend.url))
+        score = (load + 1) * latency / max(backend.weight, 0.01)
+        if backend.is_loaded(model):
+            score *= 0.5
+        return (score, backend.requests)
+
+    def route(self, language: str = 'en', model: Optional[str] = None) -> Tuple[Optional[Backend], str]:
+        """
+        Pick (backend, model) for a request
+
+        backend is None only when no backend is configured.
+        """
+        preferred = model or self.language_models.get(language, self.default_model)
+
+        with self._lock:
+            live = [b for b in self.backends if self._available(b)] or self.backends
+            measured = [b.latency_ms for b in live if b.latency_ms is not None]
+            baseline = min(measured) if measured else self.DEFAULT_LATENCY_MS
+            for candidate_model in dict.fromkeys([preferred, self.default_model]):
+                candidates = [b for b in live if b.has_model(candidate_model)]
+                if candidates:
+                    best = min(candidates, key=lambda b: self._score(b, candidate_model, baseline))
+                    return best, candidate_model
+
+            # Nothing reports the model; let the first live backend try
+            return (live[0] if live else None), preferred
+
+    def route_to_model(self, language: str) -> Tuple[str, str]:
+        """
+        Route language to appropriate model
+
+        Returns: (model_name, base_url)
+        """
+        backend, model = self.route(language)
+        return (model, backend.url if backend else '')
+
+    @contextmanager
+    def track(self, backend: Backend, outcome: Optional[Dict] = None):
+        """
+        Count an in-flight request on `backend` and record its outcome
+
+        Yields an outcome dict; a request fails if it raises or the caller
+        sets outcome['ok'] = False.
+        """
+        start = time.time()
+        with self._lock:
+            backend.inflight += 1
+            backend.requests += 1
+        outcome = outcome if outcome is not None else {'ok': True}
+        try:
+            yield outcome
+        except Exception:
+            outcome['ok'] = False
+            raise
+        finally:
+            elapsed_ms = (time.time() - start) * 1000
+            with self._lock:
+                backend.inflight -= 1
+                if outcome['ok']:
+                    backend.failures = 0
+                    if backend.latency_ms is None:
+                        backend.latency_ms = elapsed_ms
+                    else:
+                        backend.latency_ms += self.LATENCY_ALPHA * (elapsed_ms - backend.latency_ms)
+                else:
+                    backend.errors += 1
+                    backend.failures += 1
+                    if backend.failures >= self.max_failures:
+                        backend.ejected_until = time.time() + self.eject_seconds
+
+    def eject(self, backend: Backend, until: float):
+        """Skip `backend` until the given time (e.g. while its circuit is open)"""
+        with self._lock:
+            backend.ejected_until = max(backend.ejected_until, until)
+
+    def probe(self, backend: Backend) -> bool:
+        """Refresh installed and loaded models for one backend"""
+        try:
+            response = self.session.get(f'{backend.url}/api/tags', timeout=5)
+            ok = response.status_code == 200
+            if ok:
+                backend.installed = {m.get('name') for m in response.json().get('models', [])}
+                try:
+                    loaded = self.session.get(f'{backend.url}/api/ps', timeout=5)
+                    if loaded.status_code == 200:
+                        backend.loaded = {m.get('name') for m in loaded.json().get('models', [])}
+                except:
+                    pass
+        except:
+            ok = False
+
+        with self._lock:
+            backend.healthy = ok
+            if ok:
+                backend.ejected_until = 0.0
+                backend.failures = 0
+            else:
+                backend.ejected_until = time.time() + self.eject_seconds
+        return ok
+
+    def probe_all(self) -> bool:
+        """Probe every backend; True if at least one is healthy"""
+        results = [self.probe(backend) for backend in self.backends]
+        return any(results)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'language_models': dict(self.language_models),
+                'backends': [b.to_dict() for b in self.backends]
+            }
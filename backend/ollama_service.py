@@ -1,137 +1,653 @@
 import requests
 import json
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+from requests.adapters import HTTPAdapter
 from config import Config
+from model_router import ModelRouter
+from prompt_budget import PromptBudget, estimate_tokens
+from sentence_limiter import SentenceLimiter, limit_sentences
+from circuit_breaker import AdaptiveLimiter, CircuitBreaker, CircuitOpen
 
 class OllamaService:
     def __init__(self):
         self.base_url = Config.OLLAMA_BASE_URL
         self.model = Config.OLLAMA_MODEL
         self.timeout = Config.OLLAMA_TIMEOUT
+        self.keep_alive = Config.OLLAMA_KEEP_ALIVE
+        
+        # Per-session prompt-prefix reuse through Ollama's context array
+        self.context_max_tokens = Config.OLLAMA_CONTEXT_MAX_TOKENS
+        self.context_stats = {'reused': 0, 'rebuilt': 0}
+        
+        # Token budget for rebuilt prompts
+        self.prompt_budget = PromptBudget(
+            max_tokens=Config.PROMPT_TOKEN_BUDGET,
+            summary_tokens=Config.PROMPT_SUMMARY_TOKENS,
+            message_tokens=Config.PROMPT_MESSAGE_TOKENS,
+            history_turns=Config.PROMPT_HISTORY_TURNS
+        )
+        self.token_stats = {'turns': 0, 'estimated': 0, 'max_estimated': 0,
+                            'evaluated': 0, 'truncated': 0, 'dropped_turns': 0}
+        self._stats_lock = threading.Lock()
+        
+        # Replies are cut (and generation stopped) after this many sentences
+        self.max_sentences = Config.MAX_REPLY_SENTENCES
+        self.early_stop = Config.OLLAMA_EARLY_STOP
+        self.generation_stats = {'replies': 0, 'early_stops': 0, 'generated': 0, 'kept': 0}
+        
+        # Per-backend circuit breakers and AIMD concurrency limits
+        self.breakers = {}
+        self.limiters = {}
+        self._guard_lock = threading.Lock()
+        
+        # Derived per-character models: (base_url, character_id, age band) -> model name
+        self.character_models = {}
+        
+        # One pooled keep-alive session for every call to Ollama
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=Config.OLLAMA_POOL_CONNECTIONS,
+            pool_maxsize=Config.OLLAMA_POOL_MAXSIZE
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        
+        # Backend pool; requests go to the least loaded backend for their model
+        self.router = ModelRouter(
+            [{'url': url, 'models': Config.OLLAMA_BACKEND_MODELS} for url in Config.OLLAMA_BACKENDS],
+            self.model,
+            language_models=Config.OLLAMA_LANGUAGE_MODELS,
+            session=self.session,
+            eject_seconds=Config.OLLAMA_EJECT_SECONDS
+        )
+        
+        # Cached health state, refreshed in the background
+        self.health_interval = Config.OLLAMA_HEALTH_INTERVAL
+        self._available = None
+        self._health_lock = threading.Lock()
+        self._health_thread = None
+        self.probe_stats = {
+            'probes': 0,
+            'probe_failures': 0,
+            'last_probe_at': None,
+            'last_probe_ms': None
+        }
+    
+    def probe(self):
+        """Probe every Ollama backend and cache whether any is up"""
+        start = time.time()
+        available = self.router.probe_all()
+        
+        self._available = available
+        self.probe_stats['probes'] += 1
+        if not available:
+            self.probe_stats['probe_failures'] += 1
+        self.probe_stats['last_probe_at'] = time.time()
+        self.probe_stats['last_probe_ms'] = round((time.time() - start) * 1000, 1)
+        return available
+    
+    def _health_loop(self):
+        while True:
+            time.sleep(self.health_interval)
+            self.probe()
+    
+    def start_health_monitor(self):
+        """Start the background health probe thread (idempotent)"""
+        with self._health_lock:
+            if self._health_thread is None:
+                self._health_thread = threading.Thread(
+                    target=self._health_loop, name='ollama-health', daemon=True
+                )
+                self._health_thread.start()
     
     def is_available(self):
-        """Check if Ollama is running"""
-        try:
-            response = requests.get(f'{self.base_url}/api/tags', timeout=5)
-            return response.status_code == 200
-        except:
-            return False
+        """Check if Ollama is running (cached; probes only before the first check)"""
+        if self._available is None:
+            self.probe()
+            self.start_health_monitor()
+        return self._available
     
-    def generate_response(self, character_id, user_message, emotion=None, 
-                         conversation_history=None, model=None, context_summary=None, age=10):
-        """Generate AI response using Ollama with language-specific model"""
+    def get_stats(self):
+        """Connection pool and health probe statistics"""
+        pools = {'connections_opened': 0, 'requests_sent': 0, 'idle_connections': 0}
+        for adapter in set(self.session.adapters.values()):
+            for key in list(adapter.poolmanager.pools.keys()):
+                pool = adapter.poolmanager.pools.get(key)
+                if pool is None:
+                    continue
+                pools['connections_opened'] += pool.num_connections
+                pools['requests_sent'] += pool.num_requests
+                if pool.pool is not None:
+                    pools['idle_connections'] += sum(1 for conn in list(pool.pool.queue) if conn is not None)
         
-        # Use specified model or default
-        model_to_use = model or self.model
+        pools['reused_requests'] = max(pools['requests_sent'] - pools['connections_opened'], 0)
+        pools['pool_maxsize'] = Config.OLLAMA_POOL_MAXSIZE
         
-        # Get character config
-        character = Config.CHARACTERS.get(character_id)
-        if not character:
-            return "I'm not sure who I am. Please try again!"
+        return {
+            'available': self._available,
+            'router': self.router.get_stats(),
+            'breakers': {url: b.get_stats() for url, b in list(self.breakers.items())},
+            'limiters': {url: l.get_stats() for url, l in list(self.limiters.items())},
+            'health_interval': self.health_interval,
+            'probe': dict(self.probe_stats),
+            'pool': pools,
+            'context': dict(self.context_stats),
+            'prompt_tokens': self._token_summary(),
+            'generation': self._generation_summary(),
+            'derived_models': len(self.character_models)
+        }
+    
+    def _token_summary(self):
+        with self._stats_lock:
+            stats = dict(self.token_stats)
+        turns = stats['turns']
+        stats['avg_estimated'] = round(stats['estimated'] / turns, 1) if turns else 0
+        stats['budget'] = self.prompt_budget.max_tokens
+        return stats
+    
+    def _generation_summary(self):
+        with self._stats_lock:
+            stats = dict(self.generation_stats)
+        stats['discarded'] = max(stats['generated'] - stats['kept'], 0)
+        stats['kept_ratio'] = round(stats['kept'] / stats['generated'], 3) if stats['generated'] else 0
+        return stats
+    
+    def route_to_model(self, language):
+        """
+        Route language to appropriate model
+        
+        Returns: (model_name, base_url)
+        """
+        return self.router.route_to_model(language)
+    
+    def _resolve(self, model=None, base_url=None):
+        """Pick (backend, base_url, model) for a request; a given base_url pins the backend"""
+        if base_url:
+            return self.router.get_backend(base_url), base_url.rstrip('/'), model or self.model
+        backend, routed_model = self.router.route('en', model)
+        return backend, (backend.url if backend else self.base_url), routed_model
+    
+    def _protection(self, base_url):
+        """Circuit breaker and adaptive limiter for a backend (created on first use)"""
+        with self._guard_lock:
+            if base_url not in self.breakers:
+                self.breakers[base_url] = CircuitBreaker(
+                    window=Config.OLLAMA_BREAKER_WINDOW,
+                    min_calls=Config.OLLAMA_BREAKER_MIN_CALLS,
+                    error_rate=Config.OLLAMA_BREAKER_ERROR_RATE,
+                    slow_ms=Config.OLLAMA_BREAKER_SLOW_MS,
+                    open_seconds=Config.OLLAMA_BREAKER_OPEN_SECONDS
+                )
+                self.limiters[base_url] = AdaptiveLimiter(
+                    initial=Config.LLM_MAX_CONCURRENCY,
+                    min_limit=1,
+                    max_limit=Config.OLLAMA_LIMIT_MAX,
+                    target_ms=Config.OLLAMA_LIMIT_TARGET_MS
+                )
+            return self.breakers[base_url], self.limiters[base_url]
+    
+    def concurrency_limit(self, base_url):
+        """Current AIMD limit for a backend (LLMScheduler.limit_fn)"""
+        limiter = self.limiters.get((base_url or '').rstrip('/'))
+        return limiter.current() if limiter else Config.LLM_MAX_CONCURRENCY
+    
+    @contextmanager
+    def _guard(self, backend, base_url, background=False):
+        """
+        Wrap one Ollama call in the backend's limiter and circuit breaker
         
-        # Build prompt
-        system_prompt = character['system_prompt']
+        Raises CircuitOpen at once when the circuit is open. Admission is the
+        scheduler's job; the limiter only learns from the outcome. Yields an
+        outcome dict; set outcome['ok'] = False for failures that do not
+        raise (e.g. a non-200 status) and outcome['tokens'] to the number of
+        tokens generated, so latency is judged per token rather than by wall
+        time. Background calls (reports, summaries) only report errors.
+        """
+        breaker, limiter = self._protection(base_url)
         
-        # Add age-appropriate language adjustment
+        if not breaker.allow():
+            if backend:
+                self.router.eject(backend, breaker.opened_until)
+            raise CircuitOpen(f'circuit open for {base_url}')
+        
+        limiter.acquire()
+        start = time.time()
+        outcome = {'ok': True, 'tokens': 0}
+        try:
+            if backend:
+                with self.router.track(backend, outcome):
+                    yield outcome
+            else:
+                yield outcome
+        except Exception:
+            outcome['ok'] = False
+            raise
+        finally:
+            latency_ms = None
+            if not background:
+                latency_ms = (time.time() - start) * 1000 / max(outcome['tokens'] or 0, 1)
+            breaker.record(outcome['ok'], latency_ms)
+            limiter.release(outcome['ok'], latency_ms)
+    
+    def _connection_lost(self, backend):
+        # Re-probe right away so a dead backend is ejected before the next request
+        if backend:
+            self.router.probe(backend)
+        self._available = self.router.has_live_backend()
+    
+    # Fallback responses based on character
+    FALLBACK_RESPONSES = {
+        'puffy': "I hear you! Tell me more about how you're feeling.",
+        'ollie': "That's interesting! What else would you like to share?",
+        'sheldon': "Wow! What happens next in your story?",
+        'clawde': "Good thinking! Can you tell me more about that?",
+        'finley': "Great! What would you like to do next?"
+    }
+    DEFAULT_FALLBACK = "That's great! Tell me more!"
+    UNKNOWN_CHARACTER_RESPONSE = "I'm not sure who I am. Please try again!"
+    
+    def is_fallback(self, text):
+        """Whether a reply is one of the canned responses rather than model output"""
+        return (text in self.FALLBACK_RESPONSES.values()
+                or text in (self.DEFAULT_FALLBACK, self.UNKNOWN_CHARACTER_RESPONSE))
+    
+    # Age-appropriate language adjustment per age band
+    AGE_RULES = {
+        'young': "\n\nIMPORTANT: This child is very young (5-7 years). Use ONLY 5-8 very simple words. Add emojis. Be extra gentle.",
+        'child': "\n\nIMPORTANT: This child is 8-11 years old. Use simple sentences. Maximum 2 sentences.",
+        'preteen': "\n\nIMPORTANT: This is a pre-teen (12-15 years). Be friendly but not childish."
+    }
+    
+    @staticmethod
+    def age_band(age):
+        """Map an age to its AGE_RULES band"""
         if age <= 7:
-            system_prompt += "\n\nIMPORTANT: This child is very young (5-7 years). Use ONLY 5-8 very simple words. Add emojis. Be extra gentle."
+            return 'young'
         elif age <= 11:
-            system_prompt += "\n\nIMPORTANT: This child is 8-11 years old. Use simple sentences. Maximum 2 sentences."
+            return 'child'
+        return 'preteen'
+    
+    def build_system_prompt(self, character_id, age=10, band=None):
+        """Static part of a character prompt: persona plus age rules (None if unknown)"""
+        character = Config.CHARACTERS.get(character_id)
+        if not character:
+            return None
+        return character['system_prompt'] + self.AGE_RULES[band or self.age_band(age)]
+    
+    def build_prompt(self, character_id, user_message, emotion=None,
+                     conversation_history=None, context_summary=None, age=10,
+                     include_system=True, late_reply=None):
+        """
+        Build the full character prompt for a chat turn (None if unknown character)
+        
+        With include_system=False the persona and age rules are left out, for
+        derived models that already carry them as their SYSTEM prompt.
+        late_reply is a previous answer that arrived after its turn's deadline.
+        """
+        packed = self.pack_prompt(character_id, user_message, emotion, conversation_history,
+                                  context_summary, age, include_system, late_reply)
+        return packed[0] if packed else None
+    
+    def pack_prompt(self, character_id, user_message, emotion=None,
+                    conversation_history=None, context_summary=None, age=10,
+                    include_system=True, late_reply=None):
+        """
+        Build the prompt within the token budget
+        
+        Returns (prompt, report), or None for an unknown character. History is
+        newest first, as returned by Database.get_conversations().
+        """
+        system_prompt = self.build_system_prompt(character_id, age)
+        if system_prompt is None:
+            return None
+        if not include_system:
+            system_prompt = ""
+        
+        return self.prompt_budget.pack(
+            system_prompt, user_message, emotion,
+            context_summary=context_summary,
+            conversation_history=conversation_history,
+            late_reply=late_reply
+        )
+    
+    def build_turn_prompt(self, user_message, emotion=None):
+        """Build the prompt for a turn that continues a reused Ollama context"""
+        emotion_context = f"(The child is feeling: {emotion})\n" if emotion else ""
+        return f"{emotion_context}Child: {self.prompt_budget.fit_message(user_message)}\n\nYou:"
+    
+    def _context_key(self, model, character_id, age, context_summary):
+        # A reused context is only valid for the prompt it was built from
+        age_band = self.age_band(age)
+        summary_hash = hashlib.sha1((context_summary or '').encode('utf-8')).hexdigest()[:12]
+        return f'{model}|{character_id}|{age_band}|{summary_hash}'
+    
+    def _prepare_turn(self, character_id, user_message, emotion, conversation_history,
+                      model, context_summary, age, session, base_url=None):
+        """
+        Choose the model and prompt for a turn
+        
+        Returns (model, prompt, context, context_key). A derived character
+        model replaces the base model when one is ready, so only the dynamic
+        parts of the prompt are sent. When the session holds an Ollama context
+        for the same model, character, age band and summary, only the new
+        child message is sent along with that context. The turn's token
+        estimate is kept in session['turn_tokens'].
+        """
+        derived = None
+        if model == self.model:
+            derived = self.character_models.get((base_url or self.base_url, character_id, self.age_band(age)))
+        model = derived or model
+        
+        context_key = self._context_key(model, character_id, age, context_summary)
+        late_reply = session.pop('late_reply', None) if session is not None else None
+        
+        if session is not None:
+            # A reused context already holds any late reply
+            context = session.get('ollama_context')
+            if (context and session.get('ollama_context_key') == context_key
+                    and len(context) <= self.context_max_tokens):
+                self.context_stats['reused'] += 1
+                prompt = self.build_turn_prompt(user_message, emotion)
+                self._record_tokens(session, {'total': estimate_tokens(prompt), 'reused_context': len(context)})
+                return model, prompt, context, context_key
+        
+        packed = self.pack_prompt(
+            character_id, user_message, emotion,
+            conversation_history, context_summary, age,
+            include_system=derived is None, late_reply=late_reply
+        )
+        if packed is None:
+            return model, None, None, context_key
+        if session is not None:
+            self.context_stats['rebuilt'] += 1
+        full_prompt, report = packed
+        self._record_tokens(session, report)
+        return model, full_prompt, None, context_key
+    
+    def _record_tokens(self, session, report):
+        with self._stats_lock:
+            self.token_stats['turns'] += 1
+            self.token_stats['estimated'] += report['total']
+            self.token_stats['max_estimated'] = max(self.token_stats['max_estimated'], report['total'])
+            self.token_stats['truncated'] += 1 if report.get('truncated') else 0
+            self.token_stats['dropped_turns'] += report.get('dropped_turns', 0)
+        if session is not None:
+            session['turn_tokens'] = {'prompt_estimated': report['total'], 'parts': report}
+    
+    def _record_evaluated(self, session, result):
+        """Add Ollama's own prompt and reply token counts for the turn"""
+        evaluated = result.get('prompt_eval_count')
+        if evaluated:
+            with self._stats_lock:
+                self.token_stats['evaluated'] += evaluated
+        if session is not None and session.get('turn_tokens') is not None:
+            session['turn_tokens']['prompt_evaluated'] = evaluated
+    
+    def _store_context(self, session, context_key, context):
+        if session is None:
+            return
+        if context:
+            session['ollama_context'] = context
+            session['ollama_context_key'] = context_key
         else:
-            system_prompt += "\n\nIMPORTANT: This is a pre-teen (12-15 years). Be friendly but not childish."
-        
-        # Add emotion context if provided
-        if emotion:
-            emotion_context = f"\n\nThe child is feeling: {emotion}"
-            system_prompt += emotion_context
-        
-        # Add context summary for memory continuity
-        memory_context = ""
-        if context_summary:
-            memory_context = f"\n\nPREVIOUS CONTEXT (remember this about the child):\n{context_summary}\n"
-        
-        # Build conversation context
-        context = ""
-        if conversation_history and len(conversation_history) > 0:
-            context = "\n\nRecent conversation:\n"
-            for conv in conversation_history[-3:]:  # Last 3 messages
-                context += f"Child: {conv.get('message', '')}\n"
-                context += f"You: {conv.get('response', '')}\n"
-        
-        full_prompt = f"{system_prompt}{memory_context}{context}\n\nChild: {user_message}\n\nYou:"
-        
-        # Fallback responses based on character
-        fallback_responses = {
-            'puffy': "I hear you! Tell me more about how you're feeling.",
-            'ollie': "That's interesting! What else would you like to share?",
-            'sheldon': "Wow! What happens next in your story?",
-            'clawde': "Good thinking! Can you tell me more about that?",
-            'finley': "Great! What would you like to do next?"
+            self.reset_context(session)
+    
+    def reset_context(self, session):
+        """Drop a session's Ollama context so the next turn sends the full prompt"""
+        if session is not None:
+            session.pop('ollama_context', None)
+            session.pop('ollama_context_key', None)
+    
+    def finalize_response(self, character_id, ai_response):
+        """Apply fallback and length rules to a raw model reply"""
+        ai_response = (ai_response or '').strip()
+        
+        # If empty response, use fallback
+        if not ai_response:
+            return self.FALLBACK_RESPONSES.get(character_id, self.DEFAULT_FALLBACK)
+        
+        # Ensure response is short (streamed replies are already cut)
+        return limit_sentences(ai_response, self.max_sentences)
+    
+    def _chat_payload(self, model, prompt, stream, context=None):
+        payload = {
+            'model': model,
+            'prompt': prompt,
+            'stream': stream,
+            'keep_alive': self.keep_alive,
+            'options': {
+                'temperature': 0.7,
+                'top_p': 0.9,
+                'num_predict': 100,
+                # Stop if the model starts writing the child's next line
+                'stop': ['\nChild:', '\nYou:']
+            }
         }
+        if context:
+            payload['context'] = context
+        return payload
+    
+    def generate_response(self, character_id, user_message, emotion=None, 
+                         conversation_history=None, model=None, context_summary=None, age=10,
+                         session=None, base_url=None):
+        """
+        Generate AI response using Ollama with language-specific model
+        
+        If an active session dict is given, the Ollama context returned by
+        each turn is kept in it and reused so the system prompt and history
+        are not re-evaluated on the next turn. Generation is streamed
+        internally so it can stop at the sentence limit (see stream_response).
+        """
+        text = ''.join(self.stream_response(
+            character_id, user_message, emotion, conversation_history,
+            model=model, context_summary=context_summary, age=age,
+            session=session, base_url=base_url
+        ))
+        return self.finalize_response(character_id, text)
+    
+    def stream_response(self, character_id, user_message, emotion=None,
+                        conversation_history=None, model=None, context_summary=None, age=10,
+                        session=None, base_url=None):
+        """
+        Stream AI response tokens from Ollama as they are generated
+        
+        Yields raw text chunks. Nothing is yielded if Ollama fails before the
+        first token; callers pass the joined chunks to finalize_response, which
+        falls back to the character reply when the text is empty.
+        
+        Output is cut after MAX_REPLY_SENTENCES sentences and the upstream
+        request is closed there, which makes Ollama stop generating. A reply
+        stopped early returns no Ollama context, so the session's context is
+        dropped and the next turn rebuilds its prompt (cheap with a derived
+        character model); a reply that finishes by itself stores its context
+        for reuse.
+        """
+        backend, base_url, model_to_use = self._resolve(model, base_url)
+        
+        model_to_use, full_prompt, context, context_key = self._prepare_turn(
+            character_id, user_message, emotion, conversation_history,
+            model_to_use, context_summary, age, session, base_url
+        )
+        if full_prompt is None:
+            yield self.UNKNOWN_CHARACTER_RESPONSE
+            return
         
+        limiter = SentenceLimiter(self.max_sentences)
+        generated = 0
         try:
-            # Call Ollama API
-            response = requests.post(
-                f'{self.base_url}/api/generate',
-                json={
-                    'model': model_to_use,
-                    'prompt': full_prompt,
-                    'stream': False,
-                    'options': {
-                        'temperature': 0.7,
-                        'top_p': 0.9,
-                        'num_predict': 100
-                    }
-                },
-                timeout=self.timeout
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                ai_response = result.get('response', '').strip()
-                
-                # If empty response, use fallback
-                if not ai_response:
-                    return fallback_responses.get(character_id, "That's great! Tell me more!")
+            with self._guard(backend, base_url) as outcome, self.session.post(
+                f'{base_url}/api/generate',
+                json=self._chat_payload(model_to_use, full_prompt, True, context),
+                timeout=self.timeout,
+                stream=True
+            ) as response:
+                if response.status_code != 200:
+                    print(f"Ollama returned status {response.status_code}")
+                    outcome['ok'] = False
+                    self.reset_context(session)
+                    return
                 
-                # Ensure response is short (max 2-3 sentences)
-                sentences = ai_response.split('. ')
-                if len(sentences) > 2:
-                    ai_response = '. '.join(sentences[:2]) + '.'
-                
-                return ai_response
-            else:
-                print(f"Ollama returned status {response.status_code}")
-                return fallback_responses.get(character_id, "That's wonderful! Can you tell me more?")
+                # Cleared now so an interrupted stream never leaves a stale context
+                self.reset_context(session)
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get('response'):
+                        # Ollama streams one token per chunk
+                        generated += 1
+                        outcome['tokens'] = generated
+                        piece = limiter.feed(chunk['response'])
+                        if piece:
+                            yield piece
+                        if limiter.done and self.early_stop:
+                            # Leaving the block closes the connection and stops
+                            # generation; the context was already reset above
+                            break
+                    if chunk.get('done'):
+                        self._record_evaluated(session, chunk)
+                        self._store_context(session, context_key, chunk.get('context'))
         
+        except CircuitOpen as e:
+            print(f"Ollama skipped ({str(e)}) - using fallback response")
         except requests.exceptions.Timeout:
             print("Ollama timeout - using fallback response")
-            return fallback_responses.get(character_id, "That sounds interesting! What else?")
         except requests.exceptions.ConnectionError:
             print("Ollama connection error - is Ollama running?")
-            return fallback_responses.get(character_id, "I'm listening! Go on...")
+            self._connection_lost(backend)
         except Exception as e:
             print(f"Ollama error: {str(e)}")
-            return fallback_responses.get(character_id, "Tell me more about that!")
+        finally:
+            if generated:
+                self._record_generation(session, generated, limiter.kept_chunks,
+                                        self.early_stop and limiter.done)
+    
+    def _record_generation(self, session, generated, kept, early_stop):
+        """Count streamed tokens generated against those shown to the child"""
+        with self._stats_lock:
+            self.generation_stats['replies'] += 1
+            self.generation_stats['early_stops'] += 1 if early_stop else 0
+            self.generation_stats['generated'] += generated
+            self.generation_stats['kept'] += kept
+        if session is not None and session.get('turn_tokens') is not None:
+            session['turn_tokens'].update({'generated': generated, 'kept': kept, 'early_stop': early_stop})
     
-    def generate_simple(self, prompt):
-        """Generate simple completion (for emoji scaffolding, summaries)"""
+    # ==================== DERIVED CHARACTER MODELS ====================
+    
+    def character_model_name(self, character_id, band):
+        """Derived model name, tagged with a hash of its base model and system prompt"""
+        system_prompt = self.build_system_prompt(character_id, band=band)
+        digest = hashlib.sha1(f'{self.model}\n{system_prompt}'.encode('utf-8')).hexdigest()[:12]
+        return f'{Config.OLLAMA_DERIVED_PREFIX}-{character_id}-{band}:{digest}'
+    
+    def ensure_character_models(self):
+        """
+        Create one derived model per (character, age band) through /api/create
+        on every backend
+        
+        Models whose hash tag already exists are reused, so a model is only
+        rebuilt when its prompt (or the base model) changes; older tags of the
+        same model are deleted. Backends the router has ejected or marked
+        unhealthy are skipped until a later round. Returns True when every
+        model is ready.
+        """
+        ready = True
+        for backend in self.router.backends:
+            if not self.router.is_live(backend) or not self._ensure_backend_models(backend.url):
+                ready = False
+        return ready
+    
+    def _ensure_backend_models(self, base_url):
+        try:
+            response = self.session.get(f'{base_url}/api/tags', timeout=5)
+            response.raise_for_status()
+            installed = {m.get('name') for m in response.json().get('models', [])}
+        except Exception as e:
+            print(f"Derived models: cannot list models on {base_url} ({str(e)})")
+            return False
+        
+        for character_id in Config.CHARACTERS:
+            for band in self.AGE_RULES:
+                name = self.character_model_name(character_id, band)
+                if name not in installed:
+                    try:
+                        response = self.session.post(
+                            f'{base_url}/api/create',
+                            json={
+                                'model': name,
+                                'from': self.model,
+                                'system': self.build_system_prompt(character_id, band=band),
+                                'stream': False
+                            },
+                            timeout=self.timeout
+                        )
+                        response.raise_for_status()
+                        print(f"Derived models: created {name} on {base_url}")
+                    except Exception as e:
+                        # The rest would likely fail (and block) the same way
+                        print(f"Derived models: failed to create {name} on {base_url} ({str(e)})")
+                        return False
+                
+                self.character_models[(base_url, character_id, band)] = name
+                
+                # Remove outdated versions of this model
+                base_name = name.split(':')[0]
+                for old_name in installed:
+                    if old_name and old_name.split(':')[0] == base_name and old_name != name:
+                        try:
+                            self.session.delete(f'{base_url}/api/delete', json={'model': old_name}, timeout=30)
+                        except:
+                            pass
+        
+        return True
+    
+    def _build_models_loop(self):
+        # Back off exponentially between rounds, up to OLLAMA_DERIVED_RETRY_MAX
+        delay = self.health_interval
+        while not self.ensure_character_models():
+            print(f"Derived models: not all ready, retrying in {delay}s")
+            time.sleep(delay)
+            delay = min(delay * 2, Config.OLLAMA_DERIVED_RETRY_MAX)
+    
+    def start_model_builder(self):
+        """Build derived character models in the background until all are ready"""
+        if Config.OLLAMA_DERIVED_MODELS:
+            threading.Thread(target=self._build_models_loop, name='ollama-models', daemon=True).start()
+    
+    def generate_simple(self, prompt, model=None, base_url=None, background=False):
+        """
+        Generate simple completion (for emoji scaffolding, summaries)
+        
+        Pass background=True for report, summary and scaffold jobs: their
+        latency then never shrinks the backend's concurrency limit or trips
+        its circuit breaker, only their errors do.
+        """
+        backend, base_url, model = self._resolve(model, base_url)
         try:
-            response = requests.post(
-                f'{self.base_url}/api/generate',
-                json={
-                    'model': self.model,
-                    'prompt': prompt,
-                    'stream': False,
-                    'options': {
-                        'temperature': 0.7,
-                        'max_tokens': 50
-                    }
-                },
-                timeout=self.timeout
-            )
+            with self._guard(backend, base_url, background) as outcome:
+                response = self.session.post(
+                    f'{base_url}/api/generate',
+                    json={
+                        'model': model,
+                        'prompt': prompt,
+                        'stream': False,
+                        'keep_alive': self.keep_alive,
+                        'options': {
+                            'temperature': 0.7,
+                            'max_tokens': 50
+                        }
+                    },
+                    timeout=self.timeout
+                )
+                outcome['ok'] = response.status_code == 200
+                if outcome['ok']:
+                    result = response.json()
+                    outcome['tokens'] = result.get('eval_count') or 0
             
             if response.status_code == 200:
-                result = response.json()
                 return result.get('response', '').strip()
             return ""
         except:
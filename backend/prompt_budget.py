@@ -0,0 +1,162 @@
+"""
+Prompt Budget
+Cheap token estimates and priority packing of prompt parts into a budget
+"""
+
+import math
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Latin words, numbers, runs of other scripts and single symbols
+_PIECES = re.compile(r'[A-Za-z]+|\d+|[^\x00-\x7f\s]+|[^\sA-Za-z\d]')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Approximate the token count of `text` without a tokenizer
+
+    English words cost about one token per 4 letters, digits one per 3,
+    punctuation one each. Non-Latin scripts (Tamil, Devanagari) split into
+    far more tokens, so they are counted at one token per 2 characters.
+    """
+    if not text:
+        return 0
+    tokens = 0
+    for piece in _PIECES.findall(text):
+        first = piece[0]
+        if first.isascii() and first.isalpha():
+            tokens += math.ceil(len(piece) / 4)
+        elif first.isdigit():
+            tokens += math.ceil(len(piece) / 3)
+        elif not first.isascii():
+            tokens += math.ceil(len(piece) / 2)
+        else:
+            tokens += 1
+    return tokens
+
+
+def truncate_tokens(text: str, max_tokens: int, keep: str = 'head') -> str:
+    """
+    Cut `text` to about `max_tokens`, keeping its start ('head') or end ('tail')
+
+    Cuts on a word boundary and marks the cut with '...'.
+    """
+    if not text or estimate_tokens(text) <= max_tokens:
+        return text or ''
+    if max_tokens <= 0:
+        return ''
+
+    words = text.split()
+    if keep == 'tail':
+        words.reverse()
+
+    kept = []
+    used = 1  # the '...' marker
+    for word in words:
+        cost = estimate_tokens(word)
+        if used + cost > max_tokens:
+            break
+        kept.append(word)
+        used += cost
+
+    if keep == 'tail':
+        kept.reverse()
+        return '...' + ' '.join(kept)
+    return ' '.join(kept) + '...'
+
+
+class PromptBudget:
+    """
+    Pack the parts of a chat prompt into a token budget
+
+    Parts are admitted in priority order, so a long paste or an oversized
+    summary can never push out the part that matters more:
+
+        1. system prompt (persona and age rules) - always kept
+        2. the child's current message - capped at `message_tokens`
+        3. emotion and late reply notes
+        4. context summary - capped at `summary_tokens`
+        5. conversation history - newest turn first, each message capped
+           at `message_tokens`, up to `history_turns` turns
+
+    pack() returns the prompt text and a report of tokens used per part.
+    """
+
+    def __init__(self, max_tokens: int = 1500, summary_tokens: int = 300,
+                 message_tokens: int = 200, history_turns: int = 6):
+        self.max_tokens = max_tokens
+        self.summary_tokens = summary_tokens
+        self.message_tokens = message_tokens
+        self.history_turns = history_turns
+
+    def fit_message(self, message: str) -> str:
+        """Cap one chat message at the per-message budget"""
+        return truncate_tokens(message or '', self.message_tokens)
+
+    def pack(self, system_prompt: str, user_message: str, emotion: Optional[str] = None,
+             context_summary: Optional[str] = None,
+             conversation_history: Optional[List[Dict]] = None,
+             late_reply: Optional[str] = None) -> Tuple[str, Dict]:
+        """
+        Build the prompt within budget
+
+        conversation_history is newest first, as returned by
+        Database.get_conversations().
+
+        Returns (prompt, report) where report has the estimated tokens per
+        part, the total and how many history turns were dropped.
+        """
+        report = {'system': estimate_tokens(system_prompt), 'message': 0, 'notes': 0,
+                  'summary': 0, 'history': 0, 'history_turns': 0, 'dropped_turns': 0,
+                  'truncated': []}
+
+        message = self.fit_message(user_message)
+        if message != (user_message or ''):
+            report['truncated'].append('message')
+        tail = f"\n\nChild: {message}\n\nYou:"
+        report['message'] = estimate_tokens(tail)
+
+        feeling = f"\n\nThe child is feeling: {emotion}" if emotion else ""
+        late = ""
+        if late_reply:
+            late = (f"\n(You ran out of time on the last message. "
+                    f"What you wanted to say was: {self.fit_message(late_reply)})\n")
+        report['notes'] = estimate_tokens(feeling) + estimate_tokens(late)
+
+        remaining = self.max_tokens - report['system'] - report['message'] - report['notes']
+
+        # Summary: capped, and never more than what is left
+        memory = ""
+        if context_summary and remaining > 0:
+            summary = truncate_tokens(context_summary, min(self.summary_tokens, remaining))
+            if summary != context_summary:
+                report['truncated'].append('summary')
+            if summary:
+                memory = f"\n\nPREVIOUS CONTEXT (remember this about the child):\n{summary}\n"
+                report['summary'] = estimate_tokens(memory)
+                remaining -= report['summary']
+
+        # History: newest turns first until the budget runs out
+        history = list(conversation_history or [])[:self.history_turns]
+        turns = []
+        header_cost = estimate_tokens("Recent conversation:")
+        for conv in history:
+            turn = (f"Child: {self.fit_message(conv.get('message', ''))}\n"
+                    f"You: {self.fit_message(conv.get('response', ''))}\n")
+            cost = estimate_tokens(turn)
+            if cost + (0 if turns else header_cost) > remaining:
+                break
+            turns.append(turn)
+            remaining -= cost + (0 if len(turns) > 1 else header_cost)
+
+        context = ""
+        if turns:
+            context = "\n\nRecent conversation:\n" + "".join(reversed(turns))
+            report['history'] = estimate_tokens(context)
+        report['history_turns'] = len(turns)
+        report['dropped_turns'] = len(conversation_history or []) - len(turns)
+
+        report['total'] = (report['system'] + report['notes'] + report['summary']
+                           + report['history'] + report['message'])
+        prompt = f"{system_prompt}{feeling}{memory}{context}{late}{tail}".lstrip()
+        return prompt, report
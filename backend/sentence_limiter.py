@@ -0,0 +1,76 @@
+"""
+Sentence Limiter
+Finds sentence ends in streamed model output so generation can stop early
+"""
+
+import re
+from typing import List
+
+# Sentence-ending punctuation: Latin . ! ? (also used in Tamil) and the
+# Devanagari danda / double danda used in Hindi and Marathi, with any
+# closing quotes or brackets. An end only counts once whitespace follows,
+# so "3.5" or a half-streamed "..." is not cut.
+SENTENCE_END = re.compile(r'[.!?।॥]+["\'’”)\]]*(?=\s)')
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split text into sentences, keeping their punctuation"""
+    sentences = []
+    start = 0
+    for match in SENTENCE_END.finditer(text):
+        sentence = text[start:match.end()].strip()
+        if sentence:
+            sentences.append(sentence)
+        start = match.end()
+    rest = text[start:].strip()
+    if rest:
+        sentences.append(rest)
+    return sentences
+
+
+def limit_sentences(text: str, max_sentences: int = 2) -> str:
+    """Keep the first `max_sentences` sentences of text"""
+    return ' '.join(split_sentences(text)[:max_sentences])
+
+
+class SentenceLimiter:
+    """
+    Cut a token stream after `max_sentences` complete sentences
+
+    feed() each chunk as it arrives; it returns the part of the chunk that
+    may be shown. Once `done` is set the caller should close the upstream
+    request, since every later token would be thrown away.
+    """
+
+    def __init__(self, max_sentences: int = 2):
+        self.max_sentences = max_sentences
+        self.text = ''
+        self.emitted = 0
+        self.done = False
+        self.chunks = 0  # chunks received
+        self.kept_chunks = 0  # chunks that contributed shown text
+
+    def feed(self, chunk: str) -> str:
+        if self.done:
+            return ''
+        self.chunks += 1
+        self.text += chunk
+
+        cut = len(self.text)
+        ends = 0
+        for match in SENTENCE_END.finditer(self.text):
+            ends += 1
+            if ends == self.max_sentences:
+                cut = match.end()
+                self.done = True
+                break
+
+        piece = self.text[self.emitted:cut]
+        if piece:
+            self.kept_chunks += 1
+        self.emitted = max(self.emitted, cut)
+        return piece
+
+    @property
+    def kept(self) -> str:
+        return self.text[:self.emitted]
@@ -0,0 +1,360 @@
+"""
+Session Store
+Active chat sessions, kept in-process or shared between worker processes
+"""
+
+import json
+import sqlite3
+import sys
+import threading
+import time
+from array import array
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+
+class SessionRecord:
+    """
+    One active session
+
+    Fixed slots instead of a dict, the last `max_messages` child messages in
+    a ring buffer, and the Ollama context as a packed int array (8 bytes a
+    token instead of a Python int each). Supports the dict-style access
+    (`session['key']`, get, pop) OllamaService uses on a session.
+    """
+
+    __slots__ = ('session_id', 'child_id', 'character', 'start_time', 'last_active', 'turn_count',
+                 'messages', 'db_session_id', '_context', 'ollama_context_key', 'late_reply', 'turn_tokens')
+
+    # Opaque per-turn state, written back by SessionStore.save()
+    STATE_FIELDS = ('ollama_context', 'ollama_context_key', 'late_reply')
+
+    def __init__(self, session_id, child_id, character, max_messages, db_session_id=None,
+                 start_time=None, turn_count=0, messages=()):
+        self.session_id = session_id
+        self.child_id = child_id
+        self.character = character
+        self.start_time = start_time or time.time()
+        self.last_active = time.time()
+        self.turn_count = turn_count
+        self.messages = deque(messages, maxlen=max_messages)
+        self.db_session_id = db_session_id
+
+    @property
+    def ollama_context(self):
+        return self._context.tolist()
+
+    @ollama_context.setter
+    def ollama_context(self, context):
+        self._context = array('q', context)
+
+    @ollama_context.deleter
+    def ollama_context(self):
+        del self._context
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return hasattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def pop(self, key, default=None):
+        value = getattr(self, key, default)
+        try:
+            delattr(self, key)
+        except AttributeError:
+            pass
+        return value
+
+    def state(self) -> Dict:
+        return {key: self[key] for key in self.STATE_FIELDS if key in self}
+
+    def set_state(self, state: Dict):
+        for key in self.STATE_FIELDS:
+            self.pop(key)
+        for key, value in state.items():
+            if key in self.STATE_FIELDS:
+                self[key] = value
+
+    def duration_minutes(self, until: Optional[float] = None) -> float:
+        return ((until or time.time()) - self.start_time) / 60
+
+    def memory_bytes(self) -> int:
+        """Approximate memory held by this record"""
+        size = sys.getsizeof(self) + sys.getsizeof(self.messages)
+        size += sum(sys.getsizeof(message) for message in self.messages)
+        if 'ollama_context' in self:
+            size += sys.getsizeof(self._context)
+        for key in ('ollama_context_key', 'late_reply'):
+            if key in self:
+                size += sys.getsizeof(self[key])
+        return size
+
+
+class SessionStore:
+    """
+    Interface for active session storage
+
+    get() returns a SessionRecord. Changes to its opaque state are written
+    back with save(); turn_count and messages are only changed through
+    record_turn(), which is atomic even across processes. Sessions idle for
+    longer than the TTL are removed by the reaper and handed to its
+    on_expire callback.
+    """
+
+    def __init__(self, max_messages: int = 20):
+        self.max_messages = max_messages
+        self.stats = {'expired': 0, 'ended': 0}
+        self._reaper = None
+
+    def create(self, session_id: int, child_id, character: str, db_session_id=None) -> bool:
+        """Start a session; False if the id is taken"""
+        raise NotImplementedError
+
+    def get(self, session_id) -> Optional[SessionRecord]:
+        raise NotImplementedError
+
+    def save(self, session_id, session: SessionRecord):
+        """Write back the opaque state of a record from get()"""
+        raise NotImplementedError
+
+    def record_turn(self, session_id, message: Optional[str] = None) -> Optional[int]:
+        """Count a turn (and keep the child's message); returns the new turn count"""
+        raise NotImplementedError
+
+    def end(self, session_id) -> Optional[SessionRecord]:
+        """Remove a session and return its last record"""
+        raise NotImplementedError
+
+    def expire_idle(self, ttl: float) -> List[SessionRecord]:
+        """Remove and return sessions with no activity for `ttl` seconds"""
+        raise NotImplementedError
+
+    def get_stats(self) -> Dict:
+        raise NotImplementedError
+
+    def start_reaper(self, ttl: float, interval: float, on_expire: Callable[[SessionRecord], None]):
+        """Expire idle sessions every `interval` seconds in a daemon thread (idempotent)"""
+        if self._reaper:
+            return
+
+        def reap():
+            while True:
+                time.sleep(interval)
+                try:
+                    expired = self.expire_idle(ttl)
+                except Exception as e:
+                    print(f"Session reaper error: {str(e)}")
+                    continue
+                for session in expired:
+                    try:
+                        on_expire(session)
+                    except Exception as e:
+                        print(f"Session reaper: finalizing {session.session_id} failed: {str(e)}")
+                if expired:
+                    print(f"Session reaper: expired {len(expired)} idle session(s)")
+
+        self._reaper = threading.Thread(target=reap, name='session-reaper', daemon=True)
+        self._reaper.start()
+
+
+class InProcessSessionStore(SessionStore):
+    """
+    Sessions in a dict (single worker process)
+
+    get() returns the live record, so state changes are visible at once
+    and save() only refreshes the idle timer.
+    """
+
+    def __init__(self, max_messages: int = 20):
+        super().__init__(max_messages)
+        self.sessions: Dict[int, SessionRecord] = {}
+        self._lock = threading.Lock()
+
+    def create(self, session_id, child_id, character, db_session_id=None):
+        with self._lock:
+            if session_id in self.sessions:
+                return False
+            self.sessions[session_id] = SessionRecord(session_id, child_id, character, self.max_messages,
+                                                      db_session_id=db_session_id)
+            return True
+
+    def get(self, session_id):
+        return self.sessions.get(session_id)
+
+    def save(self, session_id, session):
+        with self._lock:
+            current = self.sessions.get(session_id)
+            if current is None:
+                return
+            if current is not session:
+                current.set_state(session.state())
+            current.last_active = time.time()
+
+    def record_turn(self, session_id, message=None):
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return None
+            session.turn_count += 1
+            session.last_active = time.time()
+            if message is not None:
+                session.messages.append(message)
+            return session.turn_count
+
+    def end(self, session_id):
+        with self._lock:
+            session = self.sessions.pop(session_id, None)
+            if session is not None:
+                self.stats['ended'] += 1
+            return session
+
+    def expire_idle(self, ttl):
+        cutoff = time.time() - ttl
+        with self._lock:
+            idle = [sid for sid, session in self.sessions.items() if session.last_active < cutoff]
+            expired = [self.sessions.pop(sid) for sid in idle]
+            self.stats['expired'] += len(expired)
+        return expired
+
+    def get_stats(self):
+        with self._lock:
+            sizes = [session.memory_bytes() for session in self.sessions.values()]
+            return {
+                'backend': 'memory',
+                'active': len(sizes),
+                'memory_bytes': sum(sizes),
+                'avg_session_bytes': round(sum(sizes) / len(sizes)) if sizes else 0,
+                'max_session_bytes': max(sizes, default=0),
+                **self.stats
+            }
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Sessions in the live_sessions table (any number of worker processes)
+
+    Every process sees the same sessions through the database (WAL mode,
+    so readers do not block the writer). Turn counts and messages are
+    updated by a single UPDATE, so concurrent turns cannot lose counts,
+    and expiry is a single DELETE, so each idle session is finalized by
+    exactly one process.
+    """
+
+    def __init__(self, db, max_messages: int = 20):
+        super().__init__(max_messages)
+        self.db = db
+
+    def create(self, session_id, child_id, character, db_session_id=None):
+        now = time.time()
+        conn = self.db.get_connection()
+        try:
+            conn.execute('''
+                INSERT INTO live_sessions (session_id, child_id, character, start_time, updated_at, db_session_id)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (session_id, child_id, character, now, now, db_session_id))
+            conn.commit()
+            return True
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            return False
+        finally:
+            conn.close()
+
+    def get(self, session_id):
+        if session_id is None:
+            return None
+        conn = self.db.get_connection()
+        row = conn.execute('SELECT * FROM live_sessions WHERE session_id = ?', (session_id,)).fetchone()
+        conn.close()
+        return self._to_record(row)
+
+    def save(self, session_id, session):
+        conn = self.db.get_connection()
+        conn.execute(
+            'UPDATE live_sessions SET state = ?, updated_at = ? WHERE session_id = ?',
+            (json.dumps(session.state()), time.time(), session_id)
+        )
+        conn.commit()
+        conn.close()
+
+    def record_turn(self, session_id, message=None):
+        # Append, then drop the oldest message once the buffer is full
+        conn = self.db.get_connection()
+        row = conn.execute('''
+            UPDATE live_sessions SET
+                turn_count = turn_count + 1,
+                messages = CASE
+                    WHEN ?1 IS NULL THEN messages
+                    WHEN json_array_length(messages) >= ?2 THEN json_remove(json_insert(messages, '$[#]', ?1), '$[0]')
+                    ELSE json_insert(messages, '$[#]', ?1)
+                END,
+                updated_at = ?3
+            WHERE session_id = ?4
+            RETURNING turn_count
+        ''', (message, self.max_messages, time.time(), session_id)).fetchone()
+        conn.commit()
+        conn.close()
+        return row[0] if row else None
+
+    def end(self, session_id):
+        conn = self.db.get_connection()
+        row = conn.execute('DELETE FROM live_sessions WHERE session_id = ? RETURNING *', (session_id,)).fetchone()
+        conn.commit()
+        conn.close()
+        if row is not None:
+            self.stats['ended'] += 1
+        return self._to_record(row)
+
+    def expire_idle(self, ttl):
+        conn = self.db.get_connection()
+        rows = conn.execute('DELETE FROM live_sessions WHERE updated_at < ? RETURNING *',
+                            (time.time() - ttl,)).fetchall()
+        conn.commit()
+        conn.close()
+        self.stats['expired'] += len(rows)
+        return [self._to_record(row) for row in rows]
+
+    def get_stats(self):
+        conn = self.db.get_connection()
+        active, stored = conn.execute('''
+            SELECT COUNT(*), COALESCE(SUM(length(messages) + length(state)), 0) FROM live_sessions
+        ''').fetchone()
+        conn.close()
+        return {
+            'backend': 'sqlite',
+            'active': active,
+            'stored_bytes': stored,
+            'avg_session_bytes': round(stored / active) if active else 0,
+            **self.stats
+        }
+
+    def _to_record(self, row):
+        if row is None:
+            return None
+        record = SessionRecord(
+            row['session_id'], row['child_id'], row['character'], self.max_messages,
+            db_session_id=row['db_session_id'], start_time=row['start_time'],
+            turn_count=row['turn_count'], messages=json.loads(row['messages'] or '[]')
+        )
+        record.last_active = row['updated_at']
+        record.set_state(json.loads(row['state'] or '{}'))
+        return record
+
+
+def create_session_store(backend: str, db, max_messages: int = 20) -> SessionStore:
+    """Session store for Config.SESSION_STORE ('memory' or 'sqlite')"""
+    if backend == 'sqlite':
+        return SQLiteSessionStore(db, max_messages)
+    if backend != 'memory':
+        print(f"Unknown session store '{backend}' - using memory")
+    return InProcessSessionStore(max_messages)
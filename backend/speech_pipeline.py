@@ -0,0 +1,102 @@
+"""
+Speech Pipeline
+Speaks a streamed reply sentence by sentence while the rest is generated
+"""
+
+import base64
+from collections import deque
+from typing import Dict, List
+
+from language_detector import LanguageDetector
+from sentence_limiter import SENTENCE_END, split_sentences
+from tts_cache import TTSCache
+
+
+class SpeechPipeline:
+    """
+    Sentence-pipelined TTS for one streamed reply
+
+    feed() the reply text that is safe to show so far. Each sentence it
+    completes is synthesized at once on `executor` (through the TTS cache),
+    so the first sentence is being rendered while the model still writes
+    the next. ready() returns the audio events finished so far, in
+    sentence order, without waiting; finish() queues whatever the final
+    reply adds and drain() waits for the rest.
+    """
+
+    def __init__(self, tts, cache: TTSCache, executor):
+        self.tts = tts
+        self.cache = cache
+        self.executor = executor
+        self.sentences: List[str] = []  # submitted, in order
+        self.pending = deque()  # (index, sentence, future) not yet emitted
+        self.scanned = 0  # offset in the fed text up to which sentences were taken
+
+    def feed(self, text: str):
+        for match in SENTENCE_END.finditer(text, self.scanned):
+            sentence = text[self.scanned:match.end()].strip()
+            self.scanned = match.end()
+            if sentence:
+                self._submit(sentence)
+
+    def finish(self, response: str):
+        """
+        Queue the sentences of the final reply that were not spoken yet
+
+        The final reply is authoritative: if the filter or fallback
+        replaced the streamed text, speech continues from the first
+        sentence that differs.
+        """
+        final = split_sentences(response)
+        same = 0
+        while same < min(len(final), len(self.sentences)) and final[same] == self.sentences[same]:
+            same += 1
+        for sentence in final[same:]:
+            self._submit(sentence)
+
+    def ready(self) -> List[Dict]:
+        events = []
+        while self.pending and self.pending[0][2].done():
+            events.append(self._event(*self.pending.popleft()))
+        return events
+
+    def drain(self):
+        while self.pending:
+            yield self._event(*self.pending.popleft())
+
+    def cancel(self):
+        """Drop sentences not being rendered yet (the client went away)"""
+        for _, _, future in self.pending:
+            future.cancel()
+        self.pending.clear()
+
+    def _submit(self, sentence):
+        index = len(self.sentences)
+        self.sentences.append(sentence)
+        self.pending.append((index, sentence, self.executor.submit(self._render, sentence)))
+
+    def _render(self, sentence):
+        voice = self.tts.voice_for(LanguageDetector.detect_language(sentence))
+        key = TTSCache.key(sentence, voice, self.tts.name)
+        return key, self.cache.use(key, lambda: self.tts.synthesize(sentence, voice), self._read)
+
+    @staticmethod
+    def _read(path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def _event(self, index, sentence, future):
+        event = {'type': 'audio', 'index': index, 'text': sentence}
+        try:
+            key, audio = future.result()
+        except Exception as e:
+            # The client falls back to browser speech for this sentence
+            print(f"TTS error: {str(e)}")
+            event['error'] = str(e)
+            return event
+        event.update({
+            'key': key,
+            'mimetype': self.tts.mimetype,
+            'audio': base64.b64encode(audio).decode('ascii')
+        })
+        return event
@@ -0,0 +1,305 @@
+"""
+TTS Backends
+Text-to-speech engines behind one interface: gTTS (online) or a local
+offline engine in a pool of worker processes
+
+Run as a script, this module is an offline engine worker (see _serve)
+"""
+
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+from io import BytesIO
+from typing import Dict, List, Optional
+
+from gtts import gTTS
+
+
+class TTSBusy(Exception):
+    """Raised when a backend already has as many renders as it allows"""
+    pass
+
+
+class TTSBackend:
+    """
+    Interface for speech synthesis
+
+    LANGUAGES maps LanguageDetector codes ('en', 'ta', 'mr') to the
+    backend's own language or voice code. synthesize() renders text in
+    that voice and returns the audio file as bytes; at most
+    `max_concurrency` renders run at once and callers beyond that wait up
+    to `queue_timeout` seconds for a slot, then get TTSBusy.
+    """
+
+    name = ''
+    mimetype = 'application/octet-stream'
+    extension = ''
+    LANGUAGES: Dict[str, str] = {}
+    DEFAULT_LANGUAGE = 'en'
+
+    def __init__(self, max_concurrency: int = 2, queue_timeout: float = 10):
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.stats = {'rendered': 0, 'busy': 0, 'errors': 0}
+
+    def voice_for(self, language: str) -> str:
+        """Backend voice for a LanguageDetector code"""
+        return self.LANGUAGES.get(language, self.LANGUAGES[self.DEFAULT_LANGUAGE])
+
+    def _acquire(self):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self.stats['busy'] += 1
+            raise TTSBusy(f'{self.name}: {self.max_concurrency} renders already running')
+        with self._lock:
+            self.active += 1
+
+    def synthesize(self, text: str, voice: str) -> bytes:
+        self._acquire()
+        try:
+            audio = self._render(text, voice)
+        except Exception:
+            with self._lock:
+                self.stats['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                self.active -= 1
+            self._slots.release()
+        with self._lock:
+            self.stats['rendered'] += 1
+        return audio
+
+    def _render(self, text: str, voice: str) -> bytes:
+        raise NotImplementedError
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                'backend': self.name,
+                'active': self.active,
+                'max_concurrency': self.max_concurrency,
+                **self.stats
+            }
+
+
+class GTTSBackend(TTSBackend):
+    """Google Translate TTS (needs network access); MP3 output"""
+
+    name = 'gtts'
+    mimetype = 'audio/mpeg'
+    extension = '.mp3'
+    LANGUAGES = {
+        'ta': 'ta',      # Tamil
+        'mr': 'hi',      # Marathi (use Hindi voice as fallback)
+        'en': 'en'       # English
+    }
+
+    def _render(self, text, voice):
+        print(f"🔊 Converting to speech: gtts_lang={voice}, text={text[:50]}...")
+        audio = gTTS(text=text, lang=voice, slow=False)
+        audio_buffer = BytesIO()
+        audio.write_to_fp(audio_buffer)
+        return audio_buffer.getvalue()
+
+
+# ---- Offline engine ----
+
+_engine = None
+_default_voice = None
+_voices: Dict[str, Optional[str]] = {}
+
+
+def _voice_languages(voice):
+    # espeak reports languages as bytes with a leading priority byte
+    # (b'\x05en-us'); SAPI5 and NSSS as plain strings
+    for language in getattr(voice, 'languages', None) or []:
+        if isinstance(language, bytes):
+            language = language.decode('utf-8', 'ignore')
+        yield re.sub(r'^[^a-z]+', '', str(language).lower()).replace('_', '-')
+
+
+def _find_voice(engine, language):
+    """Id of an installed voice for `language`, or None for the engine default"""
+    if language not in _voices:
+        code = re.compile(rf'(^|[^a-z]){re.escape(language)}([^a-z]|$)')
+        voices = engine.getProperty('voices') or []
+        match = next((v.id for v in voices if any(code.search(l) for l in _voice_languages(v))), None)
+        if match is None:
+            match = next((v.id for v in voices if code.search(v.id.lower())), None)
+        _voices[language] = match
+    return _voices[language]
+
+
+def _render_offline(text, language, rate):
+    """Render text to a WAV file with pyttsx3 and return its bytes (worker process)"""
+    global _engine, _default_voice
+    import pyttsx3
+
+    if _engine is None:
+        # One engine per worker process, reused for every render
+        _engine = pyttsx3.init()
+        _default_voice = _engine.getProperty('voice')
+    # Set on every render, or a language without a voice of its own would
+    # keep the previous render's voice
+    voice = _find_voice(_engine, language) or _default_voice
+    if voice:
+        _engine.setProperty('voice', voice)
+    _engine.setProperty('rate', rate)
+
+    fd, path = tempfile.mkstemp(suffix='.wav')
+    os.close(fd)
+    try:
+        _engine.save_to_file(text, path)
+        _engine.runAndWait()
+        with open(path, 'rb') as f:
+            return f.read()
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _serve():
+    """
+    Worker process loop
+
+    Reads one JSON request per line from stdin and answers with a JSON
+    header line ({"size": n} or {"error": ...}) followed by n bytes of
+    audio. Anything the engine prints goes to stderr instead.
+    """
+    out = os.fdopen(os.dup(1), 'wb')
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+
+    for line in sys.stdin.buffer:
+        request = json.loads(line)
+        try:
+            audio = _render_offline(request['text'], request['language'], request['rate'])
+            out.write(json.dumps({'size': len(audio)}).encode() + b'\n')
+            out.write(audio)
+        except Exception as e:
+            out.write(json.dumps({'error': f'{type(e).__name__}: {e}'}).encode() + b'\n')
+        out.flush()
+
+
+class _OfflineWorker:
+    """
+    One engine process (this file run as a script), rendering one text at a time
+
+    A plain subprocess rather than multiprocessing, so the worker does not
+    re-import app.py (and start its own database, queues and threads).
+    The process is killed when a render overruns its timeout or the pipe
+    protocol breaks; the backend then starts a fresh one.
+    """
+
+    def __init__(self):
+        self.proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE
+        )
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def render(self, text: str, language: str, rate: int, timeout: float) -> bytes:
+        timed_out = threading.Event()
+
+        def kill():
+            timed_out.set()
+            self.proc.kill()
+
+        timer = threading.Timer(timeout, kill)
+        timer.start()
+        try:
+            request = {'text': text, 'language': language, 'rate': rate}
+            self.proc.stdin.write(json.dumps(request).encode() + b'\n')
+            self.proc.stdin.flush()
+            header = json.loads(self.proc.stdout.readline() or 'null')
+            if header and 'error' in header:
+                raise RuntimeError(header['error'])
+            audio = self.proc.stdout.read(header['size']) if header else b''
+            if not header or len(audio) != header['size']:
+                raise OSError('TTS worker exited')
+            return audio
+        except (OSError, ValueError):
+            self.proc.kill()
+            self.proc.wait()
+            if timed_out.is_set():
+                raise TimeoutError(f'render took longer than {timeout}s')
+            raise
+        finally:
+            timer.cancel()
+
+
+class Pyttsx3Backend(TTSBackend):
+    """
+    Local offline engine (pyttsx3: espeak-ng on Linux, SAPI5 on Windows)
+
+    pyttsx3 engines are neither thread-safe nor reentrant, so renders run
+    in up to `workers` engine processes, started on first use and kept
+    between calls; the request thread only waits on a pipe. Render slots
+    equal the worker count.
+    """
+
+    name = 'pyttsx3'
+    mimetype = 'audio/wav'
+    extension = '.wav'
+    LANGUAGES = {
+        'ta': 'ta',      # Tamil
+        'mr': 'mr',      # Marathi (engine default voice if not installed)
+        'en': 'en'       # English
+    }
+
+    def __init__(self, workers: int = 2, render_timeout: float = 20, rate: int = 150, queue_timeout: float = 10):
+        super().__init__(workers, queue_timeout)
+        self.workers = workers
+        self.render_timeout = render_timeout
+        self.rate = rate
+        self._idle: List[_OfflineWorker] = []
+        self.stats['started'] = 0
+
+    def _render(self, text, voice):
+        # The render slot guarantees at most `workers` are checked out
+        with self._lock:
+            worker = self._idle.pop() if self._idle else None
+        if worker is None or not worker.alive():
+            worker = _OfflineWorker()
+            with self._lock:
+                self.stats['started'] += 1
+        try:
+            return worker.render(text, voice, self.rate, self.render_timeout)
+        finally:
+            if worker.alive():
+                with self._lock:
+                    self._idle.append(worker)
+
+    def get_stats(self):
+        stats = super().get_stats()
+        with self._lock:
+            stats['workers'] = self.workers
+            stats['idle_workers'] = len(self._idle)
+        return stats
+
+
+def create_tts_backend(backend: str, max_concurrency: int = 2, queue_timeout: float = 10,
+                       workers: int = 2, render_timeout: float = 20, rate: int = 150) -> TTSBackend:
+    """TTS backend for Config.TTS_BACKEND ('gtts' or 'pyttsx3')"""
+    if backend == 'pyttsx3':
+        return Pyttsx3Backend(workers=workers, render_timeout=render_timeout, rate=rate,
+                              queue_timeout=queue_timeout)
+    if backend != 'gtts':
+        print(f"Unknown TTS backend '{backend}' - using gtts")
+    return GTTSBackend(max_concurrency=max_concurrency, queue_timeout=queue_timeout)
+
+
+if __name__ == '__main__':
+    _serve()
@@ -0,0 +1,202 @@
+"""
+TTS Audio Cache
+Synthesized speech on disk, keyed by a hash of what was synthesized
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+
+class TTSCache:
+    """
+    Size-bounded LRU cache of audio files
+
+    Files are named by the SHA-256 of (text, language, voice), so the same
+    phrase is synthesized once and its key doubles as an ETag. The index
+    of keys and sizes lives in memory, least recently used first by file
+    modification time, which hits refresh. Writes go to a temporary file
+    that is renamed into place, so a reader - or another worker process -
+    never sees a partial file. Concurrent misses for one key synthesize
+    once.
+
+    The directory is shared by every worker process, so the index is
+    rebuilt from a directory scan at start and at most every
+    `rescan_interval` seconds on a write; eviction then accounts for files
+    other processes wrote. A file can still be evicted between get() and
+    opening it: use() retries once in that case.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 200 * 1024 * 1024, extension: str = '.mp3',
+                 rescan_interval: float = 60.0):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.extension = extension
+        self.rescan_interval = rescan_interval
+        self.index: 'OrderedDict[str, int]' = OrderedDict()  # key -> size, least recently used first
+        self.total_bytes = 0
+        self._scanned_at = 0.0
+        self._lock = threading.Lock()
+        self._pending: Dict[str, threading.Lock] = {}
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'errors': 0, 'rescans': 0, 'retries': 0}
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._remove_temp_files()
+        self._rescan()
+
+    @staticmethod
+    def key(text: str, language: str, voice: str) -> str:
+        return hashlib.sha256(f'{voice}\n{language}\n{text.strip()}'.encode('utf-8')).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.extension)
+
+    def _remove_temp_files(self):
+        # Left by writes that were interrupted
+        for name in os.listdir(self.directory):
+            if name.startswith('.tmp'):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def _rescan(self):
+        """Rebuild the index from the directory (files of every process) and evict down to max_bytes"""
+        entries = []
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.name.endswith(self.extension) and not entry.name.startswith('.tmp'):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue  # Evicted meanwhile
+                    entries.append((stat.st_mtime, entry.name[:-len(self.extension)], stat.st_size))
+
+        index = OrderedDict((key, size) for _, key, size in sorted(entries))
+        with self._lock:
+            self.index = index
+            self.total_bytes = sum(index.values())
+            self._scanned_at = time.time()
+            self.stats['rescans'] += 1
+            self._evict()
+
+    @staticmethod
+    def _touch(path):
+        # Other processes order their eviction by modification time
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def get(self, key: str) -> Optional[str]:
+        """Path of the cached file, or None"""
+        path = self.path(key)
+        with self._lock:
+            if key in self.index:
+                if os.path.exists(path):
+                    self.index.move_to_end(key)
+                    self.stats['hits'] += 1
+                    self._touch(path)
+                    return path
+                # Evicted by another worker process
+                self.total_bytes -= self.index.pop(key)
+            elif os.path.exists(path):
+                # Written by another worker process
+                self.index[key] = os.path.getsize(path)
+                self.total_bytes += self.index[key]
+                self.stats['hits'] += 1
+                return path
+            self.stats['misses'] += 1
+            return None
+
+    def put(self, key: str, data: bytes) -> str:
+        """Store audio atomically and return its path"""
+        fd, tmp_path = tempfile.mkstemp(prefix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path(key))
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        with self._lock:
+            self.total_bytes += len(data) - self.index.pop(key, 0)
+            self.index[key] = len(data)
+            rescan = time.time() - self._scanned_at >= self.rescan_interval
+            if not rescan:
+                self._evict(keep=key)
+        if rescan:
+            self._rescan()
+        return self.path(key)
+
+    def get_or_create(self, key: str, synthesize: Callable[[], bytes]) -> str:
+        """Cached path for key, calling synthesize() on a miss (once per key at a time)"""
+        path = self.get(key)
+        if path:
+            return path
+
+        with self._lock:
+            pending = self._pending.setdefault(key, threading.Lock())
+        with pending:
+            try:
+                # Another request may have finished it while we waited
+                if key in self.index and os.path.exists(self.path(key)):
+                    return self.path(key)
+                try:
+                    data = synthesize()
+                except Exception:
+                    with self._lock:
+                        self.stats['errors'] += 1
+                    raise
+                return self.put(key, data)
+            finally:
+                with self._lock:
+                    self._pending.pop(key, None)
+
+    def use(self, key: str, synthesize: Callable[[], bytes], fn: Callable[[str], object]):
+        """
+        fn(path) on the cached or newly synthesized file for key
+
+        If the file is evicted (by this or another process) before fn opens
+        it, fn's FileNotFoundError makes the file be fetched or synthesized
+        once more.
+        """
+        try:
+            return fn(self.get_or_create(key, synthesize))
+        except FileNotFoundError:
+            with self._lock:
+                self.stats['retries'] += 1
+            return fn(self.get_or_create(key, synthesize))
+
+    def _evict(self, keep: Optional[str] = None):
+        # Caller holds the lock
+        while self.total_bytes > self.max_bytes and self.index:
+            key, size = next(iter(self.index.items()))
+            if key == keep:
+                break
+            del self.index[key]
+            self.total_bytes -= size
+            self.stats['evictions'] += 1
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                pass
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return {
+                'entries': len(self.index),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                **self.stats,
+                'hit_ratio': round(self.stats['hits'] / lookups, 3) if lookups else 0
+            }
@@ -23,6 +23,9 @@ let currentAIEmotion = 'neutral';
 let chatHistory = [];
 let messageCount = 0;
 let contextSummary = '';
+let sessionStartIndex = 0;  // chatHistory index where the current session began
+let syncedSeq = 0;          // messages of the current session the server has
+let syncedSummary = null;   // last context summary sent to the server
 let childEvaluation = {
     emotionTracking: [],
     communicationSkills: { clarity: 0, engagement: 0, reciprocity: 0 },
@@ -574,11 +577,8 @@ const CHAR_VOICES = {
 async function speakText(text) {
     try {
         // Try backend TTS first (supports multiple languages including Tamil)
-        const response = await fetch('http://127.0.0.1:5000/api/tts', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ text: text })
-        });
+        // GET so the browser can cache the audio and revalidate it by ETag
+        const response = await fetch('http://127.0.0.1:5000/api/tts?text=' + encodeURIComponent(text));
         
         if (response.ok) {
             const audioBlob = await response.blob();
@@ -610,10 +610,59 @@ async function speakText(text) {
     }
 }
 
-function fallbackTTS(text) {
-    // Fallback to browser Web Speech API
+// Sentence audio from the chat stream, played back to back
+const speechQueue = [];
+let speechPlaying = false;
+
+function queueSpeech(event) {
+    speechQueue.push(event);
+    if (!speechPlaying) playNextSpeech();
+}
+
+function playNextSpeech() {
+    const event = speechQueue.shift();
+    if (!event) {
+        speechPlaying = false;
+        return;
+    }
+    speechPlaying = true;
+    
+    if (!event.audio) {
+        // Synthesis failed for this sentence
+        fallbackTTS(event.text, playNextSpeech);
+        return;
+    }
+    
+    const bytes = Uint8Array.from(atob(event.audio), c => c.charCodeAt(0));
+    const audioUrl = URL.createObjectURL(new Blob([bytes], { type: event.mimetype }));
+    const audio = new Audio(audioUrl);
+    const voiceSettings = CHAR_VOICES[currentCharacter] || { pitch: 1.0, rate: 0.9 };
+    audio.playbackRate = voiceSettings.rate;
+    
+    // Move on once, whether the audio ended or failed (then speak it with the browser voice)
+    let finished = false;
+    const next = (failed) => {
+        if (finished) return;
+        finished = true;
+        URL.revokeObjectURL(audioUrl);
+        if (failed) {
+            fallbackTTS(event.text, playNextSpeech);
+        } else {
+            playNextSpeech();
+        }
+    };
+    audio.onended = () => next(false);
+    audio.onerror = () => next(true);
+    audio.play().catch(err => {
+        console.error('❌ Audio playback failed:', err);
+        next(true);
+    });
+}
+
+function fallbackTTS(text, onEnd = null) {
+    // Fallback to browser Web Speech API; with onEnd, queue after what is speaking
     if ('speechSynthesis' in window) {
-        speechSynthesis.cancel();
+        if (!onEnd) speechSynthesis.cancel();
         const utterance = new SpeechSynthesisUtterance(text);
         const voiceSettings = CHAR_VOICES[currentCharacter] || { pitch: 1.0, rate: 0.9 };
         utterance.pitch = voiceSettings.pitch;
@@ -628,8 +677,15 @@ function fallbackTTS(text) {
         let voice = voices.find(v => isTamil ? v.lang.includes('ta') : isHindi ? v.lang.includes('hi') : v.lang.includes('en'));
         if (voice) utterance.voice = voice;
         
+        if (onEnd) {
+            utterance.onend = onEnd;
+            utterance.onerror = onEnd;
+        }
+        
         speechSynthesis.speak(utterance);
         console.log('🔊 Using fallback browser TTS');
+    } else if (onEnd) {
+        onEnd();
     }
 }
 
@@ -904,6 +960,11 @@ async function openChat(charId) {
     contextSummary = saved.contextSummary || '';
     messageCount = saved.messageCount || 0;
     
+    // Only messages from this session on are synced to the new session
+    sessionStartIndex = chatHistory.length;
+    syncedSeq = 0;
+    syncedSummary = null;
+    
     try {
         const response = await fetch('http://127.0.0.1:5000/api/session/start', {
             method: 'POST',
@@ -1161,26 +1222,18 @@ async function sendMessage() {
     showTyping();
     
     try {
-        const response = await fetch('http://127.0.0.1:5000/api/chat', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({
-                child_id: currentChild.id,
-                character: currentCharacter,
-                message: message,
-                emotion: selectedEmotion,
-                session_id: currentSessionId,
-                context_summary: contextSummary,
-                age: currentChild.age || 10
-            })
+        const data = await streamChatReply({
+            child_id: currentChild.id,
+            character: currentCharacter,
+            message: message,
+            emotion: selectedEmotion,
+            session_id: currentSessionId,
+            context_summary: contextSummary,
+            age: currentChild.age || 10,
+            speak: voiceMode
         });
-        
-        const data = await response.json();
         console.log('📥 Response:', data);
         
-        removeTyping();
-        addMessage(data.response, 'ai');
-        
         // Track conversation for summaries
         chatHistory.push({ role: 'user', content: message, emotion: selectedEmotion, timestamp: Date.now() });
         chatHistory.push({ role: 'ai', content: data.response, timestamp: Date.now() });
@@ -1198,8 +1251,8 @@ async function sendMessage() {
         const detectedEmotion = detectEmotionFromText(data.response);
         updateAIEmotion(detectedEmotion);
         
-        // Speak response if voice mode
-        if (voiceMode) {
+        // Speak response if voice mode (unless it was spoken while streaming)
+        if (voiceMode && !data.spoken) {
             speakText(data.response);
         }
         
@@ -1226,6 +1279,68 @@ async function sendMessage() {
     }
 }
 
+// Stream the AI reply token by token; resolves with the final /api/chat payload
+async function streamChatReply(payload) {
+    const response = await fetch('http://127.0.0.1:5000/api/chat/stream', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(payload)
+    });
+    
+    if (!response.ok || !response.body) {
+        const error = await response.json();
+        throw new Error(error.error || 'Failed to send message');
+    }
+    
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = '';
+    let bubble = null;
+    let streamed = '';
+    let spoken = false;
+    let result = null;
+    
+    const handleLine = (line) => {
+        if (!line.trim()) return;
+        const event = JSON.parse(line);
+        if (!bubble) {
+            // First token (or final reply) replaces the typing dots
+            removeTyping();
+            addMessage('', 'ai');
+            const bubbles = document.querySelectorAll('#chat-messages .ai-message .message-bubble');
+            bubble = bubbles[bubbles.length - 1];
+        }
+        if (event.type === 'token') {
+            streamed += event.content;
+            bubble.textContent = streamed;
+        } else if (event.type === 'audio') {
+            // Sentence audio arrives in order while the reply is generated
+            queueSpeech(event);
+            spoken = true;
+        } else if (event.type === 'done') {
+            // Final reply is authoritative (safety filter, length limit)
+            bubble.textContent = event.response;
+            result = event;
+            result.spoken = spoken;
+        }
+        const container = document.getElementById('chat-messages');
+        container.scrollTop = container.scrollHeight;
+    };
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffered += decoder.decode(value, { stream: true });
+        const lines = buffered.split('\n');
+        buffered = lines.pop();
+        lines.forEach(handleLine);
+    }
+    handleLine(buffered);
+    
+    if (!result) throw new Error('Chat stream ended early');
+    return result;
+}
+
 function addMessageToUI(text, sender, emotion = null, time = null) {
     const container = document.getElementById('chat-messages');
     const info = CHARACTER_INFO[currentCharacter];
@@ -1314,6 +1429,15 @@ async function viewDashboard() {
         dashWin.document.open();
         dashWin.document.write(dashHTML);
         dashWin.document.close();
+        
+        // Fill in the AI report when the background job finishes
+        if (data.ai_report_job) {
+            const job = await waitForJob(data.ai_report_job);
+            const reportEl = dashWin.document.getElementById('ai-report');
+            if (job && job.result && reportEl) {
+                reportEl.innerHTML = job.result;
+            }
+        }
     } catch (error) {
         console.error('Error loading dashboard:', error);
         dashWin.document.body.innerHTML = '<h2>Error loading dashboard. Please try again.</h2>';
@@ -1402,7 +1526,7 @@ ${['First Words','Chatty Friend','Emotion Expert','Story Master','Problem Solver
 </div>
 </div>
 
-${data.ai_report ? `<div class="section"><h2>🌟 AI Progress Report</h2><p>${data.ai_report}</p></div>` : ''}
+${data.ai_report ? `<div class="section"><h2>🌟 AI Progress Report</h2><p id="ai-report">${data.ai_report}</p></div>` : ''}
 </div>
 </body></html>`;
 }
@@ -1761,7 +1885,13 @@ async function generateContextSummary() {
             })
         });
         
-        const data = await response.json();
+        let data = await response.json();
+        
+        // Summary is generated in the background; wait for the job
+        if (data.job_id) {
+            const job = await waitForJob(data.job_id);
+            if (job && job.result) data = job.result;
+        }
         
         if (data.summary) {
             contextSummary = data.summary;
@@ -1775,6 +1905,24 @@ async function generateContextSummary() {
     }
 }
 
+// Poll a background job until it finishes (resolves null on failure/timeout)
+async function waitForJob(jobId, intervalMs = 2000, maxWaitMs = 180000) {
+    const started = Date.now();
+    while (Date.now() - started < maxWaitMs) {
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+        try {
+            const response = await fetch(`http://127.0.0.1:5000/api/jobs/${jobId}`);
+            const job = await response.json();
+            if (job.status === 'done') return job;
+            if (job.status === 'failed' || response.status === 404) return null;
+        } catch (error) {
+            console.error('Error polling job:', error);
+            return null;
+        }
+    }
+    return null;
+}
+
 function showSummaryNotification() {
     // Create subtle notification that AI is remembering
     const notif = document.createElement('div');
@@ -1855,12 +2003,35 @@ function getRecentSessions() {
 }
 
 async function syncToBackend(data) {
+    if (!currentSessionId) return;
+    
+    // Send only the messages the server does not have yet
+    const afterSeq = syncedSeq;
+    const messages = chatHistory.slice(sessionStartIndex + afterSeq);
+    const summaryChanged = data.contextSummary !== syncedSummary;
+    if (messages.length === 0 && !summaryChanged) return;
+    
     try {
-        await fetch('http://127.0.0.1:5000/api/chat/sync', {
+        const response = await fetch('http://127.0.0.1:5000/api/chat/sync', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify(data)
+            body: JSON.stringify({
+                childId: data.childId,
+                sessionId: currentSessionId,
+                afterSeq: afterSeq,
+                messages: messages,
+                contextSummary: summaryChanged ? data.contextSummary : undefined
+            })
         });
+        const result = await response.json();
+        
+        // On 409 the server is behind; the next sync resends from its mark
+        if (typeof result.seq === 'number') {
+            syncedSeq = result.seq;
+        }
+        if (response.ok) {
+            syncedSummary = data.contextSummary;
+        }
     } catch (error) {
         console.log('Background sync failed, will retry later');
     }
@@ -1892,6 +2063,9 @@ function resetSessionData() {
     chatHistory = [];
     messageCount = 0;
     contextSummary = '';
+    sessionStartIndex = 0;
+    syncedSeq = 0;
+    syncedSummary = null;
     childEvaluation = {
         emotionTracking: [],
         communicationSkills: { clarity: 0, engagement: 0, reciprocity: 0 },